@@ -2,12 +2,23 @@ import pygame
 import datetime
 import os
 import math
-import numpy as np
+import weakref
+import pickle
+import struct
 from helpers import *
 from blocks import *
 from constants import *
 from trace import *
 from globalsStack import GlobalsStack
+from runner import ProgramRun
+from worker import WorkerRun
+from passes import BlockOptimiser
+from workspace import Workspace
+from profiler import BlockProfiler
+from blockIndex import BlockIndex
+from outputs import OutputLog, CAPACITY
+from assets import Assets
+from checkpoints import Checkpoints
 
 
 class App:
@@ -15,14 +26,14 @@ class App:
         self.scr_width, self.scr_height = 1280, 720
         self.scr = pygame.display.set_mode((self.scr_width, self.scr_height), pygame.RESIZABLE)
 
-        # code in AST representation is stored as a list of blocks here, initially empty
-        self.code = []
+        # code in AST representation is stored as a collection of blocks (a BlockIndex) here, initially empty. it is made
+        # once the font it needs to work out where blocks are is loaded below
+        self.code = None
         self.prev_mouse_x, self.prev_mouse_y = None, None
         self.selected_new_block = None
         self.join_new_block = None
         self.sensitivity = 1
         self.enteredText = ""
-        self.current_outputs = []
         self.globals = GlobalsStack()
 
         self.FONT_SIZE = 20
@@ -31,11 +42,22 @@ class App:
         # use this to work out how many characters we can fit with a set number of pixels
         # only one character needed as the font is monospaced
         self.char_width, self.char_height = self.FONT.size("n")
+        self.code = BlockIndex(self.FONT)
+        # the outputs of the last program run, as an OutputLog. at most output_capacity lines of a run are kept in
+        # memory, and the ones before them are forgotten unless output_spill is set, in which case they are kept in a
+        # temporary file instead
+        self.output_capacity = CAPACITY
+        self.output_spill = False
+        self.current_outputs = OutputLog(self.terminal_line_length())
 
         self.turtle = Turtle2D()
+        # the icons of the menu are loaded now the window exists, from the atlas cached by the last start if the icons
+        # haven't changed since
+        self.assets = Assets()
+        items, item_names = self.assets.icons()
         self.menu = Menu(
-            [operations, comparisons, turtle2Ds],
-            [ops, comps, t2Ds],
+            items,
+            item_names,
             self.scr_width // 2 - self.scr_width // 12.8 + 10,
             10
         )
@@ -44,14 +66,93 @@ class App:
         self.output_offset = 0
         self.frames = 0
 
+        # the program currently running (or paused), if any. it is run for at most run_time milliseconds each frame so
+        # the frame rate stays at around FPS however long the program takes
+        self.current_run = None
+        self.run_time = 8
+        self.FPS = 60
+        self.clock = pygame.time.Clock()
+        # programs are run in a separate process unless run_in_worker is False, in which case they are run a slice at a
+        # time in this one. a program run in a separate process is stopped once it has run for run_time_limit seconds
+        # or used run_memory_limit bytes, if they are set
+        self.run_in_worker = True
+        self.run_time_limit = None
+        self.run_memory_limit = None
+        # the optimisation passes (see BlockOptimiser) run on programs before they are run. none are run unless they are
+        # chosen here, or all of them are toggled on with Alt+Z
+        self.passes = ()
+
+        # the file the blocks in the code development environment are saved to and loaded from. the trees of loaded
+        # blocks are only read from it once they are drawn or run
+        self.workspace_path = os.path.join(os.getcwd(), "workspace.cbx")
+
+        # when profiling (toggled with Alt+F), programs are run in this process with a BlockProfiler. once the run has
+        # finished or been stopped, each block is tinted by how much of the time it took and a summary table is written
+        # to profile_path
+        self.profiling = False
+        self.profiler = None
+        self.heat = {}
+        self.profile_path = os.path.join(os.getcwd(), "profile.txt")
+
+        # when running incrementally (toggled with Alt+I), programs are run in this process and a checkpoint is kept
+        # before each block, so the next run only runs the blocks from the first one changed, added or moved since (see
+        # Checkpoints). each run then replaces the last one rather than carrying on from its turtle and trace table
+        self.incremental = False
+        self.checkpoints = None
+
+        # the turtle's trail is drawn onto turtle_canvas, which is kept between frames so only the lines drawn since the
+        # last frame need drawing onto it. it is made again when the screen is resized or the scale (pixels per unit)
+        # changes. it is the size of the screen so lines are drawn (and clipped) exactly as they would be directly onto
+        # the screen, but only the part of it in the turtle pane is shown. 'canvas_lines' is the store of lines drawn
+        # onto it, the first 'canvas_drawn' of which have been, and 'canvas_scale' the scale they were drawn at
+        self.turtle_canvas = None
+        self.canvas_lines = None
+        self.canvas_drawn = 0
+        self.canvas_scale = None
+
+        # each block in the code development environment is drawn onto its own surface once, which is then blitted at
+        # the block's position every frame until the block's tree changes (which gives it a new layout) or the heat
+        # map changes. they are keyed by the block's tree, and forgotten with it. the "Block N" labels, like all other
+        # text, come from the text cache (helpers.textCache)
+        self.block_surfaces = weakref.WeakKeyDictionary()
+        self.max_block_surface = 1 << 24
+
+        # only the parts of the screen which have changed since the last frame are drawn again and updated on the
+        # display. 'dirty' holds the rectangles of the panes (see pane_rects()) marked by damage() as having changed, and
+        # 'turtle_marker' the rectangle the turtle itself was last drawn in, as it can be drawn outside the turtle pane.
+        # when nothing is left to draw and nothing is moving (no program running and nothing being dragged or scrolled),
+        # exec() waits for the next event rather than drawing frames, so an idle window uses no CPU
+        self.dirty = []
+        self.turtle_marker = None
+        self.damage("all")
+
+    # draw the lines the turtle has drawn since the last frame onto the turtle canvas, making it again first if needed
+    def update_turtle_canvas(self):
+        lines = self.turtle.lines
+        if (self.turtle_canvas is None or self.canvas_lines is not lines or len(lines) < self.canvas_drawn or
+                self.canvas_scale != self.turtle.pixels_per_unit):
+            self.turtle_canvas = pygame.Surface((self.scr_width, self.scr_height))
+            self.turtle_canvas.fill((255, 255, 255))
+            self.canvas_lines = lines
+            self.canvas_drawn = 0
+            self.canvas_scale = self.turtle.pixels_per_unit
+        # when lines are coalesced the last line drawn may since have been extended, so it is drawn again
+        start = max(self.canvas_drawn - 1, 0) if lines.coalesce else self.canvas_drawn
+        if start == len(lines):
+            return
+        # the turtle's origin is at the centre of the turtle pane
+        points = lines.array[start:] * self.turtle.pixels_per_unit
+        points[:, 0::2] += self.scr_width // 4 * 3
+        points[:, 1::2] = self.scr_height // 4 - points[:, 1::2]
+        for s_x, s_y, d_x, d_y in points.tolist():
+            pygame.draw.line(self.turtle_canvas, (0, 0, 0), (s_x, s_y), (d_x, d_y))
+        self.canvas_drawn = len(lines)
+
     def draw_turtle(self):
         # draw the turtle's trail
-        for line in self.turtle.lines:
-            pygame.draw.line(self.scr, (0, 0, 0),
-                             (self.scr_width // 4 * 3 + line[0][0] * self.turtle.pixels_per_unit,
-                              self.scr_height // 4 - line[0][1] * self.turtle.pixels_per_unit), (
-                                 self.scr_width // 4 * 3 + line[1][0] * self.turtle.pixels_per_unit,
-                                 self.scr_height // 4 - line[1][1] * self.turtle.pixels_per_unit))
+        self.update_turtle_canvas()
+        self.scr.blit(self.turtle_canvas, (self.scr_width // 2, 0),
+                      [self.scr_width // 2, 0, self.scr_width - self.scr_width // 2, self.scr_height // 2])
 
         # draw the turtle
         # the turtle is made of an equilateral triangle with a 'hole' in the bottom (a circle is drawn at the bottom centre
@@ -97,6 +198,9 @@ class App:
         if (
                 self.scr_width // 4 - 50 - self.scr_width // 12.8 // 2 <= mouse_x <= self.scr_width // 4 - self.scr_width // 12.8 // 2 + 50 and 20 <= mouse_y <= 70):
             pygame.mouse.set_cursor(pygame.SYSTEM_CURSOR_HAND)
+        elif self.current_run is not None and any(
+                x - 50 <= mouse_x <= x + 50 and 20 <= mouse_y <= 70 for x in self.control_button_xs()):
+            pygame.mouse.set_cursor(pygame.SYSTEM_CURSOR_HAND)
         elif self.selected_new_block is not None or self.join_new_block is not None:
             pygame.mouse.set_cursor(pygame.SYSTEM_CURSOR_SIZEALL)
         else:
@@ -110,26 +214,31 @@ class App:
                          self.scr_height - 25, self.FONT,
                          (0, 0, 0))
 
-        # draw all borders
-        pygame.draw.line(self.scr, (0, 0, 0), (self.scr_width // 2, 0), (self.scr_width // 2, self.scr_height), 10)
-        pygame.draw.line(self.scr, (0, 0, 0), (self.scr_width // 2 - self.scr_width // 12.8, 0),
-                         (self.scr_width // 2 - self.scr_width // 12.8, self.scr_height), 10)
+        # draw all borders. these are the pixels 10 pixel wide lines along the edges of the panes would cover, drawn as
+        # rectangles since a thick line is left out altogether when its centre is outside the area being drawn (see
+        # draw), even if some of its width is inside it
+        pygame.draw.rect(self.scr, (0, 0, 0), [self.scr_width // 2 - 4, 0, 10, self.scr_height])
+        pygame.draw.rect(self.scr, (0, 0, 0), [self.scr_width // 2 - self.scr_width // 12.8 - 4, 0, 10, self.scr_height])
 
-        pygame.draw.line(self.scr, (0, 0, 0), (self.scr_width // 2, self.scr_height // 2),
-                         (self.scr_width, self.scr_height // 2), 10)
-        pygame.draw.line(self.scr, (0, 0, 0), (0, self.scr_height - 50),
-                         (self.scr_width // 2 - self.scr_width // 12.8, self.scr_height - 50), 10)
+        pygame.draw.rect(self.scr, (0, 0, 0), [self.scr_width // 2, self.scr_height // 2 - 4,
+                                               self.scr_width - self.scr_width // 2 + 1, 10])
+        pygame.draw.rect(self.scr, (0, 0, 0), [0, self.scr_height - 54,
+                                               self.scr_width // 2 - self.scr_width // 12.8 + 1, 10])
 
     def draw_menu_icons(self):
         # draw all menu icons
         # note: we multiply by 100 to account for the 100 pixels spacing between adjacent menu categories, and add 86 pixels
         # padding (over the block height of 72) to ensure the scroll bar appears below the menu icons for that category
-        for i, row in enumerate(self.menu.items):
-            running_width = 0
-            for icon in row:
-                self.scr.blit(icon, (
-                    self.menu.start_x + running_width - self.menu.offsets[i], self.menu.start_y + (i * 100)))
-                running_width += icon.get_width()
+        # each category is drawn as one blit of its strip, of only the part of it which is on the screen
+        for i in range(len(self.menu.items)):
+            strip = self.menu.strip(i)
+            x = math.floor(self.menu.start_x - self.menu.offsets[i])
+            left = max(0, -x)
+            right = min(strip.get_width(), self.scr_width - x)
+            if left < right:
+                self.scr.blit(strip, (x + left, self.menu.start_y + (i * 100)),
+                              (left, 0, right - left, strip.get_height()))
+            running_width = self.menu.width(i)
             bar_width = self.scr_width // 2 - 10 - self.menu.start_x
             pygame.draw.line(self.scr, (0, 0, 0), (self.menu.start_x, self.menu.start_y + (i * 100) + 86),
                              (self.scr_width // 2 - 10, self.menu.start_y + (i * 100) + 86), 5)
@@ -144,42 +253,62 @@ class App:
         # draw the trace table
         self.trace.length += 1
 
-        containsError = False
-        for k, line in enumerate(flatten(self.current_outputs)):
-            self.scr.blit(self.FONT.render(line, True, (0, 0, 0)),
+        # outputs can grow very long while a program runs, so only the lines (and rows of the trace table) which are
+        # inside the terminal are rendered. the lines are flattened as they arrive rather than every frame
+        top, bottom = self.scr_height // 2 - self.char_height - 10, self.scr_height
+        lines = self.current_outputs
+        line_height = self.char_height + 5
+        first = max(0, math.ceil((top - self.scr_height // 2 - 6 - self.output_offset) / line_height))
+        last = min(len(lines), math.floor((bottom - self.scr_height // 2 - 6 - self.output_offset) / line_height) + 1)
+        for k in range(first, last):
+            self.scr.blit(textCache.render(self.FONT, lines[k], (0, 0, 0)),
                           (self.scr_width // 2 + 10,
-                           self.scr_height // 2 + 6 + k * (self.char_height + 5) + self.output_offset))
-            if "Error" in line or "error" in line:
-                containsError = True
+                           self.scr_height // 2 + 6 + k * line_height + self.output_offset))
+
+        containsError = lines.error
 
         if self.trace.get_num_vars() > 0 and not containsError:
             # top left coordinates of the trace table
-            trace_x, trace_y = self.scr_width // 2 + 10, self.scr_height // 2 + 6 + len(flatten(self.current_outputs)) * (self.char_height + 5) + self.output_offset
+            trace_x, trace_y = self.scr_width // 2 + 10, self.scr_height // 2 + 6 + len(lines) * line_height + self.output_offset
+            # the rows of the table are evenly spaced, so the ones inside the terminal can be found directly. similarly
+            # only the columns starting inside the terminal are drawn
+            row_height = self.trace.height(self.char_height) / self.trace.length
+            first = max(0, math.ceil((top - trace_y) / row_height))
+            last = min(self.trace.length + 1, math.floor((bottom - trace_y) / row_height) + 1)
+            widths = self.trace.column_widths(self.FONT)
+            table_width = sum(widths)
             # draw horizontal separating lines between rows of the table
-            for i in np.linspace(trace_y, trace_y + self.trace.height(self.char_height), self.trace.length + 1):
-                pygame.draw.line(self.scr, (0, 0, 0), (trace_x, i), (trace_x + self.trace.width(self.FONT), i))
+            for j in range(first, last):
+                i = trace_y + j * row_height
+                pygame.draw.line(self.scr, (0, 0, 0), (trace_x, i), (trace_x + table_width, i))
 
             # draw vertical lines which are aligned to fit to the column headers
             running_width = trace_x
-            for i in self.trace.get_vars():
+            for width in widths:
+                if running_width > self.scr_width:
+                    break
                 pygame.draw.line(self.scr, (0, 0, 0), (running_width, trace_y),
                                  (running_width, trace_y + self.trace.height(self.char_height)))
-                running_width += self.FONT.size(i)[0] + 10
+                running_width += width
             pygame.draw.line(self.scr, (0, 0, 0), (running_width, trace_y),
                              (running_width, trace_y + self.trace.height(self.char_height)))
 
             # draw the headers and the values themselves
             running_width = trace_x
-            for key in self.trace.get_vars():
-                lst = [key] + [str(x) for x in self.trace.get_column(key)]
-                for j, i in enumerate(
-                        np.linspace(trace_y, trace_y + self.trace.height(self.char_height), self.trace.length + 1)):
+            start, stop = max(first - 1, 0), min(last, self.trace.length)
+            for key, width in zip(self.trace.get_vars(), widths):
+                if running_width > self.scr_width:
+                    break
+                cells = self.trace.get_cells(key, start, max(stop - 1, start))
+                for j in range(first, stop):
+                    i = trace_y + j * row_height
                     if j == 0:
-                        self.scr.blit(self.BOLD_FONT.render(lst[j], True, (0, 0, 0)), (running_width + 5, i + 5))
-                    elif j < len(lst):
-                        self.scr.blit(self.FONT.render((lst[j] if lst[j] != "None" else ""), True, (0, 0, 0)),
+                        self.scr.blit(textCache.render(self.BOLD_FONT, key, (0, 0, 0)), (running_width + 5, i + 5))
+                    else:
+                        value = cells[j - 1 - start]
+                        self.scr.blit(textCache.render(self.FONT, str(value) if value is not None else "", (0, 0, 0)),
                                       (running_width + 5, i + 5))
-                running_width += self.FONT.size(key)[0] + 10
+                running_width += width
 
         self.trace.length -= 1
 
@@ -197,8 +326,11 @@ class App:
                     (self.scr_width // 2 - 5) - (self.scr_width // 2 - self.scr_width // 12.8 + 5))
             try:
                 ind = mouse_y // 100
-                total_width = sum(x.get_width() for x in self.menu.items[ind])
-                self.menu.offsets[ind] = total_width * fraction
+                total_width = self.menu.width(ind)
+                if self.menu.offsets[ind] != total_width * fraction:
+                    self.menu.offsets[ind] = total_width * fraction
+                    # scrolled icons are drawn beyond the menu too
+                    self.damage("all")
             except IndexError:
                 pass
 
@@ -210,11 +342,49 @@ class App:
         key = event.unicode
         if event.key == pygame.K_BACKSPACE:
             self.enteredText = self.enteredText[:-1]
+            self.damage("input")
         elif event.key == pygame.K_r and (
                 pygame.key.get_pressed()[pygame.K_LALT] or pygame.key.get_pressed()[pygame.K_RALT]):
             self.trace = TraceTable()
+            self.damage("terminal")
+        elif event.key == pygame.K_p and (
+                pygame.key.get_pressed()[pygame.K_LALT] or pygame.key.get_pressed()[pygame.K_RALT]):
+            self.pause_or_resume()
+        elif event.key == pygame.K_x and (
+                pygame.key.get_pressed()[pygame.K_LALT] or pygame.key.get_pressed()[pygame.K_RALT]):
+            self.stop_run()
+        elif event.key == pygame.K_s and (
+                pygame.key.get_pressed()[pygame.K_LALT] or pygame.key.get_pressed()[pygame.K_RALT]):
+            try:
+                Workspace.save(self.code, self.workspace_path)
+            except (OSError, ValueError, struct.error):
+                # the workspace file is left as it was
+                pass
+        elif event.key == pygame.K_o and (
+                pygame.key.get_pressed()[pygame.K_LALT] or pygame.key.get_pressed()[pygame.K_RALT]):
+            if os.path.exists(self.workspace_path):
+                # if the workspace file can't be read (e.g., it has been cut short) the blocks which are there already
+                # are kept, so they aren't lost (or written over the file when it is next saved)
+                try:
+                    self.code = BlockIndex(self.FONT, Workspace.load(self.workspace_path))
+                    self.damage("code")
+                except (OSError, ValueError, struct.error):
+                    pass
+        elif event.key == pygame.K_f and (
+                pygame.key.get_pressed()[pygame.K_LALT] or pygame.key.get_pressed()[pygame.K_RALT]):
+            self.profiling = not self.profiling
+            self.heat = {}
+            self.damage("code")
+        elif event.key == pygame.K_z and (
+                pygame.key.get_pressed()[pygame.K_LALT] or pygame.key.get_pressed()[pygame.K_RALT]):
+            self.passes = () if self.passes else BlockOptimiser.passes
+        elif event.key == pygame.K_i and (
+                pygame.key.get_pressed()[pygame.K_LALT] or pygame.key.get_pressed()[pygame.K_RALT]):
+            self.incremental = not self.incremental
+            self.checkpoints = None
         elif event.key == pygame.K_RETURN:
             k = pygame.key.get_pressed()
+            self.damage("code")
             if self.enteredText == "if":
                 self.code.append(Block(IfElse(None, [], []), 100, 100))
             elif self.enteredText == "while":
@@ -231,16 +401,44 @@ class App:
         elif any(x == event.key for x in numberKeys) or event.key == pygame.K_PERIOD or any(
                 x == event.key for x in alphaKeys) or event.key == 45:
             self.enteredText += key
+            self.damage("input")
 
     def display_blocks(self):
-        # order blocks by y and then x to ensure the order the blocks are labelled is the same as the running order (which
-        # orders by y and then x)
-        order = sorted(self.code, key=lambda l: (l.y, l.x))
+        # blocks are numbered by their position in the code's order by y and then x to ensure the order the blocks are
+        # labelled is the same as the running order
         for block in self.code:
-            draw_text_center(self.scr, f"Block {order.index(block) + 1}", block.x, block.y - 20, self.FONT,
-                             (0, 0, 0))
+            # blocks starting beyond the right or bottom of the code development environment can't be seen, so they
+            # aren't drawn (which also means the trees of blocks loaded from a workspace aren't read until they are)
+            if block.x > self.scr_width // 2 - self.scr_width // 12.8 or block.y - 30 > self.scr_height:
+                continue
+            label = self.label_surface(self.code.number(block))
+            self.scr.blit(label, label.get_rect(center=(block.x, block.y - 20)))
             if isinstance(block, Block):
-                BlockFunctions.drawBlock(self.scr, self.FONT, block.block, block.x, block.y)
+                surface = self.block_surface(block.block)
+                if surface is not None:
+                    self.scr.blit(surface, (block.x, block.y))
+                else:
+                    BlockFunctions.drawBlock(self.scr, self.FONT, block.block, block.x, block.y, heat=self.heat)
+
+    def label_surface(self, num):
+        return textCache.render(self.FONT, f"Block {num}", (0, 0, 0))
+
+    # the surface a block's tree is drawn onto, drawing it again if it has changed since it was last drawn. the surface
+    # is transparent apart from the block itself, so overlapping blocks are drawn as they would be directly. empty
+    # spaces and trees too big for a surface (over max_block_surface pixels) are drawn directly instead, giving None
+    def block_surface(self, tree):
+        if tree is None:
+            return None
+        layout = BlockFunctions.layout.get(tree, self.FONT)
+        cached = self.block_surfaces.get(tree)
+        if cached is None or cached[0] is not layout or cached[1] is not self.heat:
+            height = 50 + 10 * BlockFunctions.get_max_depth(tree)
+            if layout.width * height > self.max_block_surface:
+                return None
+            surface = pygame.Surface((layout.width, height), pygame.SRCALPHA)
+            BlockFunctions.drawBlock(surface, self.FONT, tree, 0, 0, heat=self.heat)
+            cached = self.block_surfaces[tree] = (layout, self.heat, surface)
+        return cached[2]
 
     def on_mouse_button_up(self):
         # handling dragging logic to pan around in the code development environment
@@ -257,15 +455,12 @@ class App:
             self.selected_new_block = None
         if self.join_new_block is not None:
             mouse_x, mouse_y = pygame.mouse.get_pos()
-            for block in self.code:
-                if block.x <= mouse_x <= block.x + BlockFunctions.get_width(
-                        block.block,
-                        self.FONT) and block.y <= mouse_y <= block.y + 50 + 10 * BlockFunctions.get_max_depth(
-                    block.block):
-                    BlockFunctions.addBlock(self.FONT, block.block, self.join_new_block, mouse_x, mouse_y,
-                                            block.x,
-                                            block.y)
-                    break
+            block = self.code.at(mouse_x, mouse_y)
+            if block is not None:
+                BlockFunctions.addBlock(self.FONT, block.block, self.join_new_block, mouse_x, mouse_y,
+                                        block.x,
+                                        block.y)
+                self.code.update(block)
             else:
                 self.code.append(Block(self.join_new_block, mouse_x, mouse_y))
             self.join_new_block = None
@@ -273,13 +468,49 @@ class App:
     def on_mouse_button_down(self):
         mouse_x, mouse_y = pygame.mouse.get_pos()
         if self.scr_width // 4 - 50 - self.scr_width // 12.8 // 2 <= mouse_x <= self.scr_width // 4 - self.scr_width // 12.8 // 2 + 50 and 20 <= mouse_y <= 70:
-            # sort blocks by their y position, and in rare instances of y positions being equal, their x
-            run_order = sorted(self.code, key=lambda l: (l.y, l.x))
+            # blocks are run in order of their y position, and in rare instances of y positions being equal, their x
+            run_order = self.code.ordered()
             now = datetime.datetime.now().strftime("Run time: %d/%m/%Y %H:%M:%S")
-            line_length = self.scr_width // 2 // self.char_width - 1
-            self.current_outputs = BlockFunctions.executeBlocks(run_order, line_length, self.turtle, self.trace,
-                                                                self.globals,
-                                                                now)
+            line_length = self.terminal_line_length()
+            # a program which is still running is stopped before the new one starts. the new one is only started here,
+            # and is run a bit each frame in exec(), with its outputs drawn as they are produced
+            self.stop_run()
+            self.current_run = None
+            self.profiler = BlockProfiler() if self.profiling else None
+            self.heat = {}
+            # checkpoints are only kept by runs in this process, and only while no other kind of run has been started
+            if self.incremental and self.profiler is None:
+                if self.checkpoints is None:
+                    self.checkpoints = Checkpoints()
+            else:
+                self.checkpoints = None
+            if self.run_in_worker and self.profiler is None and self.checkpoints is None:
+                log = OutputLog(line_length, self.output_capacity, self.output_spill)
+                try:
+                    self.current_run = WorkerRun(run_order, line_length, self.turtle, self.trace, self.globals, now,
+                                                 self.passes, self.run_time_limit, self.run_memory_limit, log)
+                except (OSError, TypeError, pickle.PicklingError, RecursionError):
+                    # if a process can't be started, or the program can't be pickled to send to it (e.g., it is too
+                    # deeply nested), the program is run in this one instead
+                    log.close()
+            if self.current_run is None:
+                self.current_run = ProgramRun(run_order, line_length, self.turtle, self.trace, self.globals, now,
+                                              self.passes, self.profiler,
+                                              OutputLog(line_length, self.output_capacity, self.output_spill),
+                                              self.checkpoints)
+                # carrying on from a checkpoint may have removed lines already drawn onto the turtle canvas
+                if self.checkpoints is not None:
+                    self.canvas_lines = None
+            # a run carrying on from a checkpoint carries on writing to the last run's outputs
+            if self.current_outputs is not self.current_run.outputs:
+                self.current_outputs.close()
+            self.current_outputs = self.current_run.outputs
+        elif self.current_run is not None and self.control_button_xs()[0] - 50 <= mouse_x <= \
+                self.control_button_xs()[0] + 50 and 20 <= mouse_y <= 70:
+            self.pause_or_resume()
+        elif self.current_run is not None and self.control_button_xs()[1] - 50 <= mouse_x <= \
+                self.control_button_xs()[1] + 50 and 20 <= mouse_y <= 70:
+            self.stop_run()
         # if the user presses down on a block in the menu to add (as part of dragging it into the code
         # development environment) we store it so later when they release the mouse in the CDE we can add the
         # correct block
@@ -289,15 +520,10 @@ class App:
             ind = (mouse_y - self.menu.start_y) // 100
             # we only need to account for three categories
             if ind < 3:
-                running_width = self.menu.start_x - self.menu.offsets[ind]
-                for i, icon in enumerate(self.menu.items[ind]):
-                    if running_width <= mouse_x <= running_width + icon.get_width():
-                        item_name = self.menu.item_names[ind][i]
-                        break
-                    running_width += icon.get_width()
-                if item_name in ops:
+                item_name = self.menu.item_at(ind, mouse_x)
+                if item_name in self.menu.item_names[0]:
                     self.selected_new_block = Operation(item_name[-5], None, None)
-                elif item_name in comps:
+                elif item_name in self.menu.item_names[1]:
                     self.selected_new_block = Comparison(item_name[-5], None, None)
                 elif item_name == "turtle2Dmovement.png":
                     self.selected_new_block = Turtle2DMovement(None, None, None, None)
@@ -309,19 +535,23 @@ class App:
             # we check if we made to drag any blocks. if so, we will either add it into an empty space in another block
             # or just readd it back into the code development environment. as such we copy that block to self.join_new
             # _block.
-            for b, block in enumerate(self.code):
-                if block.x <= mouse_x <= block.x + BlockFunctions.get_width(
-                        block.block,
-                        self.FONT) and block.y <= mouse_y <= block.y + 50 + 10 * BlockFunctions.get_max_depth(
-                    block.block):
-                    self.join_new_block = block.block
-                    del self.code[b]
-                    break
+            block = self.code.at(mouse_x, mouse_y)
+            if block is not None:
+                self.join_new_block = block.block
+                self.code.remove(block)
 
     def change_screen_size(self):
         # change the size of the screen
         self.scr_width, self.scr_height = self.scr.get_size()
+        self.turtle_canvas = None
         self.menu.start_x = self.scr_width // 2 - self.scr_width // 12.8 + 10
+        # the outputs are wrapped again to fit the terminal's new width
+        self.current_outputs.resize(self.terminal_line_length())
+        self.damage("all")
+
+    # the number of characters which fit on a line of the terminal
+    def terminal_line_length(self):
+        return self.scr_width // 2 // self.char_width - 1
 
     def on_pan(self):
         # logic to deal with updating the offset of the code development environment as the mouse is being held during a pan
@@ -334,9 +564,10 @@ class App:
                     self.prev_mouse_x, self.prev_mouse_y = None, None
             elif self.selected_new_block is None and self.join_new_block is None:
                 new_mouse_x, new_mouse_y = pygame.mouse.get_pos()
-                for block in self.code:
-                    block.x += self.sensitivity * (new_mouse_x - self.prev_mouse_x)
-                    block.y += self.sensitivity * (new_mouse_y - self.prev_mouse_y)
+                if (new_mouse_x, new_mouse_y) != (self.prev_mouse_x, self.prev_mouse_y):
+                    self.code.pan(self.sensitivity * (new_mouse_x - self.prev_mouse_x),
+                                  self.sensitivity * (new_mouse_y - self.prev_mouse_y))
+                    self.damage("code")
                 self.prev_mouse_x = new_mouse_x
                 self.prev_mouse_y = new_mouse_y
 
@@ -347,6 +578,56 @@ class App:
         draw_text_center(self.scr, "▶ Run", self.scr_width // 4 - self.scr_width // 12.8 // 2, 45, self.FONT,
                          (0, 0, 0))
 
+    # centre x coordinates of the pause/resume and stop buttons, which are either side of the run button while a
+    # program is running
+    def control_button_xs(self):
+        run_x = self.scr_width // 4 - self.scr_width // 12.8 // 2
+        return run_x - 110, run_x + 110
+
+    def draw_control_buttons(self):
+        if self.current_run is None:
+            return
+        pause_x, stop_x = self.control_button_xs()
+        pygame.draw.rect(self.scr, (255, 200, 0), [pause_x - 50, 20, 100, 50], border_radius=20)
+        draw_text_center(self.scr, "▶ Resume" if self.current_run.paused else "Pause", pause_x, 45, self.FONT,
+                         (0, 0, 0))
+        pygame.draw.rect(self.scr, (255, 0, 0), [stop_x - 50, 20, 100, 50], border_radius=20)
+        draw_text_center(self.scr, "Stop", stop_x, 45, self.FONT, (0, 0, 0))
+
+    def pause_or_resume(self):
+        if self.current_run is not None:
+            if self.current_run.paused:
+                self.current_run.resume()
+            else:
+                self.current_run.pause()
+            self.damage("code")
+
+    def stop_run(self):
+        if self.current_run is not None:
+            self.current_run.stop()
+            self.end_run()
+
+    # run the current program for this frame's share of time, forgetting it once it has finished. while it runs its
+    # outputs, trace table and turtle change every frame
+    def advance_run(self):
+        if self.current_run is not None:
+            if self.current_run.running:
+                self.damage("terminal", "turtle")
+            if self.current_run.advance(ms=self.run_time):
+                self.end_run()
+
+    def end_run(self):
+        self.current_run = None
+        # the control buttons go, and the blocks may be tinted by how long they took
+        self.damage("all")
+        if self.profiler is not None:
+            self.heat = self.profiler.heat()
+            self.profiler.dump(self.profile_path)
+            # along with how well the text cache is doing, as rendering text is a large part of drawing each frame
+            with open(self.profile_path, "a") as f:
+                f.write(textCache.report() + "\n")
+            self.profiler = None
+
     def frame_to_disp(self, f):
         # log is undefined at 0 so just set displacement as 0
         if f == 0:
@@ -361,16 +642,25 @@ class App:
         if keys[pygame.K_DOWN] and self.current_outputs:
             self.output_offset -= self.frame_to_disp(self.frames)
             self.frames += 1
+            self.damage("terminal")
         if keys[pygame.K_UP] and self.current_outputs:
             self.output_offset += self.frame_to_disp(self.frames)
             self.frames += 1
+            self.damage("terminal")
 
     def exec(self):
         run = True
         while run:
-            for event in pygame.event.get():
+            events = pygame.event.get()
+            # nothing will change until something happens, so wait for it rather than drawing identical frames
+            if not events and self.idle():
+                events = [pygame.event.wait()]
+            for event in events:
                 if event.type == pygame.QUIT:
                     run = False
+                # clicks and drags can change any pane, and the window's contents may need drawing again once it is shown
+                if event.type in (pygame.MOUSEBUTTONUP, pygame.MOUSEBUTTONDOWN, pygame.WINDOWEXPOSED):
+                    self.damage("all")
                 if event.type == pygame.MOUSEBUTTONUP:
                     self.on_mouse_button_up()
                 if event.type == pygame.VIDEORESIZE:
@@ -383,7 +673,7 @@ class App:
                     if self.frames and (event.key == pygame.K_DOWN or event.key == pygame.K_UP):
                         self.frames = 0
 
-            self.scr.fill((255, 255, 255))
+            self.advance_run()
 
             self.on_pan()
 
@@ -392,18 +682,95 @@ class App:
 
             self.set_output_offset()
 
+            self.draw()
+            self.set_mouse_hand()
+
+            self.clock.tick(self.FPS)
+
+    # whether nothing is left to draw and nothing is moving: no program is running, and the mouse button and the keys
+    # scrolling the terminal aren't held down
+    def idle(self):
+        keys = pygame.key.get_pressed()
+        return (not self.dirty and (self.current_run is None or not self.current_run.running) and
+                not pygame.mouse.get_pressed()[0] and not keys[pygame.K_DOWN] and not keys[pygame.K_UP])
+
+    # the rectangle of each pane of the screen: the code development environment ("code") with the block adding bar
+    # ("input") below it, the menu, the turtle pane and the terminal (with the trace table)
+    def pane_rects(self):
+        code_width = self.scr_width // 2 - self.scr_width // 12.8
+        return {
+            "code": pygame.Rect(0, 0, code_width, self.scr_height - 50),
+            "input": pygame.Rect(0, self.scr_height - 50, code_width, 50),
+            "menu": pygame.Rect(code_width, 0, self.scr_width // 2 - code_width, self.scr_height),
+            "turtle": pygame.Rect(self.scr_width // 2, 0, self.scr_width - self.scr_width // 2, self.scr_height // 2),
+            "terminal": pygame.Rect(self.scr_width // 2, self.scr_height // 2, self.scr_width - self.scr_width // 2,
+                                    self.scr_height - self.scr_height // 2),
+        }
+
+    # mark panes (by name, or "all" for the whole screen) or other rectangles as needing drawing in the next frame
+    def damage(self, *areas):
+        rects = self.pane_rects()
+        for area in areas:
+            if area == "all":
+                self.dirty.append(self.scr.get_rect())
+            elif isinstance(area, str):
+                self.dirty.append(rects[area])
+            else:
+                rect = pygame.Rect(area).clip(self.scr.get_rect())
+                if rect:
+                    self.dirty.append(rect)
+
+    # the rectangle the turtle is drawn in, or None if it is off the screen
+    def turtle_marker_rect(self):
+        x = self.scr_width // 4 * 3 + self.turtle.x * self.turtle.pixels_per_unit
+        y = self.scr_height // 4 - self.turtle.y * self.turtle.pixels_per_unit
+        if not (-20 < x < self.scr_width + 20 and -20 < y < self.scr_height + 20):
+            return None
+        return pygame.Rect(math.floor(x) - 12, math.floor(y) - 12, 26, 26)
+
+    # draw the parts of the screen which have changed and update them on the display. the changed rectangles in each
+    # pane are merged into one, and each pane which has changed is drawn on its own, so two panes far apart changing
+    # (e.g., typing in the block adding bar while a program runs) doesn't mean drawing everything between them too
+    def draw(self):
+        marker = self.turtle_marker_rect()
+        if marker != self.turtle_marker:
+            self.damage(*(rect for rect in (self.turtle_marker, marker) if rect is not None))
+            self.turtle_marker = marker
+        if not self.dirty:
+            return
+        rects = self.pane_rects()
+        areas = []
+        for pane in rects.values():
+            pieces = [rect.clip(pane) for rect in self.dirty if rect.colliderect(pane)]
+            if pieces:
+                areas.append(pieces[0].unionall(pieces[1:]))
+        for clip in areas:
+            self.draw_area(clip, rects)
+        self.scr.set_clip(None)
+        pygame.display.update(areas)
+        self.dirty = []
+
+    # draw the screen clipped to 'clip'. everything is drawn in the same order as when drawing the whole screen, so it
+    # looks the same as it would
+    def draw_area(self, clip, rects):
+        self.scr.set_clip(clip)
+        self.scr.fill((255, 255, 255))
+
+        # the blocks and the buttons are only seen in the code development environment, as anything drawn beyond it is
+        # drawn over by the panes to its right and the block adding bar
+        if clip.colliderect(rects["code"]):
             self.display_blocks()
             self.draw_run_button()
+            self.draw_control_buttons()
 
-            pygame.draw.rect(self.scr, (255, 255, 255),
-                             [self.scr_width // 2 - self.scr_width // 12.8, 0,
-                              self.scr_width // 2 + self.scr_width // 12.8, self.scr_height])
+        pygame.draw.rect(self.scr, (255, 255, 255),
+                         [self.scr_width // 2 - self.scr_width // 12.8, 0,
+                          self.scr_width // 2 + self.scr_width // 12.8, self.scr_height])
 
+        # similarly, the outputs and trace table are only seen in the terminal
+        if clip.colliderect(rects["terminal"]):
             self.draw_terminal_output()
-            self.draw_menu_icons()
-            self.draw_turtle()
-            self.draw_icons_borders()
-            self.set_mouse_hand()
-
-            pygame.display.update()
+        self.draw_menu_icons()
+        self.draw_turtle()
+        self.draw_icons_borders()
 
@@ -0,0 +1,111 @@
+import os
+import json
+import struct
+
+# the directories holding the icons of each category of block in the menu, and the height icons are scaled to
+CATEGORIES = ["operations", "comparisons", "turtle2D"]
+ICON_HEIGHT = 72
+# the start of an atlas file, followed by the length of its header
+MAGIC = b"CBXA1"
+HEADER = struct.Struct("<I")
+
+
+# loads the icons of the menu only when they are first asked for (i.e., once the window exists) rather than when the
+# program starts. the icons are scaled to ICON_HEIGHT pixels high (operations and comparisons are square, so are scaled
+# to ICON_HEIGHT x ICON_HEIGHT, while other icons keep their proportions) and packed one above another into a single
+# atlas surface, each icon being a subsurface of it.
+# the atlas is cached on disk at 'path' as a header (the source files it was built from with their sizes and
+# modification times, the names of the icons in each category and where each is in the atlas) followed by its raw RGBA
+# pixels, so later starts load every icon in one read without decoding or scaling any images. the atlas is built again
+# from the icons whenever any of them is added, removed or changed
+class Assets:
+    def __init__(self, root=None, path=None):
+        self.root = root if root is not None else os.getcwd()
+        self.path = path if path is not None else os.path.join(self.root, ".icons.atlas")
+        self.atlas = None
+        self.rects = None
+        self.items = None
+        self.item_names = None
+
+    # the file name, size and modification time of every icon in each category
+    def sources(self):
+        return [[[name, *self.stat(category, name)] for name in os.listdir(os.path.join(self.root, category))
+                 if name.endswith(".png")] for category in CATEGORIES]
+
+    def stat(self, category, name):
+        stat = os.stat(os.path.join(self.root, category, name))
+        return [stat.st_size, stat.st_mtime_ns]
+
+    # the icons of each category as lists of surfaces, and their file names, loading them if they haven't been yet
+    def icons(self):
+        if self.items is None:
+            sources = self.sources()
+            if not self.read(sources):
+                self.build(sources)
+                self.write(sources)
+        return self.items, self.item_names
+
+    # load the cached atlas if it was built from the same icons, returning whether it was
+    def read(self, sources):
+        import pygame
+        try:
+            with open(self.path, "rb") as f:
+                data = f.read()
+            if not data.startswith(MAGIC):
+                return False
+            start = len(MAGIC) + HEADER.size
+            end = start + HEADER.unpack_from(data, len(MAGIC))[0]
+            header = json.loads(data[start:end].decode("utf-8"))
+            width, height = header["size"]
+            if header["sources"] != sources or len(data) - end != width * height * 4:
+                return False
+            self.atlas = pygame.image.frombytes(data[end:], (width, height), "RGBA")
+        except (OSError, ValueError, KeyError, struct.error):
+            return False
+        self.items = [[self.atlas.subsurface(rect) for rect in rects] for rects in header["rects"]]
+        self.item_names = [[source[0] for source in category] for category in sources]
+        return True
+
+    # load and scale the icons, and pack them into the atlas
+    def build(self, sources):
+        import pygame
+        items = []
+        for category, names in zip(CATEGORIES, sources):
+            icons = [pygame.image.load(os.path.join(self.root, category, name)) for name, _, _ in names]
+            if category == "turtle2D":
+                items.append([pygame.transform.scale(
+                    o, (o.get_width() // (o.get_height() / ICON_HEIGHT), ICON_HEIGHT)) for o in icons])
+            else:
+                items.append([pygame.transform.scale(o, (ICON_HEIGHT, ICON_HEIGHT)) for o in icons])
+        # the atlas is built from the pixels of each icon rather than by blitting them, so they are copied exactly
+        # whether or not they are transparent
+        width = max([icon.get_width() for icons in items for icon in icons], default=1)
+        rows, rects, y = [], [], 0
+        for icons in items:
+            rects.append([])
+            for icon in icons:
+                w, h = icon.get_size()
+                pixels = pygame.image.tobytes(icon, "RGBA")
+                padding = bytes(4 * (width - w))
+                rows.extend(pixels[4 * w * row:4 * w * (row + 1)] + padding for row in range(h))
+                rects[-1].append([0, y, w, h])
+                y += h
+        if y:
+            self.atlas = pygame.image.frombytes(b"".join(rows), (width, y), "RGBA")
+        else:
+            self.atlas = pygame.Surface((1, 1), pygame.SRCALPHA)
+        self.rects = rects
+        self.items = [[self.atlas.subsurface(rect) for rect in category] for category in rects]
+        self.item_names = [[source[0] for source in category] for category in sources]
+
+    # save the atlas to the cache, which is only an optimisation so failing to is ignored
+    def write(self, sources):
+        import pygame
+        header = json.dumps({"sources": sources, "size": list(self.atlas.get_size()), "rects": self.rects}).encode(
+            "utf-8")
+        try:
+            with open(self.path + ".tmp", "wb") as f:
+                f.write(MAGIC + HEADER.pack(len(header)) + header + pygame.image.tobytes(self.atlas, "RGBA"))
+            os.replace(self.path + ".tmp", self.path)
+        except OSError:
+            pass
@@ -0,0 +1,2 @@
+# benchmarks for running programs through BlockFunctions.executeBlocks, without pygame. run with 'python -m benchmarks'
+# from the directory main.py is in (see benchmarks/__main__.py)
@@ -0,0 +1,122 @@
+import sys
+import json
+import time
+import argparse
+import platform
+import tracemalloc
+from helpers import *
+from blocks import *
+from trace import TraceTable
+from globalsStack import GlobalsStack
+from benchmarks.generators import benchmarks
+
+
+# runs each of the synthetic programs in benchmarks/generators.py through BlockFunctions.executeBlocks and reports:
+# - iterations per second: how many times the whole program can be run per second
+# - peak memory: the most memory allocated at once during a run (measured in a separate run, as tracing allocations
+#   slows it down)
+# - trace growth: the number of rows and columns in the trace table after a run
+# results can be saved as JSON, and compared against results saved before, e.g.:
+#     python -m benchmarks --save baseline.json
+#     python -m benchmarks --baseline baseline.json
+# a benchmark has regressed if it runs slower or uses more memory than the baseline by more than the tolerance, in
+# which case the exit status is 1
+
+
+def parseArgs(args):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description="Benchmark running block programs.")
+    parser.add_argument("names", nargs="*", help="benchmarks to run (all of them if none are given)")
+    parser.add_argument("--engine", choices=("compiled", "vm", "interpreted"), default="compiled")
+    parser.add_argument("--passes", nargs="*", default=[], help="optimisation passes to run, e.g. fold dead hoist cse")
+    parser.add_argument("--min-time", type=float, default=1, help="seconds to keep running each benchmark for")
+    parser.add_argument("--save", help="save the results as JSON to this file")
+    parser.add_argument("--baseline", help="compare the results with those saved in this file")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="fraction worse than the baseline allowed")
+    return parser.parse_args(args)
+
+
+def runOnce(run_order, engine, passes):
+    turtle, trace = Turtle2D(), TraceTable()
+    outputs = BlockFunctions.executeBlocks(run_order, 80, turtle, trace, GlobalsStack(), "", engine, passes)
+    return outputs, trace, turtle
+
+
+# time running a program over and over for at least 'min_time' seconds. the turtle, trace and globals are made before
+# each run starts, so only running the program is timed
+def benchmark(run_order, engine, passes, min_time):
+    runs, elapsed = 0, 0
+    while elapsed < min_time or runs < 3:
+        turtle, trace, globals = Turtle2D(), TraceTable(), GlobalsStack()
+        start = time.perf_counter()
+        BlockFunctions.executeBlocks(run_order, 80, turtle, trace, globals, "", engine, passes)
+        elapsed += time.perf_counter() - start
+        runs += 1
+
+    tracemalloc.start()
+    outputs, trace, turtle = runOnce(run_order, engine, passes)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {
+        "iterations_per_second": runs / elapsed,
+        "seconds_per_iteration": elapsed / runs,
+        "peak_memory_bytes": peak,
+        "trace_rows": trace.length if trace.get_num_vars() else 0,
+        "trace_columns": trace.get_num_vars(),
+        "output_lines": len(flatten(outputs)),
+        "turtle_lines": len(turtle.lines),
+    }
+
+
+# the benchmarks which have regressed compared with the baseline, with a description of how
+def compare(results, baseline, tolerance):
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        old = baseline[name]
+        speed = result["iterations_per_second"] / old["iterations_per_second"]
+        memory = result["peak_memory_bytes"] / max(old["peak_memory_bytes"], 1)
+        print(f"{name:>16}: {speed:6.2f}x speed, {memory:6.2f}x peak memory compared with the baseline")
+        if speed < 1 - tolerance:
+            regressions.append(f"{name} runs at {speed:.2f}x the speed of the baseline")
+        if memory > 1 + tolerance:
+            regressions.append(f"{name} uses {memory:.2f}x the peak memory of the baseline")
+        if (result["trace_rows"], result["trace_columns"]) != (old["trace_rows"], old["trace_columns"]):
+            regressions.append(f"{name}'s trace table is a different size to the baseline's")
+    return regressions
+
+
+def main(args=None):
+    args = parseArgs(args)
+    names = args.names or list(benchmarks)
+    unknown = [name for name in names if name not in benchmarks]
+    if unknown:
+        print(f"unknown benchmarks: {', '.join(unknown)}", file=sys.stderr)
+        return 2
+
+    results = {}
+    for name in names:
+        result = benchmark(benchmarks[name](), args.engine, args.passes, args.min_time)
+        results[name] = result
+        print(f"{name:>16}: {result['iterations_per_second']:10.2f} it/s, "
+              f"peak memory {result['peak_memory_bytes'] / 2 ** 20:8.2f} MB, "
+              f"trace {result['trace_rows']} rows x {result['trace_columns']} columns")
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump({"engine": args.engine, "passes": args.passes, "python": platform.python_version(),
+                       "results": results}, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+        regressions = compare(results, baseline, args.tolerance)
+        for regression in regressions:
+            print(f"regression: {regression}")
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
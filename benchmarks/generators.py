@@ -0,0 +1,63 @@
+from blocks import *
+
+
+# generators for the synthetic programs the benchmarks run. each returns a run order (a list of Block) whose size is
+# set by its argument, built without recursion so large sizes can be used
+
+
+# a single expression statement made of an operation tree 'depth' operations deep, alternating + and × so the value
+# stays small
+def deepOperations(depth=200):
+    expr = Number(1)
+    for i in range(depth):
+        expr = Operation("+" if i % 2 else "×", expr, Number(1))
+    return [Block(expr, 0, 0)]
+
+
+# a while loop counting i from 0 to 'count'
+def countingLoop(count=20000):
+    return [
+        Block(Assignment("i", Number(0)), 0, 0),
+        Block(While(Comparison("<", Variable("i"), Number(count)),
+                    [Assignment("i", Operation("+", Variable("i"), Number(1)))]), 0, 100),
+    ]
+
+
+# a loop running 'count' times over a ladder of if/else blocks 'depth' deep, each testing i against a different bound
+def ifLadder(depth=30, count=500):
+    ladder = Assignment("r", Variable("i"))
+    for d in range(depth, 0, -1):
+        ladder = IfElse(Comparison("<", Variable("i"), Number(d * count // depth)), [Assignment("r", Number(d))],
+                        [ladder])
+    return [
+        Block(Assignment("i", Number(0)), 0, 0),
+        Block(While(Comparison("<", Variable("i"), Number(count)),
+                    [ladder, Assignment("i", Operation("+", Variable("i"), Number(1)))]), 0, 100),
+    ]
+
+
+# a loop assigning to 'variables' variables each of 'count' times, so the trace table grows by a row per assignment
+def assignmentHeavy(variables=10, count=500):
+    names = [f"v{k}" for k in range(variables)]
+    stats = [Assignment(name, Operation("+", Variable("i"), Number(k))) for k, name in enumerate(names)]
+    return [
+        Block(Assignment("i", Number(0)), 0, 0),
+        Block(While(Comparison("<", Variable("i"), Number(count)),
+                    stats + [Assignment("i", Operation("+", Variable("i"), Number(1)))]), 0, 100),
+    ]
+
+
+# 'count' top level turtle blocks, alternately moving forward and rotating
+def turtleSteps(count=2000):
+    return [Block(Turtle2DMoveForward(Number(1 + k % 5)) if k % 2 == 0 else Turtle2DRotate(Number(7)), 0, k * 100)
+            for k in range(count)]
+
+
+# the benchmarks run by default, by name
+benchmarks = {
+    "deepOperations": deepOperations,
+    "countingLoop": countingLoop,
+    "ifLadder": ifLadder,
+    "assignmentHeavy": assignmentHeavy,
+    "turtleSteps": turtleSteps,
+}
@@ -0,0 +1,108 @@
+import bisect
+import math
+from blocks import *
+
+# the width and height of each cell of the grid blocks are found in, in pixels
+CELL = 256
+
+
+# the blocks in the code development environment, which takes the place of the list of them the App kept so blocks can
+# be found and numbered without going through all of them.
+# each block's bounding rectangle is kept in a uniform grid of CELL x CELL cells, so finding the block under the mouse
+# only checks the blocks in the cell the mouse is in. the blocks are also kept sorted by y and then x (the order they are
+# run and labelled in), so a block's number is found by a binary search.
+# both are kept in coordinates relative to how far the code development environment has been panned, so panning moves
+# the blocks without changing either. blocks with the same position are ordered by when they were added, as sorting the
+# list of blocks did; iterating over the index gives the blocks in the order they were added, as the list did.
+# the rectangles of blocks loaded from a workspace are only worked out (reading their trees) when a block is first
+# looked for, and that of a block must be worked out again with update() when its tree is changed
+class BlockIndex:
+    def __init__(self, font, blocks=()):
+        self.font = font
+        # for each block (in the order they were added): its sort key and the cells its rectangle is in, if known
+        self.entries = {}
+        # (y, x, number added, block) of each block, sorted
+        self.order = []
+        self.grid = {}
+        self.unplaced = set()
+        self.added = 0
+        self.offset_x, self.offset_y = 0, 0
+        for block in blocks:
+            self.append(block)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __iter__(self):
+        return iter(list(self.entries))
+
+    def __contains__(self, block):
+        return block in self.entries
+
+    def append(self, block):
+        key = (block.y - self.offset_y, block.x - self.offset_x, self.added)
+        self.added += 1
+        self.entries[block] = [key, ()]
+        bisect.insort(self.order, key + (block,))
+        self.unplaced.add(block)
+
+    def remove(self, block):
+        key, cells = self.entries.pop(block)
+        del self.order[bisect.bisect_left(self.order, key)]
+        self.unplace(block, cells)
+        self.unplaced.discard(block)
+
+    # move every block by dx, dy (i.e., pan the code development environment)
+    def pan(self, dx, dy):
+        for block in self.entries:
+            block.x += dx
+            block.y += dy
+        self.offset_x += dx
+        self.offset_y += dy
+
+    # the block's tree has changed, so its rectangle must be worked out again
+    def update(self, block):
+        self.unplace(block, self.entries[block][1])
+        self.entries[block][1] = ()
+        self.unplaced.add(block)
+
+    # the position of the block in the run order, counting from 1
+    def number(self, block):
+        return bisect.bisect_left(self.order, self.entries[block][0]) + 1
+
+    # the blocks sorted by y and then x, i.e., the order they are run in
+    def ordered(self):
+        return [entry[3] for entry in self.order]
+
+    def rectangle(self, block):
+        return (block.x, block.y, block.x + BlockFunctions.get_width(block.block, self.font),
+                block.y + 50 + 10 * BlockFunctions.get_max_depth(block.block))
+
+    def place(self, block):
+        left, top, right, bottom = self.rectangle(block)
+        cells = [(i, j) for i in range(math.floor((left - self.offset_x) / CELL),
+                                        math.floor((right - self.offset_x) / CELL) + 1)
+                 for j in range(math.floor((top - self.offset_y) / CELL), math.floor((bottom - self.offset_y) / CELL) + 1)]
+        for cell in cells:
+            self.grid.setdefault(cell, set()).add(block)
+        self.entries[block][1] = cells
+
+    def unplace(self, block, cells):
+        for cell in cells:
+            blocks = self.grid[cell]
+            blocks.discard(block)
+            if not blocks:
+                del self.grid[cell]
+
+    # the first block added whose rectangle contains the point, or None if there isn't one
+    def at(self, x, y):
+        while self.unplaced:
+            self.place(self.unplaced.pop())
+        found = None
+        cell = (math.floor((x - self.offset_x) / CELL), math.floor((y - self.offset_y) / CELL))
+        for block in self.grid.get(cell, ()):
+            left, top, right, bottom = self.rectangle(block)
+            if left <= x <= right and top <= y <= bottom and (
+                    found is None or self.entries[block][0][2] < self.entries[found][0][2]):
+                found = block
+        return found
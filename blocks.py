@@ -1,6 +1,7 @@
 import math
-import pygame
-from constants import *
+import bisect
+import weakref
+from itertools import accumulate
 from helpers import *
 
 
@@ -55,14 +56,18 @@ class While:
         self.stats = stats + [None]
 
 
+# the lines the turtle has drawn are kept in a SegmentStore. if 'coalesce' is set, moving forward in a straight line over
+# several blocks draws one line rather than one per block (see SegmentStore)
 class Turtle2D:
-    def __init__(self):
+    def __init__(self, coalesce=False):
+        # imported here as it needs numpy, so importing this module to build or read blocks doesn't
+        from segments import SegmentStore
         self.x = 0
         self.y = 0
         # angle is from horizontal - pi/2 rad or 90 deg ensures it's pointing up initially
         self.angle = math.pi / 2
         self.pixels_per_unit = 20
-        self.lines = []
+        self.lines = SegmentStore(coalesce)
 
     def move(self, dist):
         # use trig to move by a certain distance in the direction of the angle the turtle currently is in
@@ -99,6 +104,10 @@ class Turtle2DRotate:
 
 # stores information about the menu from which new blocks can be chosen and added. stores each icon to be displayed for
 # adding, and the offset of each category of icons.
+# the icons of each category are laid out side by side, so the x of the left edge of each icon in its category (and
+# then the width of the whole category) is kept as a running sum, which the icon at any x is found in with a binary
+# search. each category is also drawn onto one wide strip the first time it is drawn, so drawing a category is a single
+# blit however many icons it has
 class Menu:
     def __init__(self, items, item_names, start_x, start_y):
         self.items = items
@@ -106,6 +115,32 @@ class Menu:
         self.offsets = [0 for _ in range(len(items))]
         self.start_x = start_x
         self.start_y = start_y
+        self.edges = [list(accumulate((icon.get_width() for icon in row), initial=0)) for row in items]
+        self.strips = [None for _ in range(len(items))]
+
+    def width(self, ind):
+        return self.edges[ind][-1]
+
+    # the icons of a category on one transparent surface. they are copied onto it with BLEND_RGBA_MAX, which (as none
+    # of them overlap) copies their pixels exactly, so blitting the strip draws them exactly as blitting each would
+    def strip(self, ind):
+        import pygame
+        if self.strips[ind] is None:
+            strip = pygame.Surface((max(self.width(ind), 1), max([icon.get_height() for icon in self.items[ind]],
+                                                                 default=1)), pygame.SRCALPHA)
+            strip.fill((0, 0, 0, 0))
+            for icon, x in zip(self.items[ind], self.edges[ind]):
+                strip.blit(icon, (x, 0), special_flags=pygame.BLEND_RGBA_MAX)
+            self.strips[ind] = strip
+        return self.strips[ind]
+
+    # the name of the icon of a category at x on the screen, or None if there isn't one there. where two icons meet,
+    # the one on the left is chosen
+    def item_at(self, ind, x):
+        x -= self.start_x - self.offsets[ind]
+        if not 0 <= x <= self.width(ind):
+            return None
+        return self.item_names[ind][max(bisect.bisect_left(self.edges[ind], x, 1) - 1, 0)]
 
 
 # combines an expression/block tree with its associated x and y to draw it at
@@ -116,71 +151,144 @@ class Block:
         self.y = y
 
 
+# the layout of one block when drawn with a font: its width and the x offsets from its left edge of the blocks directly
+# inside it, in the order they are drawn
+class Layout:
+    def __init__(self, font, width, offsets):
+        self.font = font
+        self.width = width
+        self.offsets = offsets
+
+
+# caches the layout and depth of every block drawn or hit tested, so that drawing a tree works out each block's layout
+# once rather than again at every level above it (which made drawing deep trees quadratic) and again every frame.
+# they are keyed by the block itself (blocks are only equal to themselves) and are forgotten when the block is.
+# changing a block changes the layout and depth of it and every block it is inside, so BlockFunctions.addBlock calls
+# invalidate() on each block along the path down to the one it changes, and those of the rest of the tree are kept
+class LayoutCache:
+    def __init__(self):
+        self.layouts = weakref.WeakKeyDictionary()
+        self.depths = weakref.WeakKeyDictionary()
+
+    def get(self, block, font):
+        layout = self.layouts.get(block)
+        if layout is None or layout.font is not font:
+            layout = self.layouts[block] = self.measure(block, font)
+        return layout
+
+    def width(self, block, font):
+        if block is None:
+            return 20
+        return self.get(block, font).width
+
+    # the max depth of a tree - we want the height of a block to account for the deepest subblock. if it is a leaf node,
+    # its max depth is inherently 1. otherwise it is one more than the max depth of the blocks directly inside it
+    def depth(self, block):
+        if block is None or isinstance(block, Number) or isinstance(block, Variable):
+            return 1
+        depth = self.depths.get(block)
+        if depth is None:
+            depth = self.depths[block] = 1 + max(self.depth(child) for child in BlockFunctions.children(block))
+        return depth
+
+    def invalidate(self, block):
+        if block is not None:
+            self.layouts.pop(block, None)
+            self.depths.pop(block, None)
+
+    def clear(self):
+        self.layouts.clear()
+        self.depths.clear()
+
+    # work out the layout of a block from those of the blocks inside it, as BlockFunctions.drawBlock draws it
+    def measure(self, block, font):
+        if isinstance(block, Number) or isinstance(block, Variable):
+            content = block.n if isinstance(block, Number) else block.name
+            return Layout(font, textCache.size(font, str(content))[0] + 20, [])
+        if isinstance(block, Operation) or isinstance(block, Comparison):
+            left = self.width(block.left, font)
+            return Layout(font, left + self.width(block.right, font) + 30, [5, left + 25])
+        if isinstance(block, IfElse) or isinstance(block, While):
+            first, second = ("if", "then") if isinstance(block, IfElse) else ("while", "do")
+            offsets = [5 + textCache.size(font, first)[0]]
+            x = 10 + textCache.size(font, first)[0] + self.width(block.cond, font) + textCache.size(font, second)[0]
+            for i, statement in enumerate(BlockFunctions.children(block)[1:]):
+                # the else statements start after the word else
+                if isinstance(block, IfElse) and i == len(block.true):
+                    x += textCache.size(font, "else")[0]
+                offsets.append(x)
+                x += 5 + self.width(statement, font)
+            return Layout(font, x + (20 if isinstance(block, IfElse) else 15), offsets)
+        # turtle and assignment blocks: a label followed by their arguments, each 5 pixels on from the one before
+        if isinstance(block, Turtle2DMovement):
+            label = "move"
+        elif isinstance(block, Turtle2DMoveForward):
+            label = "moveForward"
+        elif isinstance(block, Turtle2DRotate):
+            label = "rotate"
+        else:
+            label = block.varName + " <- "
+        children = BlockFunctions.children(block)
+        offsets = []
+        x = 5 + textCache.size(font, label)[0]
+        for child in children:
+            offsets.append(x)
+            x += self.width(child, font) + 5
+        return Layout(font, x + (10 if len(children) == 1 else 0), offsets)
+
+
 # static class for block functions
 class BlockFunctions:
-    # get the max depth of a tree - we want the height of a block to account for the deepest subblock
-    # if it is a leaf node, its max depth is inherently 1. otherwise, take each of the subtrees, and find their max depth.
-    # the depth of the tree is just this plus the root node which adds 1 to the depth.
+    # the layouts of blocks, shared by everything drawing or hit testing them
+    layout = LayoutCache()
+
+    # the blocks directly inside a block, in the order they are drawn
+    @staticmethod
+    def children(block):
+        if isinstance(block, Assignment):
+            return [block.expr]
+        if isinstance(block, Operation) or isinstance(block, Comparison):
+            return [block.left, block.right]
+        if isinstance(block, IfElse):
+            return [block.cond] + block.true + block.false
+        if isinstance(block, While):
+            return [block.cond] + block.stats
+        if isinstance(block, Turtle2DMovement):
+            return [block.start_x, block.start_y, block.dest_x, block.dest_y]
+        if isinstance(block, Turtle2DMoveForward):
+            return [block.dist]
+        if isinstance(block, Turtle2DRotate):
+            return [block.angle]
+        return []
+
+    # get the max depth of a tree (see LayoutCache.depth)
     @staticmethod
     def get_max_depth(block):
-        if isinstance(block, Number) or block is None or isinstance(block, Variable):
-            return 1
-        elif isinstance(block, Comparison) or isinstance(block, Operation):
-            return 1 + max(BlockFunctions.get_max_depth(block.left), BlockFunctions.get_max_depth(block.right))
-        elif isinstance(block, Turtle2DMovement):
-            return 1 + max(BlockFunctions.get_max_depth(block.start_x), BlockFunctions.get_max_depth(block.start_y),
-                           BlockFunctions.get_max_depth(block.dest_x),
-                           BlockFunctions.get_max_depth(block.dest_y))
-        elif isinstance(block, Turtle2DMoveForward):
-            return 1 + BlockFunctions.get_max_depth(block.dist)
-        elif isinstance(block, Turtle2DRotate):
-            return 1 + BlockFunctions.get_max_depth(block.angle)
-        elif isinstance(block, Assignment):
-            return 1 + BlockFunctions.get_max_depth(block.expr)
-        elif isinstance(block, IfElse):
-            return 1 + max(BlockFunctions.get_max_depth(block.cond), max(BlockFunctions.get_max_depth(x) for x in block.true),
-                           max(BlockFunctions.get_max_depth(x) for x in block.false))
-        elif isinstance(block, While):
-            return 1 + max(BlockFunctions.get_max_depth(block.cond), max(BlockFunctions.get_max_depth(x) for x in block.stats))
+        return BlockFunctions.layout.depth(block)
 
     # get the width a block needs to be. this is used to find the left offset to draw blocks in the drawing functions, and
     # get a block's overall width
     @staticmethod
     def get_width(block, font):
-        if block is None:
-            return 20
-        if isinstance(block, Number):
-            return font.size(str(block.n))[0] + 20
-        elif isinstance(block, Variable):
-            return font.size(str(block.name))[0] + 20
-        elif isinstance(block, Operation) or isinstance(block, Comparison):
-            return BlockFunctions.get_width(block.left, font) + BlockFunctions.get_width(block.right, font) + 30
-        elif isinstance(block, Turtle2DMovement):
-            return BlockFunctions.get_width(block.start_x, font) + BlockFunctions.get_width(block.start_y, font) + BlockFunctions.get_width(
-                block.dest_x, font) + BlockFunctions.get_width(
-                block.dest_y, font) + 25 + font.size("move")[0]
-        elif isinstance(block, Turtle2DMoveForward):
-            return BlockFunctions.get_width(block.dist, font) + 20 + font.size("moveForward")[0]
-        elif isinstance(block, Turtle2DRotate):
-            return BlockFunctions.get_width(block.angle, font) + 20 + font.size("rotate")[0]
-        elif isinstance(block, Assignment):
-            return BlockFunctions.get_width(block.expr, font) + 20 + font.size(block.varName + " <- ")[0]
-        elif isinstance(block, IfElse):
-            return BlockFunctions.get_width(block.cond, font) + 30 + font.size("if")[0] + font.size("then")[0] + font.size("else")[
-                0] + 5 * (
-                    len(block.true) + len(block.false)) + sum(BlockFunctions.get_width(x, font) for x in block.true) + sum(
-                BlockFunctions.get_width(x, font) for x in block.false)
-        elif isinstance(block, While):
-            return 5 + font.size("while")[0] + 5 + BlockFunctions.get_width(block.cond, font) + 5 + font.size("do")[0] + 5 + 5 * len(block.stats) + sum(BlockFunctions.get_width(x, font) for x in block.stats) + 5
+        return BlockFunctions.layout.width(block, font)
+
+    # the x offsets of the blocks directly inside a block from its left edge, in the same order as children()
+    @staticmethod
+    def get_offsets(block, font):
+        return BlockFunctions.layout.get(block, font).offsets
 
     # recursive drawing subroutine
     # input the block (and on recursive calls the subblock) and the x y to draw it at
     # in general, for a block, first calculate its overall width and height to determine the size of the bounding box to
     # draw. from get_width(), this accounts for all separations in width/height due to padding/text.
-    # then, from the widths of all the subblocks which are its parameters, again using get_width(), we can find the
-    # respective x values to draw the blocks at. for the y values, for each depth we simply add one more layer of padding.
+    # then, from the widths of all the subblocks which are its parameters, get_offsets() gives the respective x values
+    # to draw the blocks at. for the y values, for each depth we simply add one more layer of padding.
+    # 'heat' (from BlockProfiler.heat) optionally gives how hot each block is, from 0 to 1, and each block is tinted red
+    # by that much over its background, under the blocks inside it
     @staticmethod
-    def drawBlock(surf, font, block, x, y, last_height=None):
+    def drawBlock(surf, font, block, x, y, last_height=None, heat=None):
+        # pygame is only imported when blocks are drawn, so programs can be built and run without it (see headless.py)
+        import pygame
         overall_width = BlockFunctions.get_width(block, font)
         max_depth = BlockFunctions.get_max_depth(block)
         overall_height = 50 + 10 * max_depth
@@ -192,17 +300,19 @@ class BlockFunctions:
                                                                                                           Variable) else None
             if last_height is not None:
                 pygame.draw.rect(surf, termColour,
-                                 [x, y, font.size(str(content))[0] + 20, 50])
-                draw_text_center(surf, str(content), x + font.size(str(content))[0] // 2 + 10,
+                                 [x, y, textCache.size(font, str(content))[0] + 20, 50])
+                BlockFunctions.tint(surf, block, [x, y, textCache.size(font, str(content))[0] + 20, 50], heat)
+                draw_text_center(surf, str(content), x + textCache.size(font, str(content))[0] // 2 + 10,
                                  y + 25,
                                  font, (0, 0, 0))
                 pygame.draw.rect(surf, termOutlineColour,
-                                 [x, y, font.size(str(content))[0] + 20, 50], 2)
+                                 [x, y, textCache.size(font, str(content))[0] + 20, 50], 2)
                 return
             else:
-                pygame.draw.rect(surf, termColour, [x, y, font.size(str(content))[0] + 20, 50])
-                draw_text_center(surf, str(content), x + font.size(str(content))[0] // 2 + 10, y + 25, font, (0, 0, 0))
-                pygame.draw.rect(surf, termOutlineColour, [x, y, font.size(str(content))[0] + 20, 50], 2)
+                pygame.draw.rect(surf, termColour, [x, y, textCache.size(font, str(content))[0] + 20, 50])
+                BlockFunctions.tint(surf, block, [x, y, textCache.size(font, str(content))[0] + 20, 50], heat)
+                draw_text_center(surf, str(content), x + textCache.size(font, str(content))[0] // 2 + 10, y + 25, font, (0, 0, 0))
+                pygame.draw.rect(surf, termOutlineColour, [x, y, textCache.size(font, str(content))[0] + 20, 50], 2)
                 return
         elif block is None:
             pygame.draw.rect(surf, (255, 255, 255), [x, y, 20, 50])
@@ -229,94 +339,97 @@ class BlockFunctions:
                     (62, 97, 107) if isinstance(block, Operation) else (111, 40, 17) if isinstance(block,
                                                                                                    Comparison) else (
                         0, 0, 0)), [x, y, overall_width, overall_height], 2)
+            BlockFunctions.tint(surf, block, [x, y, overall_width, overall_height], heat)
 
             draw_text_center(surf, block.sign, x + left_width + 15, (2 * y + overall_height) // 2, font, (0, 0, 0))
-            BlockFunctions.drawBlock(surf, font, block.left, x + 5, y + 5, last_height=overall_height)
-            BlockFunctions.drawBlock(surf, font, block.right, x + left_width + 25, y + 5, last_height=overall_height)
+            offsets = BlockFunctions.get_offsets(block, font)
+            BlockFunctions.drawBlock(surf, font, block.left, x + offsets[0], y + 5, last_height=overall_height, heat=heat)
+            BlockFunctions.drawBlock(surf, font, block.right, x + offsets[1], y + 5, last_height=overall_height, heat=heat)
         elif isinstance(block, Turtle2DMovement):
             pygame.draw.rect(surf, (152, 59, 191), [x, y, overall_width, overall_height])
             pygame.draw.rect(surf, (71, 29, 96), [x, y, overall_width, overall_height], 2)
-            draw_text_center(surf, "move", x + 5 + font.size("move")[0] // 2, (2 * y + overall_height) // 2, font,
+            BlockFunctions.tint(surf, block, [x, y, overall_width, overall_height], heat)
+            draw_text_center(surf, "move", x + 5 + textCache.size(font, "move")[0] // 2, (2 * y + overall_height) // 2, font,
                              (0, 0, 0))
-            BlockFunctions.drawBlock(surf, font, block.start_x, x + 5 + font.size("move")[0], y + 5,
-                                     last_height=overall_height)
-            BlockFunctions.drawBlock(surf, font, block.start_y,
-                                     x + font.size("move")[0] + 10 + BlockFunctions.get_width(block.start_x, font),
-                                     y + 5,
-                                     last_height=overall_height)
-            BlockFunctions.drawBlock(surf, font, block.dest_x,
-                                     x + font.size("move")[0] + 15 + BlockFunctions.get_width(block.start_x,
-                                                                                              font) + BlockFunctions.get_width(
-                                         block.start_y, font),
-                                     y + 5, last_height=overall_height)
-            BlockFunctions.drawBlock(surf, font, block.dest_y,
-                                     x + font.size("move")[0] + 20 + BlockFunctions.get_width(block.start_x,
-                                                                                              font) + BlockFunctions.get_width(
-                                         block.start_y, font) + BlockFunctions.get_width(
-                                         block.dest_x, font), y + 5, last_height=overall_height)
+            for child, offset in zip(BlockFunctions.children(block), BlockFunctions.get_offsets(block, font)):
+                BlockFunctions.drawBlock(surf, font, child, x + offset, y + 5, last_height=overall_height, heat=heat)
         elif isinstance(block, Turtle2DMoveForward):
             pygame.draw.rect(surf, (152, 59, 191), [x, y, overall_width, overall_height])
             pygame.draw.rect(surf, (71, 29, 96), [x, y, overall_width, overall_height], 2)
-            draw_text_center(surf, "moveForward", x + 5 + font.size("moveForward")[0] // 2,
+            BlockFunctions.tint(surf, block, [x, y, overall_width, overall_height], heat)
+            draw_text_center(surf, "moveForward", x + 5 + textCache.size(font, "moveForward")[0] // 2,
                              (2 * y + overall_height) // 2,
                              font, (0, 0, 0))
-            BlockFunctions.drawBlock(surf, font, block.dist, x + 5 + font.size("moveForward")[0], y + 5,
-                                     last_height=overall_height)
+            BlockFunctions.drawBlock(surf, font, block.dist, x + BlockFunctions.get_offsets(block, font)[0], y + 5,
+                                     last_height=overall_height, heat=heat)
         elif isinstance(block, Turtle2DRotate):
             pygame.draw.rect(surf, (152, 59, 191), [x, y, overall_width, overall_height])
             pygame.draw.rect(surf, (71, 29, 96), [x, y, overall_width, overall_height], 2)
-            draw_text_center(surf, "rotate", x + 5 + font.size("rotate")[0] // 2, (2 * y + overall_height) // 2, font,
+            BlockFunctions.tint(surf, block, [x, y, overall_width, overall_height], heat)
+            draw_text_center(surf, "rotate", x + 5 + textCache.size(font, "rotate")[0] // 2, (2 * y + overall_height) // 2, font,
                              (0, 0, 0))
-            BlockFunctions.drawBlock(surf, font, block.angle, x + 5 + font.size("rotate")[0], y + 5,
-                                     last_height=overall_height)
+            BlockFunctions.drawBlock(surf, font, block.angle, x + BlockFunctions.get_offsets(block, font)[0], y + 5,
+                                     last_height=overall_height, heat=heat)
         elif isinstance(block, Assignment):
             pygame.draw.rect(surf, (255, 128, 128), [x, y, overall_width, overall_height])
             pygame.draw.rect(surf, (128, 64, 64), [x, y, overall_width, overall_height], 2)
-            draw_text_center(surf, block.varName + " <- ", x + 5 + font.size(block.varName + " <- ")[0] // 2,
+            BlockFunctions.tint(surf, block, [x, y, overall_width, overall_height], heat)
+            draw_text_center(surf, block.varName + " <- ", x + 5 + textCache.size(font, block.varName + " <- ")[0] // 2,
                              (2 * y + overall_height) // 2, font,
                              (0, 0, 0))
-            BlockFunctions.drawBlock(surf, font, block.expr, x + 5 + font.size(block.varName + " <- ")[0], y + 5,
-                                     last_height=overall_height)
+            BlockFunctions.drawBlock(surf, font, block.expr, x + BlockFunctions.get_offsets(block, font)[0], y + 5,
+                                     last_height=overall_height, heat=heat)
         elif isinstance(block, IfElse):
             pygame.draw.rect(surf, (255, 255, 0), [x, y, overall_width, overall_height])
             pygame.draw.rect(surf, (128, 128, 0), [x, y, overall_width, overall_height], 2)
-            draw_text_center(surf, "if", x + 5 + font.size("if")[0] // 2, (2 * y + overall_height) // 2, font,
+            BlockFunctions.tint(surf, block, [x, y, overall_width, overall_height], heat)
+            draw_text_center(surf, "if", x + 5 + textCache.size(font, "if")[0] // 2, (2 * y + overall_height) // 2, font,
                              (0, 0, 0))
-            BlockFunctions.drawBlock(surf, font, block.cond, x + 5 + font.size("if")[0], y + 5,
-                                     last_height=overall_height)
+            offsets = BlockFunctions.get_offsets(block, font)
+            BlockFunctions.drawBlock(surf, font, block.cond, x + offsets[0], y + 5,
+                                     last_height=overall_height, heat=heat)
             draw_text_center(surf, "then",
-                             x + 5 + font.size("if")[0] + BlockFunctions.get_width(block.cond, font) +
-                             font.size("then")[0] // 2,
+                             x + 5 + textCache.size(font, "if")[0] + BlockFunctions.get_width(block.cond, font) +
+                             textCache.size(font, "then")[0] // 2,
                              (2 * y + overall_height) // 2, font, (0, 0, 0))
-            start_x = x + 10 + font.size("if")[0] + BlockFunctions.get_width(block.cond, font) + font.size("then")[0]
-            for statement in block.true:
-                BlockFunctions.drawBlock(surf, font, statement, start_x, y + 5, last_height=overall_height)
-                start_x += 5 + BlockFunctions.get_width(statement, font)
-            start_x += 20
+            for statement, offset in zip(block.true, offsets[1:]):
+                BlockFunctions.drawBlock(surf, font, statement, x + offset, y + 5, last_height=overall_height, heat=heat)
+            # the false statements start after the word else, which is drawn 20 pixels on from the end of the last true
+            # statement
+            start_x = x + offsets[1 + len(block.true)] - textCache.size(font, "else")[0] + 20
             draw_text_center(surf, "else", start_x, (2 * y + overall_height) // 2, font, (0, 0, 0))
             draw_text_center(surf, "else", start_x, (2 * y + overall_height) // 2, font, (0, 0, 0))
-            start_x += font.size("else")[0] - 20
-            for statement in block.false:
-                BlockFunctions.drawBlock(surf, font, statement, start_x, y + 5, last_height=overall_height)
-                start_x += 5 + BlockFunctions.get_width(statement, font)
+            for statement, offset in zip(block.false, offsets[1 + len(block.true):]):
+                BlockFunctions.drawBlock(surf, font, statement, x + offset, y + 5, last_height=overall_height, heat=heat)
         elif isinstance(block, While):
             pygame.draw.rect(surf, (255, 0, 255), [x, y, overall_width, overall_height])
             pygame.draw.rect(surf, (128, 0, 128), [x, y, overall_width, overall_height], 2)
-            draw_text_center(surf, "while", x + 5 + font.size("while")[0] // 2, (2 * y + overall_height) // 2, font, (0, 0, 0))
-            BlockFunctions.drawBlock(surf, font, block.cond, x + 5 + font.size("while")[0], y + 5, last_height=overall_height)
+            BlockFunctions.tint(surf, block, [x, y, overall_width, overall_height], heat)
+            draw_text_center(surf, "while", x + 5 + textCache.size(font, "while")[0] // 2, (2 * y + overall_height) // 2, font, (0, 0, 0))
+            offsets = BlockFunctions.get_offsets(block, font)
+            BlockFunctions.drawBlock(surf, font, block.cond, x + offsets[0], y + 5, last_height=overall_height, heat=heat)
             draw_text_center(surf, "do",
-                             x + 5 + font.size("while")[0] + BlockFunctions.get_width(block.cond, font) +
-                             font.size("do")[0] // 2 + 2,
+                             x + 5 + textCache.size(font, "while")[0] + BlockFunctions.get_width(block.cond, font) +
+                             textCache.size(font, "do")[0] // 2 + 2,
                              (2 * y + overall_height) // 2, font, (0, 0, 0))
-            start_x = x + 10 + font.size("while")[0] + BlockFunctions.get_width(block.cond, font) + font.size("do")[0]
-            for statement in block.stats:
-                BlockFunctions.drawBlock(surf, font, statement, start_x, y + 5, last_height=overall_height)
-                start_x += 5 + BlockFunctions.get_width(statement, font)
+            for statement, offset in zip(block.stats, offsets[1:]):
+                BlockFunctions.drawBlock(surf, font, statement, x + offset, y + 5, last_height=overall_height, heat=heat)
+
+    # tint the rectangle of a block by how hot it is (see drawBlock)
+    @staticmethod
+    def tint(surf, block, rect, heat):
+        import pygame
+        if heat and heat.get(block, 0) > 0:
+            overlay = pygame.Surface((rect[2], rect[3]), pygame.SRCALPHA)
+            overlay.fill((255, 0, 0, int(200 * heat[block])))
+            surf.blit(overlay, (rect[0], rect[1]))
 
     # Evaluate expressions (can include some boolean arithmetic edge cases - like True + True evaluates to 2)
     # The 'prev' parameter displays appropriate error messages about missing arguments if a None is found
+    # If an ExpressionCache is given as 'cache', the values of operations and comparisons are kept in it and used again
+    # until a variable they read is assigned to
     @staticmethod
-    def evaluateExpr(block, globals, prev=""):
+    def evaluateExpr(block, globals, prev="", cache=None):
         # base case if it is a number or a variable - just appropriately retrieve the value from the object/globals dict
         # or just provide that value
         if isinstance(block, Number):
@@ -325,32 +438,41 @@ class BlockFunctions:
             return globals[block.name]
         if not (isinstance(block, Operation) or isinstance(block, Comparison)):
             raise SyntaxError(prev)
+        if cache is not None and block in cache:
+            return cache[block]
 
         # evaluate left and right subtrees recursively then apply the operator to the results
         evalLeft = BlockFunctions.evaluateExpr(block.left, globals, prev=(
             "arithmetic operation" if isinstance(block, Operation) else "comparison" if isinstance(block,
-                                                                                                   Comparison) else ""))
+                                                                                                   Comparison) else ""),
+                                               cache=cache)
         evalRight = BlockFunctions.evaluateExpr(block.right, globals, prev=(
             "arithmetic operation" if isinstance(block, Operation) else "comparison" if isinstance(block,
-                                                                                                   Comparison) else ""))
+                                                                                                   Comparison) else ""),
+                                                cache=cache)
 
         match block.sign:
             case "+":
-                return evalLeft + evalRight
+                value = evalLeft + evalRight
             case "-":
-                return evalLeft - evalRight
+                value = evalLeft - evalRight
             case "×":
-                return evalLeft * evalRight
+                value = evalLeft * evalRight
             case "÷":
-                return evalLeft / evalRight
+                value = evalLeft / evalRight
             case "^":
-                return evalLeft ** evalRight
+                value = evalLeft ** evalRight
             case ">":
-                return evalLeft > evalRight
+                value = evalLeft > evalRight
             case "<":
-                return evalLeft < evalRight
+                value = evalLeft < evalRight
             case "=":
-                return evalLeft == evalRight
+                value = evalLeft == evalRight
+            case _:
+                value = None
+        if cache is not None:
+            cache.store(block, value)
+        return value
 
     # evaluate if statements, which contain two sets of statements to execute, one if the condition expression is true
     # and the other if the condition expression is false. each statement can either be an if statement itself or a normal
@@ -358,25 +480,27 @@ class BlockFunctions:
     # note that between the following four methods for block execution, many parameters are passed by reference so they
     # are modified in place, e.g., the globals, turtle and trace
     @staticmethod
-    def evaluateIfElse(block, num, turtle, trace, globals, run_order, line_length):
+    def evaluateIfElse(block, num, turtle, trace, globals, run_order, line_length, cache=None):
         globals.push()
+        if cache is not None:
+            cache.push()
         try:
-            if BlockFunctions.evaluateExpr(block.cond, globals):
+            if BlockFunctions.evaluateExpr(block.cond, globals, cache=cache):
                 for statement in block.true:
                     if isinstance(statement, IfElse):
-                        yield from BlockFunctions.evaluateIfElse(statement, num, turtle, trace, globals, run_order, line_length)
+                        yield from BlockFunctions.evaluateIfElse(statement, num, turtle, trace, globals, run_order, line_length, cache)
                     elif isinstance(statement, While):
-                        yield from BlockFunctions.evaluateWhile(statement, num, turtle, trace, globals, run_order, line_length)
+                        yield from BlockFunctions.evaluateWhile(statement, num, turtle, trace, globals, run_order, line_length, cache)
                     else:
-                        yield from BlockFunctions.execute(statement, num, turtle, trace, globals, run_order, line_length)
+                        yield from BlockFunctions.execute(statement, num, turtle, trace, globals, run_order, line_length, cache)
             else:
                 for statement in block.false:
                     if isinstance(statement, IfElse):
-                        yield from BlockFunctions.evaluateIfElse(statement, num, turtle, trace, globals, run_order, line_length)
+                        yield from BlockFunctions.evaluateIfElse(statement, num, turtle, trace, globals, run_order, line_length, cache)
                     elif isinstance(statement, While):
-                        yield from BlockFunctions.evaluateWhile(statement, num, turtle, trace, globals, run_order, line_length)
+                        yield from BlockFunctions.evaluateWhile(statement, num, turtle, trace, globals, run_order, line_length, cache)
                     else:
-                        yield from BlockFunctions.execute(statement, num, turtle, trace, globals, run_order, line_length)
+                        yield from BlockFunctions.execute(statement, num, turtle, trace, globals, run_order, line_length, cache)
         except SyntaxError:
             output = f"Error running block {num}: missing or invalid condition provided to if statement"
             yield wrap(output, line_length)
@@ -395,20 +519,24 @@ class BlockFunctions:
         # regardless of what happens we need to exit the current scope when done with the if, so a finally block is used
         finally:
             globals.pop()
+            if cache is not None:
+                cache.pop()
 
     @staticmethod
-    def evaluateWhile(block, num, turtle, trace, globals, run_order, line_length):
+    def evaluateWhile(block, num, turtle, trace, globals, run_order, line_length, cache=None):
         globals.push()
+        if cache is not None:
+            cache.push()
         try:
-            while BlockFunctions.evaluateExpr(block.cond, globals):
+            while BlockFunctions.evaluateExpr(block.cond, globals, cache=cache):
                 for statement in block.stats:
                     if isinstance(statement, IfElse):
-                        yield from BlockFunctions.evaluateIfElse(statement, num, turtle, trace, globals, run_order, line_length)
+                        yield from BlockFunctions.evaluateIfElse(statement, num, turtle, trace, globals, run_order, line_length, cache)
                     elif isinstance(statement, While):
                         yield from BlockFunctions.evaluateWhile(statement, num, turtle, trace, globals, run_order,
-                                                                 line_length)
+                                                                 line_length, cache)
                     else:
-                        yield from BlockFunctions.execute(statement, num, turtle, trace, globals, run_order, line_length)
+                        yield from BlockFunctions.execute(statement, num, turtle, trace, globals, run_order, line_length, cache)
         except SyntaxError:
             output = f"Error running block {num}: missing or invalid condition provided to while statement"
             yield wrap(output, line_length)
@@ -426,13 +554,15 @@ class BlockFunctions:
             yield wrap(output, line_length)
         finally:
             globals.pop()
+            if cache is not None:
+                cache.pop()
 
     @staticmethod
-    def execute(block, num, turtle, trace, globals, run_order, line_length):
+    def execute(block, num, turtle, trace, globals, run_order, line_length, cache=None):
         if isinstance(block, Comparison) or isinstance(block, Operation) or isinstance(
                 block, Number) or isinstance(block, Variable):
             try:
-                output = f"Ran block {num}: " + str(BlockFunctions.evaluateExpr(block, globals))
+                output = f"Ran block {num}: " + str(BlockFunctions.evaluateExpr(block, globals, cache=cache))
             except SyntaxError as e:
                 output = f"Error running block {num}: missing or invalid argument provided to {e}"
             except OverflowError:
@@ -446,8 +576,10 @@ class BlockFunctions:
             yield wrap(output, line_length)
         elif isinstance(block, Turtle2DMovement):
             try:
-                s_x, s_y = BlockFunctions.evaluateExpr(block.start_x, globals), BlockFunctions.evaluateExpr(block.start_y, globals)
-                d_x, d_y = BlockFunctions.evaluateExpr(block.dest_x, globals), BlockFunctions.evaluateExpr(block.dest_y, globals)
+                s_x, s_y = (BlockFunctions.evaluateExpr(block.start_x, globals, cache=cache),
+                            BlockFunctions.evaluateExpr(block.start_y, globals, cache=cache))
+                d_x, d_y = (BlockFunctions.evaluateExpr(block.dest_x, globals, cache=cache),
+                            BlockFunctions.evaluateExpr(block.dest_y, globals, cache=cache))
                 output = f"Ran block {num}"
                 turtle.relocate(s_x, s_y)
                 delta_x = d_x - s_x
@@ -472,8 +604,7 @@ class BlockFunctions:
                         angle += math.pi
                 turtle.angle = angle
                 turtle.move(dist)
-                if [(s_x, s_y), (d_x, d_y)] not in turtle.lines:
-                    turtle.lines.append([(s_x, s_y), (d_x, d_y)])
+                turtle.lines.add(s_x, s_y, d_x, d_y)
             except SyntaxError:
                 output = f"Error running block {num}: missing or invalid argument provided to turtle movement"
             except OverflowError:
@@ -489,9 +620,9 @@ class BlockFunctions:
             output = f"Ran block {num}"
             s_x, s_y = turtle.x, turtle.y
             try:
-                turtle.move(BlockFunctions.evaluateExpr(block.dist, globals))
+                turtle.move(BlockFunctions.evaluateExpr(block.dist, globals, cache=cache))
                 d_x, d_y = turtle.x, turtle.y
-                turtle.lines.append([(s_x, s_y), (d_x, d_y)])
+                turtle.lines.forward(s_x, s_y, d_x, d_y, turtle.angle)
             except SyntaxError:
                 output = f"Error running block {num}: missing or invalid argument provided to turtle move forward"
             except OverflowError:
@@ -506,7 +637,7 @@ class BlockFunctions:
         elif isinstance(block, Turtle2DRotate):
             output = f"Ran block {num}"
             try:
-                turtle.angle += math.radians(BlockFunctions.evaluateExpr(block.angle, globals))
+                turtle.angle += math.radians(BlockFunctions.evaluateExpr(block.angle, globals, cache=cache))
             except SyntaxError:
                 output = f"Error running block {num}: missing or invalid argument provided to turtle rotation"
             except OverflowError:
@@ -521,8 +652,11 @@ class BlockFunctions:
         elif isinstance(block, Assignment):
             output = f"Ran block {num}"
             try:
-                trace.update(block.varName, BlockFunctions.evaluateExpr(block.expr, globals))
-                globals[block.varName] = BlockFunctions.evaluateExpr(block.expr, globals)
+                value = BlockFunctions.evaluateExpr(block.expr, globals, cache=cache)
+                trace.update(block.varName, value)
+                globals[block.varName] = value
+                if cache is not None:
+                    cache.invalidate(block.varName)
             except SyntaxError:
                 output = f"Error running block {num}: missing or invalid argument provided to assignment"
             except OverflowError:
@@ -535,33 +669,93 @@ class BlockFunctions:
                 output = f"Error running block {num}: unexpected error while parsing"
             yield wrap(output, line_length)
 
+    # run each block in the run order, returning a list of the outputs of each block (preceded by the run time). by
+    # default each block is first compiled into a tree of closures by BlockCompiler, which gives the same outputs as
+    # walking the tree with the methods above but much faster. engine="vm" runs the blocks on BlockVM, which has no
+    # limit on how deeply blocks can be nested, and engine="interpreted" walks the tree instead, keeping the values of
+    # expressions in an ExpressionCache so they are only evaluated again once a variable they read is assigned to.
+    # 'passes' chooses which of BlockOptimiser's passes (e.g., ("fold", "dead", "hoist", "cse")) are run on the blocks
+    # before they are compiled. they aren't run when walking the tree as it can't run the blocks they make.
+    # if a BlockProfiler is given as 'profiler', the blocks are run on BlockVM with the time each block takes recorded in
+    # it, whatever the engine, and without any passes (so the times are recorded for the blocks as they are drawn).
+    # if an OutputLog is given as 'log', each line is written to it as it is output (the generators walking the tree
+    # are consumed a line at a time) rather than collected into lists, and the log is returned instead, so only as many
+    # lines as the log keeps are held in memory however many the program outputs
     @staticmethod
-    def executeBlocks(run_order, line_length, turtle, trace, globals, now):
+    def executeBlocks(run_order, line_length, turtle, trace, globals, now, engine="compiled", passes=(),
+                      profiler=None, log=None):
         outputs = []
+        if log is not None:
+            log.write(now)
+        if profiler is not None:
+            engine, passes = "vm", ()
         try:
-            for block in run_order:
-                if isinstance(block.block, IfElse):
-                    outputs.append(list(
-                        BlockFunctions.evaluateIfElse(block.block, run_order.index(block) + 1, turtle, trace, globals,
-                                                      run_order, line_length)))
-                elif isinstance(block.block, While):
-                    outputs.append(list(
-                        BlockFunctions.evaluateWhile(block.block, run_order.index(block) + 1, turtle, trace, globals,
-                                                      run_order, line_length)))
-                else:
-                    outputs.append(list(
-                        BlockFunctions.execute(block.block, run_order.index(block) + 1, turtle, trace, globals, run_order,
-                                               line_length)))
+            if passes and engine != "interpreted":
+                from passes import BlockOptimiser
+                run_order = BlockOptimiser.optimise(run_order, passes)
+            if engine == "compiled":
+                # imported here as the compiler itself depends on the block classes in this module
+                from compiler import BlockCompiler
+                from resolver import ScopeResolver
+                resolution = ScopeResolver.resolve([block.block for block in run_order], globals)
+                for num, block in enumerate(run_order, 1):
+                    # blocks are compiled one at a time just before they are run, so if compiling a block fails the
+                    # outputs of the blocks before it are kept, as they would be when walking the tree
+                    statement = BlockCompiler.compileStatement(block.block, num, resolution)
+                    output = []
+                    statement(turtle, trace, globals,
+                              log.write if log is not None else lambda line: output.append(wrap(line, line_length)))
+                    if log is None:
+                        outputs.append(output)
+            elif engine == "vm":
+                from vm import BlockVM
+                vm = BlockVM(run_order, turtle, trace, globals)
+                # when writing to a log, the lines are drained into it every so often rather than all kept until the end
+                steps = None if log is None else 100000
+                while True:
+                    finished = profiler.run(vm, steps) if profiler is not None else vm.run(steps)
+                    if log is not None:
+                        for line in vm.drain():
+                            log.write(line)
+                    if finished:
+                        break
+                if log is None:
+                    outputs.extend([wrap(line, line_length) for line in output] for output in vm.outputs)
+            else:
+                # imported here as the cache itself depends on the block classes in this module
+                from memo import ExpressionCache
+                cache = ExpressionCache()
+                for num, block in enumerate(run_order, 1):
+                    if isinstance(block.block, IfElse):
+                        lines = BlockFunctions.evaluateIfElse(block.block, num, turtle, trace, globals, run_order,
+                                                              line_length, cache)
+                    elif isinstance(block.block, While):
+                        lines = BlockFunctions.evaluateWhile(block.block, num, turtle, trace, globals, run_order,
+                                                             line_length, cache)
+                    else:
+                        lines = BlockFunctions.execute(block.block, num, turtle, trace, globals, run_order,
+                                                       line_length, cache)
+                    if log is None:
+                        outputs.append(list(lines))
+                    else:
+                        # each line is yielded already wrapped, and joining its pieces gives it back
+                        for line in lines:
+                            log.write("".join(line))
         except RecursionError:
             # an excessively long program may result in too many recursive calls for evaluation
             # additionally, there may be too many nested if/while blocks which cause the same issue
             msg = "There was an error, which may be due to too many nested if/while blocks or the program being too long."
-            outputs.append(wrap(msg, line_length))
+            if log is not None:
+                log.write(msg)
+            else:
+                outputs.append(wrap(msg, line_length))
         finally:
             # this should be executed no matter what
             # add on the run time to the output regardless, and reset the globals
-            outputs.insert(0, wrap(now, line_length))
             globals.reset()
+            if log is not None:
+                return log
+            outputs.insert(0, wrap(now, line_length))
             return outputs
 
     # subroutine to add a block to another block after it has been dragged into it. it starts at the overall block and
@@ -572,6 +766,8 @@ class BlockFunctions:
     # the setattr() builtin function allows for this attribute to be set from a string representation of its name
     @staticmethod
     def addBlock(font, block, toAdd, x, y, pos_x, pos_y, par=None, attr=None):
+        # only the blocks along the path down to the one changed are visited, and their layouts will change
+        BlockFunctions.layout.invalidate(block)
         if block is None:
             if attr == "true":
                 par.true[-1] = toAdd
@@ -596,46 +792,46 @@ class BlockFunctions:
                 BlockFunctions.addBlock(font, block.right, toAdd, x, y, pos_x + BlockFunctions.get_width(block.left, font) + 25, pos_y + 5, par=block,
                          attr="right")
         elif isinstance(block, Turtle2DMoveForward):
-            if pos_x + 5 + font.size("moveForward")[0] <= x <= pos_x + 5 + font.size("moveForward")[0] + BlockFunctions.get_width(
+            if pos_x + 5 + textCache.size(font, "moveForward")[0] <= x <= pos_x + 5 + textCache.size(font, "moveForward")[0] + BlockFunctions.get_width(
                     block.dist, font) and pos_y + 5 <= y <= pos_y + 55 + 10 * BlockFunctions.get_max_depth(block.dist):
-                BlockFunctions.addBlock(font, block.dist, toAdd, x, y, pos_x + 5 + font.size("moveForward")[0], pos_y + 5, par=block,
+                BlockFunctions.addBlock(font, block.dist, toAdd, x, y, pos_x + 5 + textCache.size(font, "moveForward")[0], pos_y + 5, par=block,
                          attr="dist")
         elif isinstance(block, Turtle2DRotate):
-            if pos_x + 5 + font.size("rotate")[0] <= x <= pos_x + 5 + font.size("rotate")[0] + BlockFunctions.get_width(
+            if pos_x + 5 + textCache.size(font, "rotate")[0] <= x <= pos_x + 5 + textCache.size(font, "rotate")[0] + BlockFunctions.get_width(
                     block.angle, font) and pos_y + 5 <= y <= pos_y + 55 + 10 * BlockFunctions.get_max_depth(block.angle):
-                BlockFunctions.addBlock(font, block.angle, toAdd, x, y, pos_x + 5 + font.size("rotate")[0], pos_y + 5, par=block,
+                BlockFunctions.addBlock(font, block.angle, toAdd, x, y, pos_x + 5 + textCache.size(font, "rotate")[0], pos_y + 5, par=block,
                          attr="angle")
         elif isinstance(block, Turtle2DMovement):
-            if pos_x + 5 + font.size("move")[0] <= x <= pos_x + 5 + font.size("move")[0] + BlockFunctions.get_width(
+            if pos_x + 5 + textCache.size(font, "move")[0] <= x <= pos_x + 5 + textCache.size(font, "move")[0] + BlockFunctions.get_width(
                     block.start_x, font) and pos_y + 5 <= y <= pos_y + 55 + 10 * BlockFunctions.get_max_depth(block.start_x):
-                BlockFunctions.addBlock(font, block.start_x, toAdd, x, y, pos_x + 5 + font.size("move")[0], pos_y + 5, par=block,
+                BlockFunctions.addBlock(font, block.start_x, toAdd, x, y, pos_x + 5 + textCache.size(font, "move")[0], pos_y + 5, par=block,
                          attr="start_x")
-            elif pos_x + 10 + font.size("move")[0] + BlockFunctions.get_width(block.start_x, font) <= x <= pos_x + 10 + font.size("move")[
+            elif pos_x + 10 + textCache.size(font, "move")[0] + BlockFunctions.get_width(block.start_x, font) <= x <= pos_x + 10 + textCache.size(font, "move")[
                 0] + BlockFunctions.get_width(block.start_x, font) + BlockFunctions.get_width(
                 block.start_y, font) and pos_y + 5 <= y <= pos_y + 55 + 10 * BlockFunctions.get_max_depth(block.start_y):
-                BlockFunctions.addBlock(font, block.start_y, toAdd, x, y, pos_x + font.size("move")[0] + 10 + BlockFunctions.get_width(block.start_x, font),
+                BlockFunctions.addBlock(font, block.start_y, toAdd, x, y, pos_x + textCache.size(font, "move")[0] + 10 + BlockFunctions.get_width(block.start_x, font),
                          pos_y + 5, par=block, attr="start_y")
-            elif pos_x + 15 + font.size("move")[0] + BlockFunctions.get_width(block.start_x, font) + BlockFunctions.get_width(
-                    block.start_y, font) <= x <= pos_x + 15 + font.size("move")[0] + BlockFunctions.get_width(block.start_x, font) + BlockFunctions.get_width(
+            elif pos_x + 15 + textCache.size(font, "move")[0] + BlockFunctions.get_width(block.start_x, font) + BlockFunctions.get_width(
+                    block.start_y, font) <= x <= pos_x + 15 + textCache.size(font, "move")[0] + BlockFunctions.get_width(block.start_x, font) + BlockFunctions.get_width(
                 block.start_y, font) + BlockFunctions.get_width(block.dest_x, font) and pos_y + 5 <= y <= pos_y + 55 + 10 * BlockFunctions.get_max_depth(
                 block.dest_x):
                 BlockFunctions.addBlock(font, block.dest_x, toAdd, x, y,
-                         pos_x + font.size("move")[0] + 15 + BlockFunctions.get_width(block.start_x, font) + BlockFunctions.get_width(block.start_y, font),
+                         pos_x + textCache.size(font, "move")[0] + 15 + BlockFunctions.get_width(block.start_x, font) + BlockFunctions.get_width(block.start_y, font),
                          pos_y + 5, par=block, attr="dest_x")
-            elif pos_x + 20 + font.size("move")[0] + BlockFunctions.get_width(block.start_x, font) + BlockFunctions.get_width(block.start_y, font) + BlockFunctions.get_width(
-                    block.dest_x, font) <= x <= pos_x + 20 + font.size("move")[0] + BlockFunctions.get_width(block.start_x, font) + BlockFunctions.get_width(
+            elif pos_x + 20 + textCache.size(font, "move")[0] + BlockFunctions.get_width(block.start_x, font) + BlockFunctions.get_width(block.start_y, font) + BlockFunctions.get_width(
+                    block.dest_x, font) <= x <= pos_x + 20 + textCache.size(font, "move")[0] + BlockFunctions.get_width(block.start_x, font) + BlockFunctions.get_width(
                 block.start_y, font) + BlockFunctions.get_width(block.dest_x, font) + BlockFunctions.get_width(
                 block.dest_y, font) and pos_y + 5 <= y <= pos_y + 55 + 10 * BlockFunctions.get_max_depth(block.dest_y):
                 BlockFunctions.addBlock(font, block.dest_y, toAdd, x, y,
-                         pos_x + font.size("move")[0] + 20 + BlockFunctions.get_width(block.start_x, font) + BlockFunctions.get_width(
+                         pos_x + textCache.size(font, "move")[0] + 20 + BlockFunctions.get_width(block.start_x, font) + BlockFunctions.get_width(
                              block.start_y, font) + BlockFunctions.get_width(
                              block.dest_x, font), pos_y + 5, par=block, attr="dest_y")
         elif isinstance(block, IfElse):
-            if pos_x + 5 + font.size("if")[0] <= x <= pos_x + 5 + font.size("if")[0] + BlockFunctions.get_width(
+            if pos_x + 5 + textCache.size(font, "if")[0] <= x <= pos_x + 5 + textCache.size(font, "if")[0] + BlockFunctions.get_width(
                     block.cond, font) and pos_y + 5 <= y <= pos_y + 55 + 10 * BlockFunctions.get_max_depth(block.cond):
-                BlockFunctions.addBlock(font, block.cond, toAdd, x, y, pos_x + 5 + font.size("if")[0], pos_y + 5, par=block,
+                BlockFunctions.addBlock(font, block.cond, toAdd, x, y, pos_x + 5 + textCache.size(font, "if")[0], pos_y + 5, par=block,
                          attr="cond")
-            start_x = pos_x + 10 + font.size("if")[0] + BlockFunctions.get_width(block.cond, font) + font.size("then")[0]
+            start_x = pos_x + 10 + textCache.size(font, "if")[0] + BlockFunctions.get_width(block.cond, font) + textCache.size(font, "then")[0]
             for statement in block.true:
                 if start_x <= x <= start_x + BlockFunctions.get_width(statement, font) and pos_y + 5 <= y <= pos_y + 55 + 10 * BlockFunctions.get_max_depth(
                         statement):
@@ -643,7 +839,7 @@ class BlockFunctions:
                     break
                 start_x += 5 + BlockFunctions.get_width(statement, font)
             else:
-                start_x += font.size("else")[0]
+                start_x += textCache.size(font, "else")[0]
                 for statement in block.false:
                     if start_x <= x <= start_x + BlockFunctions.get_width(statement, font) and pos_y + 5 <= y <= pos_y + 55 + 10 * BlockFunctions.get_max_depth(
                             statement):
@@ -651,17 +847,17 @@ class BlockFunctions:
                         break
                     start_x += 5 + BlockFunctions.get_width(statement, font)
         elif isinstance(block, While):
-            if pos_x + 5 + font.size("while")[0] <= x <= pos_x + 5 + font.size("while")[0] + BlockFunctions.get_width(block.cond, font) and pos_y + 5 <= y <= pos_y + 55 + 10 * BlockFunctions.get_max_depth(block.cond):
-                BlockFunctions.addBlock(font, block.cond, toAdd, x, y, pos_x + 5 + font.size("while")[0], pos_y + 5, par=block, attr="cond")
-            start_x = pos_x + 10 + font.size("while")[0] + BlockFunctions.get_width(block.cond, font) + font.size("do")[0]
+            if pos_x + 5 + textCache.size(font, "while")[0] <= x <= pos_x + 5 + textCache.size(font, "while")[0] + BlockFunctions.get_width(block.cond, font) and pos_y + 5 <= y <= pos_y + 55 + 10 * BlockFunctions.get_max_depth(block.cond):
+                BlockFunctions.addBlock(font, block.cond, toAdd, x, y, pos_x + 5 + textCache.size(font, "while")[0], pos_y + 5, par=block, attr="cond")
+            start_x = pos_x + 10 + textCache.size(font, "while")[0] + BlockFunctions.get_width(block.cond, font) + textCache.size(font, "do")[0]
             for statement in block.stats:
                 if start_x <= x <= start_x + BlockFunctions.get_width(statement, font) and pos_y + 5 <= y <= pos_y + 55 + 10 * BlockFunctions.get_max_depth(statement):
                     BlockFunctions.addBlock(font, statement, toAdd, x, y, start_x, pos_y + 5, par=block, attr="stats")
                     break
                 start_x += 5 + BlockFunctions.get_width(statement, font)
         elif isinstance(block, Assignment):
-            if pos_x + 5 + font.size(block.varName + " <- ")[0] <= x <= pos_x + 5 + font.size(block.varName + " <- ")[
+            if pos_x + 5 + textCache.size(font, block.varName + " <- ")[0] <= x <= pos_x + 5 + textCache.size(font, block.varName + " <- ")[
                 0] + BlockFunctions.get_width(block.expr, font) and pos_y + 5 <= y <= pos_y + 55 + 10 * BlockFunctions.get_max_depth(block.expr):
-                BlockFunctions.addBlock(font, block.expr, toAdd, x, y, pos_x + 5 + font.size(block.varName + " <- ")[0], pos_y + 5,
+                BlockFunctions.addBlock(font, block.expr, toAdd, x, y, pos_x + 5 + textCache.size(font, block.varName + " <- ")[0], pos_y + 5,
                          par=block,
                          attr="expr")
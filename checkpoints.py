@@ -0,0 +1,102 @@
+from blocks import *
+
+
+# the state of a run just before one of the blocks in its run order: the variables in the global context, the turtle's
+# position and angle with a mark of its lines, a mark of the trace table and the number of lines output (including the
+# run time)
+class Checkpoint:
+    def __init__(self, variables, turtle, trace, position):
+        self.variables = variables
+        self.turtle = turtle
+        self.trace = trace
+        self.position = position
+
+
+# the checkpoints of the last run, so the next one can carry on from the last block which is still the same rather than
+# running every block again (see ProgramRun). a checkpoint is recorded just before each block in the run order and once
+# the last one has finished, along with a key for each block's tree so the blocks which have changed since can be found.
+# when a run starts, everything from the first block in the run order which has been changed, added or moved onwards
+# is run again: the globals, turtle and trace are put back to how they were just before it, and the last run's outputs
+# are cut back to the lines output before it, so the blocks before it don't need running.
+# a run carrying on from a checkpoint replaces the last run rather than running on from where it left the turtle and
+# trace as a new run would, so the turtle and trace show the program as it is now. if the turtle or trace have been
+# replaced since the last run (e.g., the trace table has been cleared), or the lines output after the checkpoint have
+# been forgotten by its OutputLog (so can't be removed), the checkpoints can't be used and the run starts from the
+# beginning
+class Checkpoints:
+    def __init__(self):
+        self.turtle = None
+        self.trace = None
+        self.log = None
+        # the key of each block in the last run's run order, and the checkpoint just before each block it reached
+        self.keys = []
+        self.states = []
+
+    # a key which is the same for two trees exactly when they are made of the same blocks. a stack is used rather than
+    # recursion so that deeply nested blocks can be compared. the type of numbers is included since e.g. 1, 1.0 and
+    # True are equal but are output differently
+    @staticmethod
+    def key(block):
+        key = []
+        stack = [block]
+        while stack:
+            block = stack.pop()
+            if block is None:
+                key.append(None)
+            elif isinstance(block, Number):
+                key.append(("number", type(block.n), block.n))
+            elif isinstance(block, Variable):
+                key.append(("variable", block.name))
+            else:
+                children = BlockFunctions.children(block)
+                key.append((type(block).__name__, getattr(block, "sign", None), getattr(block, "varName", None),
+                             len(block.true) if isinstance(block, IfElse) else None, len(children)))
+                stack.extend(reversed(children))
+        return tuple(key)
+
+    def capture(self, globals, position):
+        turtle = (self.turtle.x, self.turtle.y, self.turtle.angle, self.turtle.lines.mark())
+        return Checkpoint(globals.snapshot(), turtle, self.trace.mark(), position)
+
+    def restore(self, state, globals):
+        globals.restore(state.variables)
+        self.turtle.x, self.turtle.y, self.turtle.angle, lines = state.turtle
+        self.turtle.lines.restore(lines)
+        self.trace.restore(state.trace)
+
+    # start a run of 'run_order', returning the index of the block it should start from and the OutputLog it should
+    # write to. the state is put back to the checkpoint before that block, and the run carries on writing to the last
+    # run's outputs from the lines output before it, with the run time from 'log' (which holds only that) in place of
+    # the last run's. if the run starts from the beginning it writes to 'log' instead
+    def resume(self, run_order, turtle, trace, globals, log):
+        keys = [Checkpoints.key(block.block) for block in run_order]
+        start = 0
+        if turtle is not self.turtle or trace is not self.trace or not self.states:
+            self.turtle, self.trace = turtle, trace
+            self.states = [self.capture(globals, log.count)]
+        else:
+            limit = min(len(keys), len(self.keys), len(self.states) - 1)
+            while start < limit and keys[start] == self.keys[start]:
+                start += 1
+            # the lines output after the checkpoint must not have been forgotten, so they can be removed
+            if self.states[start].position < self.log.first:
+                start = 0
+            self.restore(self.states[start], globals)
+            del self.states[start + 1:]
+            if start:
+                self.log.truncate(self.states[start].position)
+                self.log.retitle(log.line(0))
+                log.close()
+                log = self.log
+        self.keys = keys
+        self.log = log
+        return start, log
+
+    # record the checkpoint just before the block at 'index' in the run order (or after the last block if it is the
+    # length of the run order), with 'position' lines output before it
+    def record(self, index, globals, position):
+        state = self.capture(globals, position)
+        if index < len(self.states):
+            self.states[index] = state
+        else:
+            self.states.append(state)
@@ -0,0 +1,303 @@
+import math
+from blocks import *
+from helpers import *
+from globalsStack import UNSET
+from passes import Shared, SharedRef, Hoisted
+
+
+# closures used for operations and comparisons, keyed by sign. each factory takes the already compiled left and right
+# closures and returns a single closure applying the sign to their results, so no 'match' on the sign is needed when the
+# expression is evaluated. the second table is used when the right argument is a number block, which is very common
+# (e.g., i + 1), so its value can be bound directly instead of calling a closure for it
+binarySigns = {
+    "+": lambda l, r: lambda s: l(s) + r(s),
+    "-": lambda l, r: lambda s: l(s) - r(s),
+    "×": lambda l, r: lambda s: l(s) * r(s),
+    "÷": lambda l, r: lambda s: l(s) / r(s),
+    "^": lambda l, r: lambda s: l(s) ** r(s),
+    ">": lambda l, r: lambda s: l(s) > r(s),
+    "<": lambda l, r: lambda s: l(s) < r(s),
+    "=": lambda l, r: lambda s: l(s) == r(s),
+}
+
+binarySignsConst = {
+    "+": lambda l, n: lambda s: l(s) + n,
+    "-": lambda l, n: lambda s: l(s) - n,
+    "×": lambda l, n: lambda s: l(s) * n,
+    "÷": lambda l, n: lambda s: l(s) / n,
+    "^": lambda l, n: lambda s: l(s) ** n,
+    ">": lambda l, n: lambda s: l(s) > n,
+    "<": lambda l, n: lambda s: l(s) < n,
+    "=": lambda l, n: lambda s: l(s) == n,
+}
+
+
+# static class which turns block trees into trees of pre-bound Python closures. the type of each block, its sign and
+# the error message it would produce are all worked out once when the block is compiled, rather than every time it is
+# evaluated, which matters most for the statements inside while loops.
+# variables are read and written through the slots worked out for them by ScopeResolver, so expression closures take
+# the slots list of the globals stack and return the value of the expression. statement closures take the turtle,
+# trace, globals and an 'emit' function which is called with each line of output the statement produces.
+# the behaviour (including the order in which subexpressions are evaluated and the error messages) is the same as
+# BlockFunctions.evaluateExpr, evaluateIfElse, evaluateWhile and execute
+class BlockCompiler:
+    # build the error message for an exception raised while running block 'num'. 'argument' describes what was
+    # missing or invalid if the exception is a SyntaxError, e.g., "argument provided to assignment"
+    @staticmethod
+    def errorMessage(e, num, argument):
+        if isinstance(e, SyntaxError):
+            return f"Error running block {num}: missing or invalid {argument}"
+        if isinstance(e, OverflowError):
+            return f"Error running block {num}: result too large"
+        if isinstance(e, ZeroDivisionError):
+            return f"Error running block {num}: cannot divide by zero"
+        if isinstance(e, KeyError):
+            return f"Error running block {num}: variable {e} not defined in this scope"
+        return f"Error running block {num}: unexpected error while parsing"
+
+    # relocate the turtle to the start coordinates, angle it towards the destination and move it there, recording the
+    # line if it has not been drawn before. same logic as the Turtle2DMovement branch of BlockFunctions.execute
+    @staticmethod
+    def moveTurtle(turtle, s_x, s_y, d_x, d_y):
+        turtle.relocate(s_x, s_y)
+        delta_x = d_x - s_x
+        delta_y = d_y - s_y
+        dist = math.hypot(delta_x, delta_y)
+        if delta_x == 0:
+            if d_y < s_y:
+                angle = math.pi * 1.5
+            elif d_y >= s_y:
+                angle = math.pi * 0.5
+        elif delta_y == 0 and d_x < s_x:
+            angle = math.pi
+        else:
+            angle = math.atan(delta_y / delta_x)
+            if delta_x < 0 < delta_y or (delta_x < 0 and delta_y < 0):
+                angle += math.pi
+        turtle.angle = angle
+        turtle.move(dist)
+        turtle.lines.add(s_x, s_y, d_x, d_y)
+
+    # compile an expression. anything which isn't a number, variable, operation or comparison (including an empty
+    # space) compiles to a closure raising a SyntaxError with the 'prev' message, so the error is only raised at the
+    # point in the evaluation where BlockFunctions.evaluateExpr would have raised it
+    @staticmethod
+    def compileExpr(block, resolution, prev=""):
+        if isinstance(block, Number):
+            n = block.n
+            return lambda s: n
+        if isinstance(block, Variable):
+            return BlockCompiler.compileRead(block.name, resolution.reads[id(block)])
+        if isinstance(block, Shared) or isinstance(block, SharedRef) or isinstance(block, Hoisted):
+            return BlockCompiler.compileStored(block, resolution, prev)
+        if not (isinstance(block, Operation) or isinstance(block, Comparison)):
+            def invalid(s):
+                raise SyntaxError(prev)
+            return invalid
+
+        context = "arithmetic operation" if isinstance(block, Operation) else "comparison"
+        left = BlockCompiler.compileExpr(block.left, resolution, context)
+        if isinstance(block.right, Number) and block.sign in binarySignsConst:
+            return binarySignsConst[block.sign](left, block.right.n)
+        right = BlockCompiler.compileExpr(block.right, resolution, context)
+        if block.sign in binarySigns:
+            return binarySigns[block.sign](left, right)
+
+        # unrecognised signs still evaluate both arguments (so any errors in them are raised) but give no result
+        def unknown(s):
+            left(s)
+            right(s)
+            return None
+        return unknown
+
+    # compile the blocks made by BlockOptimiser which store the value of an expression in a slot to be reused
+    @staticmethod
+    def compileStored(block, resolution, prev):
+        if isinstance(block, SharedRef):
+            slot = resolution.temps[id(block.shared)]
+            return lambda s: s[slot]
+
+        slot = resolution.temps[id(block)]
+        expr = BlockCompiler.compileExpr(block.expr, resolution, prev)
+        if isinstance(block, Shared):
+            def share(s):
+                value = s[slot] = expr(s)
+                return value
+            return share
+
+        def hoisted(s):
+            value = s[slot]
+            if value is UNSET:
+                value = s[slot] = expr(s)
+            return value
+        return hoisted
+
+    # compile reading a variable from the first of the slots in 'chain' which is set
+    @staticmethod
+    def compileRead(name, chain):
+        if len(chain) == 1:
+            slot = chain[0]
+
+            def read(s):
+                value = s[slot]
+                if value is UNSET:
+                    raise KeyError(name)
+                return value
+            return read
+
+        def readChain(s):
+            for slot in chain:
+                value = s[slot]
+                if value is not UNSET:
+                    return value
+            raise KeyError(name)
+        return readChain
+
+    # compile writing a variable to the first of the slots in 'chain' which is set, or the first slot if none are
+    @staticmethod
+    def compileWrite(chain):
+        if len(chain) == 1:
+            slot = chain[0]
+
+            def write(s, value):
+                s[slot] = value
+            return write
+
+        def writeChain(s, value):
+            for slot in chain:
+                if s[slot] is not UNSET:
+                    s[slot] = value
+                    return
+            s[chain[0]] = value
+        return writeChain
+
+    # compile a list of statements, leaving out the empty spaces at the end of if/while bodies
+    @staticmethod
+    def compileStatements(statements, num, resolution):
+        return [BlockCompiler.compileStatement(s, num, resolution) for s in statements if s is not None]
+
+    # compile a statement of block 'num' into a closure taking the turtle, trace, globals and emit function. 'resolution'
+    # is the result of ScopeResolver.resolve for the program the statement is in
+    @staticmethod
+    def compileStatement(block, num, resolution):
+        ran = f"Ran block {num}"
+        errorMessage = BlockCompiler.errorMessage
+
+        if isinstance(block, IfElse):
+            cond = BlockCompiler.compileExpr(block.cond, resolution)
+            true = BlockCompiler.compileStatements(block.true, num, resolution)
+            false = BlockCompiler.compileStatements(block.false, num, resolution)
+            start, end = resolution.scopes[id(block)]
+            unset = (UNSET,) * (end - start)
+
+            # the context of the if block needs nothing doing to enter it, and is left by unsetting its slots
+            def ifElse(turtle, trace, g, emit):
+                s = g.slots
+                try:
+                    for statement in (true if cond(s) else false):
+                        statement(turtle, trace, g, emit)
+                except Exception as e:
+                    emit(errorMessage(e, num, "condition provided to if statement"))
+                finally:
+                    s[start:end] = unset
+            return ifElse
+
+        if isinstance(block, While):
+            cond = BlockCompiler.compileExpr(block.cond, resolution)
+            stats = BlockCompiler.compileStatements(block.stats, num, resolution)
+            start, end = resolution.scopes[id(block)]
+            unset = (UNSET,) * (end - start)
+            # the values of any hoisted expressions are cleared each time the loop is started
+            hoistStart, hoistEnd = resolution.hoists.get(id(block), (0, 0))
+            hoistUnset = (UNSET,) * (hoistEnd - hoistStart)
+
+            def loop(turtle, trace, g, emit):
+                s = g.slots
+                s[hoistStart:hoistEnd] = hoistUnset
+                try:
+                    while cond(s):
+                        for statement in stats:
+                            statement(turtle, trace, g, emit)
+                except Exception as e:
+                    emit(errorMessage(e, num, "condition provided to while statement"))
+                finally:
+                    s[start:end] = unset
+            return loop
+
+        # a whole expression statement may have been hoisted out of a loop by BlockOptimiser
+        if isinstance(block, Comparison) or isinstance(block, Operation) or isinstance(
+                block, Number) or isinstance(block, Variable) or isinstance(block, Hoisted):
+            expr = BlockCompiler.compileExpr(block, resolution)
+            ran += ": "
+
+            def expression(turtle, trace, g, emit):
+                try:
+                    output = ran + str(expr(g.slots))
+                except Exception as e:
+                    output = errorMessage(e, num, f"argument provided to {e}")
+                emit(output)
+            return expression
+
+        if isinstance(block, Turtle2DMovement):
+            start_x, start_y = BlockCompiler.compileExpr(block.start_x, resolution), BlockCompiler.compileExpr(block.start_y, resolution)
+            dest_x, dest_y = BlockCompiler.compileExpr(block.dest_x, resolution), BlockCompiler.compileExpr(block.dest_y, resolution)
+
+            def movement(turtle, trace, g, emit):
+                output = ran
+                try:
+                    s = g.slots
+                    s_x, s_y = start_x(s), start_y(s)
+                    d_x, d_y = dest_x(s), dest_y(s)
+                    BlockCompiler.moveTurtle(turtle, s_x, s_y, d_x, d_y)
+                except Exception as e:
+                    output = errorMessage(e, num, "argument provided to turtle movement")
+                emit(output)
+            return movement
+
+        if isinstance(block, Turtle2DMoveForward):
+            dist = BlockCompiler.compileExpr(block.dist, resolution)
+
+            def moveForward(turtle, trace, g, emit):
+                output = ran
+                s_x, s_y = turtle.x, turtle.y
+                try:
+                    turtle.move(dist(g.slots))
+                    turtle.lines.forward(s_x, s_y, turtle.x, turtle.y, turtle.angle)
+                except Exception as e:
+                    output = errorMessage(e, num, "argument provided to turtle move forward")
+                emit(output)
+            return moveForward
+
+        if isinstance(block, Turtle2DRotate):
+            angle = BlockCompiler.compileExpr(block.angle, resolution)
+
+            def rotate(turtle, trace, g, emit):
+                output = ran
+                try:
+                    turtle.angle += math.radians(angle(g.slots))
+                except Exception as e:
+                    output = errorMessage(e, num, "argument provided to turtle rotation")
+                emit(output)
+            return rotate
+
+        if isinstance(block, Assignment):
+            varName = block.varName
+            expr = BlockCompiler.compileExpr(block.expr, resolution)
+            write = BlockCompiler.compileWrite(resolution.writes[id(block)])
+
+            # expressions have no side effects, so the value is only evaluated once and used for both the trace and
+            # the globals
+            def assignment(turtle, trace, g, emit):
+                output = ran
+                try:
+                    s = g.slots
+                    value = expr(s)
+                    trace.update(varName, value)
+                    write(s, value)
+                except Exception as e:
+                    output = errorMessage(e, num, "argument provided to assignment")
+                emit(output)
+            return assignment
+
+        # any other block produces no output, as in BlockFunctions.execute
+        return lambda turtle, trace, g, emit: None
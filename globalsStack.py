@@ -1,7 +1,22 @@
+# marks a slot whose variable has not been given a value in its context (i.e., is not defined there)
+UNSET = object()
+
+
 class GlobalsStack:
     def __init__(self):
-        # initialise stack with global context only - only needs to be accessed privately
-        self.__stack = [{}]
+        # the values of all variables are stored in one flat list, and each variable in each context is given an index
+        # into it (a 'slot'). unset slots hold UNSET
+        self.slots = []
+        # slots of the variables in the global context, by name
+        self.__globalSlots = {}
+        # for variables in contexts above the global one, the slots they are bound to by name, outermost first. these
+        # and the lists below are only used when variables are accessed by name
+        self.__bindings = {}
+        # the names created in each context above the global one, and the length of the slots list when it was entered.
+        # these lists are kept when a context is left so that entering a context again doesn't need to allocate
+        self.__created = []
+        self.__marks = []
+        self.__depth = 0
 
     # __getitem__ and __setitem__ are overridden here to allow for custom behaviour when values are accessed/modified
     # e.g. a = GlobalsStack(); a[1]
@@ -9,36 +24,84 @@ class GlobalsStack:
     # e.g. a = GlobalsStack(); a[1] = 2
     # above would invoke __setitem__ on an index of 1 with a value of 2
     def __getitem__(self, i):
-        # see if the variable is present in any previous contexts, most recent first - if so we return it
-        # if not, the variable is not defined in scope or at all so a KeyError is raised
-        for f in self.__stack[::-1]:
-            try:
-                return f[i]
-            except KeyError:
-                pass
+        # the most recent context the variable is bound in is at the end of its bindings - if there are none, we check
+        # the global context. if it isn't there either, the variable is not defined in scope or at all so a KeyError is
+        # raised
+        bindings = self.__bindings.get(i)
+        if bindings:
+            return self.slots[bindings[-1]]
+        slot = self.__globalSlots.get(i)
+        if slot is not None and self.slots[slot] is not UNSET:
+            return self.slots[slot]
         raise KeyError(f'{i}')
 
     def __setitem__(self, i, v):
         # see if the variable is present in any previous contexts, most recent first - if so we update only this value
-        for f in self.__stack[::-1]:
-            if i in f:
-                f[i] = v
-                break
-        else:
+        bindings = self.__bindings.get(i)
+        if bindings:
+            self.slots[bindings[-1]] = v
+            return
+        slot = self.__globalSlots.get(i)
+        if slot is not None and self.slots[slot] is not UNSET:
+            self.slots[slot] = v
+        elif self.__depth == 0:
             # if no such contexts found, add it as a new variable in the current context
-            self.__stack[-1][i] = v
+            self.slots[self.globalSlot(i)] = v
+        else:
+            self.__bindings.setdefault(i, []).append(len(self.slots))
+            self.__created[self.__depth - 1].append(i)
+            self.slots.append(v)
 
     def push(self):
         # add new context
-        self.__stack.append({})
+        if self.__depth == len(self.__created):
+            self.__created.append([])
+            self.__marks.append(0)
+        self.__marks[self.__depth] = len(self.slots)
+        self.__depth += 1
 
     def pop(self):
-        # remove existing context - only allowed if length of stack is larger than 1 since you can't get rid of the
-        # global context (outermost)
-        if len(self.__stack) > 1:
-            self.__stack.pop(len(self.__stack) - 1)
+        # remove existing context - only allowed if there is a context above the global context since you can't get rid
+        # of the global context (outermost)
+        if self.__depth > 0:
+            self.__depth -= 1
+            created = self.__created[self.__depth]
+            for name in created:
+                self.__bindings[name].pop()
+            created.clear()
+            del self.slots[self.__marks[self.__depth]:]
 
-    def reset(self):
-        # reset the globals stack when all code has run so variables are not accessed from previous runs
-        self.__stack = [{}]
+    # get the slot of a variable in the global context, giving it a new (unset) slot if it doesn't have one yet
+    def globalSlot(self, name):
+        slot = self.__globalSlots.get(name)
+        if slot is None:
+            slot = self.__globalSlots[name] = len(self.slots)
+            self.slots.append(UNSET)
+        return slot
 
+    # add 'n' unset slots to the end of the slots list, returning the index of the first one. used to store the
+    # variables of if/while blocks when the slots for them have been worked out before running by ScopeResolver
+    def reserve(self, n):
+        start = len(self.slots)
+        self.slots.extend([UNSET] * n)
+        return start
+
+    # the values of the variables set in the global context, by name
+    def snapshot(self):
+        return {name: self.slots[slot] for name, slot in self.__globalSlots.items() if self.slots[slot] is not UNSET}
+
+    # reset the globals stack to only the global variables in a snapshot
+    def restore(self, variables):
+        self.reset()
+        for name, value in variables.items():
+            self[name] = value
+
+    def reset(self):
+        # reset the globals stack when all code has run so variables are not accessed from previous runs. the slots list
+        # is cleared rather than replaced as compiled blocks may hold a reference to it
+        self.slots.clear()
+        self.__globalSlots.clear()
+        self.__bindings.clear()
+        for created in self.__created:
+            created.clear()
+        self.__depth = 0
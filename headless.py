@@ -0,0 +1,105 @@
+import os
+import sys
+import struct
+import argparse
+import datetime
+from helpers import *
+from blocks import *
+from trace import TraceTable
+from globalsStack import GlobalsStack
+from serialise import BlockSerialiser
+from workspace import Workspace
+from rasterise import TurtleRenderer, WIDTH, HEIGHT
+from outputs import OutputLog
+
+
+# command line runner for saved programs (either workspace files saved by the code development environment, or
+# programs saved as JSON), which runs them the same way as the Run button but without pygame, a window
+# or any of the icons, so that many programs can be run quickly one after another (e.g., in batch jobs).
+# for each program, the outputs are written one line per line, the trace table as tab separated rows (with a header of
+# the variable names and empty cells where the code development environment shows them empty) and the turtle's lines
+# as tab separated start and end coordinates. they are written to standard output, or to <name>.out, <name>.trace.tsv
+# and <name>.turtle.tsv in the output directory if one is given. the turtle's drawing can also be saved as <name>.png
+# and/or <name>.svg (in the output directory, or the current directory if none is given), drawn as in the turtle pane
+def parseArgs(args):
+    parser = argparse.ArgumentParser(description="Run saved Codeblox programs without opening a window.")
+    parser.add_argument("programs", nargs="+", help="saved program files to run")
+    parser.add_argument("--engine", choices=("compiled", "vm", "interpreted"), default="compiled")
+    parser.add_argument("--passes", nargs="*", default=[], help="optimisation passes to run, e.g. fold dead hoist cse")
+    parser.add_argument("--line-length", type=int, default=80, help="length outputs are wrapped to")
+    parser.add_argument("--trace", action="store_true", help="also write the trace table")
+    parser.add_argument("--turtle", action="store_true", help="also write the turtle's lines")
+    parser.add_argument("--coalesce", action="store_true",
+                        help="draw one turtle line for moving forward in a straight line over several blocks")
+    parser.add_argument("--output-dir", help="write results to files in this directory rather than standard output")
+    parser.add_argument("--png", action="store_true", help="save the turtle's drawing as a PNG")
+    parser.add_argument("--svg", action="store_true", help="save the turtle's drawing as an SVG")
+    parser.add_argument("--size", type=int, nargs=2, default=(WIDTH, HEIGHT), metavar=("WIDTH", "HEIGHT"),
+                        help="size of the saved drawings in pixels")
+    return parser.parse_args(args)
+
+
+# run a program as the Run button does, with a new turtle, trace table and globals, returning the outputs, the trace
+# table and the turtle. the outputs are streamed into an OutputLog which keeps the lines beyond its capacity in a
+# temporary file, so every line is written however many there are without them all being held in memory
+def runProgram(code, line_length, engine="compiled", passes=(), coalesce=False):
+    run_order = sorted(code, key=lambda l: (l.y, l.x))
+    now = datetime.datetime.now().strftime("Run time: %d/%m/%Y %H:%M:%S")
+    turtle, trace = Turtle2D(coalesce), TraceTable()
+    outputs = BlockFunctions.executeBlocks(run_order, line_length, turtle, trace, GlobalsStack(), now, engine, passes,
+                                           log=OutputLog(line_length, spill=True))
+    return outputs, trace, turtle
+
+
+def traceRows(trace):
+    names = list(trace.get_vars())
+    columns = [trace.get_column(varName) for varName in names]
+    yield "\t".join(names)
+    for row in range(trace.length):
+        yield "\t".join("" if row >= len(c) or c[row] is None else str(c[row]) for c in columns)
+
+
+def writeResults(outputs, trace, turtle, args, name):
+    results = [(".out", outputs)]
+    if args.trace:
+        results.append((".trace.tsv", traceRows(trace)))
+    if args.turtle:
+        results.append((".turtle.tsv", (f"{s_x}\t{s_y}\t{d_x}\t{d_y}"
+                                        for s_x, s_y, d_x, d_y in turtle.lines.array.tolist())))
+    for suffix, lines in results:
+        if args.output_dir is None:
+            sys.stdout.writelines(line + "\n" for line in lines)
+        else:
+            with open(os.path.join(args.output_dir, name + suffix), "w") as f:
+                f.writelines(line + "\n" for line in lines)
+    width, height = args.size
+    path = os.path.join(args.output_dir or "", name)
+    if args.png:
+        TurtleRenderer.savePNG(TurtleRenderer.rasterise(turtle.lines, width, height, turtle.pixels_per_unit),
+                               path + ".png")
+    if args.svg:
+        TurtleRenderer.saveSVG(turtle.lines, path + ".svg", width, height, turtle.pixels_per_unit)
+
+
+def main(args=None):
+    args = parseArgs(args)
+    if args.output_dir is not None:
+        os.makedirs(args.output_dir, exist_ok=True)
+    failed = False
+    for path in args.programs:
+        try:
+            code = Workspace.load(path) if path.endswith(".cbx") else BlockSerialiser.load(path)
+        except (OSError, ValueError, KeyError, TypeError, struct.error) as e:
+            print(f"{path}: could not load program: {e}", file=sys.stderr)
+            failed = True
+            continue
+        outputs, trace, turtle = runProgram(code, args.line_length, args.engine, args.passes, args.coalesce)
+        if len(args.programs) > 1 and args.output_dir is None:
+            print(f"==> {path} <==")
+        writeResults(outputs, trace, turtle, args, os.path.splitext(os.path.basename(path))[0])
+        outputs.close()
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,6 +1,94 @@
+import operator
+from collections import OrderedDict
+
+
+# functions applying each operation/comparison sign to the left and right arguments
+signFunctions = {
+    "+": operator.add,
+    "-": operator.sub,
+    "×": operator.mul,
+    "÷": operator.truediv,
+    "^": operator.pow,
+    ">": operator.gt,
+    "<": operator.lt,
+    "=": operator.eq,
+}
+
+
+# unrecognised signs give no result
+def unknownSign(left, right):
+    return None
+
+
+# a bounded cache of the text rendered (antialiased) by each font, keyed by (font, text, colour), and of the sizes of
+# text in each font, so text drawn every frame - block labels, terminal output, the trace table - is only rendered and
+# measured once. the least recently used surfaces are dropped once there are more than 'capacity' of them or they take
+# up more than 'max_bytes' between them, and the least recently used sizes once there are more than 'size_capacity'.
+# the surfaces are shared between everything drawing the same text, so must only be blitted, never drawn onto
+class TextCache:
+    def __init__(self, capacity=1024, max_bytes=32 << 20, size_capacity=16384):
+        self.capacity = capacity
+        self.max_bytes = max_bytes
+        self.size_capacity = size_capacity
+        self.surfaces = OrderedDict()
+        self.sizes = OrderedDict()
+        self.bytes = 0
+        self.render_hits = self.render_misses = 0
+        self.size_hits = self.size_misses = 0
+
+    def render(self, font, text, colour):
+        key = (font, text, tuple(colour))
+        surface = self.surfaces.get(key)
+        if surface is not None:
+            self.render_hits += 1
+            self.surfaces.move_to_end(key)
+            return surface
+        self.render_misses += 1
+        surface = font.render(text, True, colour)
+        self.surfaces[key] = surface
+        self.bytes += surface.get_width() * surface.get_height() * surface.get_bytesize()
+        while len(self.surfaces) > 1 and (len(self.surfaces) > self.capacity or self.bytes > self.max_bytes):
+            _, old = self.surfaces.popitem(last=False)
+            self.bytes -= old.get_width() * old.get_height() * old.get_bytesize()
+        return surface
+
+    def size(self, font, text):
+        key = (font, text)
+        size = self.sizes.get(key)
+        if size is not None:
+            self.size_hits += 1
+            self.sizes.move_to_end(key)
+            return size
+        self.size_misses += 1
+        size = self.sizes[key] = font.size(text)
+        if len(self.sizes) > self.size_capacity:
+            self.sizes.popitem(last=False)
+        return size
+
+    # the fraction of renders and of sizes found in the cache
+    def hitRates(self):
+        renders = self.render_hits + self.render_misses
+        sizes = self.size_hits + self.size_misses
+        return self.render_hits / renders if renders else 0, self.size_hits / sizes if sizes else 0
+
+    def report(self):
+        render_rate, size_rate = self.hitRates()
+        return (f"text cache: {render_rate:.1%} of {self.render_hits + self.render_misses} renders and {size_rate:.1%} "
+                f"of {self.size_hits + self.size_misses} sizes hit, {len(self.surfaces)} surfaces "
+                f"({self.bytes / (1 << 20):.1f} MiB) cached")
+
+    def clear(self):
+        self.surfaces.clear()
+        self.sizes.clear()
+        self.bytes = 0
+
+
+textCache = TextCache()
+
+
 # subroutine to draw text centered at an x and y
 def draw_text_center(surf, text, x, y, font, color):
-    text_surface = font.render(text, True, color)
+    text_surface = textCache.render(font, text, color)
     text_rect = text_surface.get_rect(center=(x, y))
     surf.blit(text_surface, text_rect)
 
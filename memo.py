@@ -0,0 +1,61 @@
+from blocks import *
+
+
+# caches the values of the operation and comparison blocks evaluated while walking the tree (the interpreted engine of
+# BlockFunctions.executeBlocks), so an expression whose variables haven't been assigned to since it was last evaluated
+# isn't evaluated again - e.g., an expensive ^ or ÷ of variables which don't change inside a while loop.
+# values are keyed by the id() of the block, and for each variable the blocks whose values depend on it are kept, so
+# assigning to the variable removes only those values. leaving an if/while block's context can change which context a
+# variable is found in, so the values depending on any variable assigned to inside it are removed then too.
+# only values which were evaluated without error are kept, so errors are raised every time as before
+class ExpressionCache:
+    def __init__(self):
+        self.values = {}
+        # the variables read by each block which has had its value kept, keyed by id()
+        self.reads = {}
+        # the ids of the blocks whose kept values depend on each variable, by name
+        self.dependents = {}
+        # the variables assigned to in each context above the global one, outermost first
+        self.written = []
+
+    def __contains__(self, block):
+        return id(block) in self.values
+
+    def __getitem__(self, block):
+        return self.values[id(block)]
+
+    def store(self, block, value):
+        key = id(block)
+        if key not in self.reads:
+            self.reads[key] = self.variables(block)
+        self.values[key] = value
+        for name in self.reads[key]:
+            self.dependents.setdefault(name, set()).add(key)
+        return value
+
+    # the names of the variables an expression reads. those of blocks which have had their value kept are already known,
+    # which is nearly always true of the left and right of a block being stored as they are evaluated first
+    def variables(self, block):
+        if isinstance(block, Variable):
+            return frozenset((block.name,))
+        if isinstance(block, Operation) or isinstance(block, Comparison):
+            left = self.reads.get(id(block.left))
+            right = self.reads.get(id(block.right))
+            return ((left if left is not None else self.variables(block.left)) |
+                    (right if right is not None else self.variables(block.right)))
+        return frozenset()
+
+    # remove the values depending on a variable which has just been assigned to
+    def invalidate(self, name):
+        for key in self.dependents.pop(name, ()):
+            self.values.pop(key, None)
+        if self.written:
+            self.written[-1].add(name)
+
+    def push(self):
+        self.written.append(set())
+
+    def pop(self):
+        written = self.written.pop()
+        for name in written:
+            self.invalidate(name)
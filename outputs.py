@@ -0,0 +1,154 @@
+import bisect
+import tempfile
+from array import array
+from itertools import accumulate
+
+# the default number of lines an OutputLog keeps in memory
+CAPACITY = 100000
+
+
+# the lines a program outputs (starting with the run time), written one at a time as the program runs and read by the
+# terminal as wrapped lines. lines are kept unwrapped, and are wrapped to 'line_length' only when they are read, so
+# they can be wrapped again to a new line length (e.g., when the window is resized) without running the program again.
+# for each line, its length and the number of wrapped lines up to the end of it are kept in typed arrays, so the line
+# holding any wrapped line is found with a binary search. these are worked out again for every line when the line
+# length changes, but only once the lines are next read.
+# at most 'capacity' lines are kept in memory (which is trimmed a batch at a time, once twice as many have been
+# written). the lines before them are either forgotten, so the log holds only the latest lines and its memory is
+# bounded however long the program runs, or if 'spill' is set, written to a temporary file, so every line can still be
+# read (only their lengths and positions in the file, 24 bytes a line, are kept in memory).
+# whether any line is an error is worked out as the lines are written, including lines which have since been
+# forgotten. reading the log as a sequence gives the wrapped lines, as flattening the outputs of executeBlocks would
+class OutputLog:
+    def __init__(self, line_length, capacity=CAPACITY, spill=False):
+        self.line_length = max(line_length, 1)
+        self.capacity = capacity
+        self.spill = tempfile.TemporaryFile() if spill else None
+        # the position in the temporary file of each line written to it, then the end of the last one
+        self.offsets = array("q", [0])
+        self.held = []
+        self.lengths = array("q")
+        # the number of wrapped lines up to the end of each line in 'lengths', counting from 'skipped'. None once the
+        # line length has changed, until they are next read
+        self.ends = array("q")
+        self.skipped = 0
+        # the number of lines written, and the index of the first line in 'lengths' and in 'held'
+        self.count = 0
+        self.first = 0
+        self.first_held = 0
+        self.error = False
+        # the number of the first line which is an error, if any
+        self.first_error = None
+
+    def write(self, line):
+        self.held.append(line)
+        self.lengths.append(len(line))
+        if self.ends is not None:
+            self.ends.append((self.ends[-1] if self.ends else self.skipped) - (-len(line) // self.line_length))
+        self.count += 1
+        if not self.error and ("Error" in line or "error" in line):
+            self.error = True
+            self.first_error = self.count - 1
+        if len(self.held) >= 2 * self.capacity:
+            self.trim()
+
+    # keep only the latest 'capacity' lines in memory, writing the rest to the temporary file or forgetting them
+    def trim(self):
+        n = len(self.held) - self.capacity
+        if self.spill is not None:
+            data = [line.encode("utf-8") for line in self.held[:n]]
+            position = self.offsets[-1]
+            for d in data:
+                position += len(d)
+                self.offsets.append(position)
+            self.spill.seek(0, 2)
+            self.spill.write(b"".join(data))
+        else:
+            ends = self.wrapped()
+            self.skipped = ends[n - 1]
+            del self.lengths[:n]
+            del ends[:n]
+            self.first += n
+        del self.held[:n]
+        self.first_held += n
+
+    # remove the lines from line 'n' onwards (counting every line written), which must not have been forgotten
+    def truncate(self, n):
+        if n < self.first:
+            raise ValueError("cannot truncate to a line which has been forgotten")
+        if n >= self.count:
+            return
+        if n >= self.first_held:
+            del self.held[n - self.first_held:]
+        else:
+            self.held.clear()
+            self.first_held = n
+            del self.offsets[n + 1:]
+            self.spill.truncate(self.offsets[n])
+        del self.lengths[n - self.first:]
+        if self.ends is not None:
+            del self.ends[n - self.first:]
+        self.count = n
+        if self.first_error is not None and self.first_error >= n:
+            self.first_error = None
+            self.error = False
+
+    # replace the first line (the run time) if it hasn't been forgotten. one written to the temporary file can only be
+    # replaced by one of the same size there
+    def retitle(self, line):
+        if self.first > 0 or not self.count:
+            return
+        if self.first_held == 0:
+            self.held[0] = line
+        else:
+            data = line.encode("utf-8")
+            if len(data) != self.offsets[1]:
+                return
+            self.spill.seek(0)
+            self.spill.write(data)
+        if len(line) != self.lengths[0]:
+            self.lengths[0] = len(line)
+            self.ends = None
+
+    # wrap the lines to a new line length
+    def resize(self, line_length):
+        line_length = max(line_length, 1)
+        if line_length != self.line_length:
+            self.line_length = line_length
+            self.ends = None
+
+    def wrapped(self):
+        if self.ends is None:
+            self.skipped = 0
+            self.ends = array("q", accumulate(-(-n // self.line_length) for n in self.lengths))
+        return self.ends
+
+    # line number 'i' (counting every line written)
+    def line(self, i):
+        if i >= self.first_held:
+            return self.held[i - self.first_held]
+        self.spill.seek(self.offsets[i])
+        return self.spill.read(self.offsets[i + 1] - self.offsets[i]).decode("utf-8")
+
+    def __len__(self):
+        ends = self.wrapped()
+        return ends[-1] - self.skipped if ends else 0
+
+    def __getitem__(self, k):
+        ends = self.wrapped()
+        if not 0 <= k < len(self):
+            raise IndexError("output line out of range")
+        i = bisect.bisect_right(ends, k + self.skipped)
+        start = (ends[i - 1] if i else self.skipped) - self.skipped
+        chunk = (k - start) * self.line_length
+        return self.line(self.first + i)[chunk:chunk + self.line_length]
+
+    def __iter__(self):
+        for i in range(self.first, self.count):
+            line = self.line(i)
+            for chunk in range(0, len(line), self.line_length):
+                yield line[chunk:chunk + self.line_length]
+
+    def close(self):
+        if self.spill is not None:
+            self.spill.close()
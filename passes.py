@@ -0,0 +1,246 @@
+from blocks import *
+from helpers import *
+
+
+# blocks which only appear in optimised programs, made by the passes below.
+# Shared is an expression whose value is stored when it is evaluated, so that the SharedRef blocks pointing to it later
+# in the same statement can reuse it rather than evaluating an identical expression again
+class Shared:
+    def __init__(self, expr):
+        self.expr = expr
+
+
+class SharedRef:
+    def __init__(self, shared):
+        self.shared = shared
+
+
+# Hoisted is an expression which doesn't depend on any variable assigned in the while block it is in. its value is
+# stored the first time it is evaluated in each run of the loop and reused after that. if evaluating it raises an
+# error nothing is stored, so the error is raised each time as it would have been without hoisting
+class Hoisted:
+    def __init__(self, expr):
+        self.expr = expr
+
+
+# a while block with the hoisted expressions whose stored values are cleared each time the loop is started
+class HoistingWhile(While):
+    def __init__(self, cond, stats, hoisted):
+        super().__init__(cond, stats)
+        self.hoisted = hoisted
+
+
+# static class for the optimisation passes which can be run on blocks before they are compiled. each pass gives back
+# new blocks rather than changing the ones it is given (which are still drawn in the code development environment), and
+# none of them change the outputs or the trace table of a program:
+# - "fold" replaces operations and comparisons of numbers with their result
+# - "dead" drops the branch of an if statement with a number as its condition which can never run
+# - "hoist" moves expressions in while loops which don't depend on variables assigned in the loop out of it
+# - "cse" evaluates expressions which appear more than once in the same statement only once
+class BlockOptimiser:
+    passes = ("fold", "dead", "hoist", "cse")
+
+    # run the chosen passes (always in the order above) on the blocks in the run order, returning a new run order. the
+    # passes are recursive, so if a program is nested too deeply for them it is left as it is
+    @staticmethod
+    def optimise(run_order, passes=passes):
+        functions = {
+            "fold": BlockOptimiser.foldConstants,
+            "dead": BlockOptimiser.removeDeadBranches,
+            "hoist": BlockOptimiser.hoistInvariants,
+            "cse": BlockOptimiser.eliminateCommonSubexpressions,
+        }
+        try:
+            optimised = []
+            for block in run_order:
+                statement = block.block
+                for name in BlockOptimiser.passes:
+                    if name in passes:
+                        statement = functions[name](statement)
+                optimised.append(Block(statement, block.x, block.y))
+            return optimised
+        except RecursionError:
+            return run_order
+
+    # make a copy of a statement with 'expr' applied to each of its expressions and 'statements' applied to each of its
+    # lists of statements (which are given without the empty space at the end)
+    @staticmethod
+    def mapStatement(block, expr, statements):
+        if isinstance(block, Assignment):
+            return Assignment(block.varName, expr(block.expr))
+        if isinstance(block, IfElse):
+            return IfElse(expr(block.cond), statements([s for s in block.true if s is not None]),
+                          statements([s for s in block.false if s is not None]))
+        if isinstance(block, HoistingWhile):
+            return HoistingWhile(expr(block.cond), statements([s for s in block.stats if s is not None]),
+                                 block.hoisted)
+        if isinstance(block, While):
+            return While(expr(block.cond), statements([s for s in block.stats if s is not None]))
+        if isinstance(block, Turtle2DMovement):
+            return Turtle2DMovement(expr(block.start_x), expr(block.start_y), expr(block.dest_x), expr(block.dest_y))
+        if isinstance(block, Turtle2DMoveForward):
+            return Turtle2DMoveForward(expr(block.dist))
+        if isinstance(block, Turtle2DRotate):
+            return Turtle2DRotate(expr(block.angle))
+        if isinstance(block, Comparison) or isinstance(block, Operation) or isinstance(
+                block, Number) or isinstance(block, Variable):
+            return expr(block)
+        return block
+
+    # a key which is the same for two expressions exactly when they are made of the same blocks. the type of numbers is
+    # included since e.g. 1, 1.0 and True are equal but are output differently
+    @staticmethod
+    def key(block):
+        if isinstance(block, Number):
+            return "number", type(block.n), block.n
+        if isinstance(block, Variable):
+            return "variable", block.name
+        if isinstance(block, Operation) or isinstance(block, Comparison):
+            return type(block).__name__, block.sign, BlockOptimiser.key(block.left), BlockOptimiser.key(block.right)
+        # anything else is only ever equal to itself
+        return "block", id(block)
+
+    # the names of the variables an expression reads. hoisted expressions are left out since they are already known
+    # not to depend on anything assigned in the loops they are in
+    @staticmethod
+    def reads(block):
+        if isinstance(block, Variable):
+            return {block.name}
+        if isinstance(block, Operation) or isinstance(block, Comparison):
+            return BlockOptimiser.reads(block.left) | BlockOptimiser.reads(block.right)
+        return set()
+
+    # whether every block in an expression can be evaluated (i.e., it has no empty spaces or other blocks which would
+    # raise a SyntaxError)
+    @staticmethod
+    def valid(block):
+        if isinstance(block, Operation) or isinstance(block, Comparison):
+            return BlockOptimiser.valid(block.left) and BlockOptimiser.valid(block.right)
+        return isinstance(block, Number) or isinstance(block, Variable) or isinstance(block, Hoisted)
+
+    # the names of all variables assigned anywhere in a statement, including in the statements of if/while blocks in it
+    @staticmethod
+    def assigned(block):
+        if isinstance(block, Assignment):
+            return {block.varName}
+        statements = block.true + block.false if isinstance(block, IfElse) else block.stats if isinstance(
+            block, While) else []
+        return set().union(*(BlockOptimiser.assigned(s) for s in statements if s is not None))
+
+    @staticmethod
+    def foldConstants(block):
+        def expr(block):
+            if not (isinstance(block, Operation) or isinstance(block, Comparison)):
+                return block
+            left, right = expr(block.left), expr(block.right)
+            if isinstance(left, Number) and isinstance(right, Number):
+                try:
+                    return Number(signFunctions.get(block.sign, unknownSign)(left.n, right.n))
+                except Exception:
+                    # anything that would raise an error is left to raise it when the program is run
+                    pass
+            return type(block)(block.sign, left, right)
+
+        def statements(stats):
+            return [BlockOptimiser.mapStatement(s, expr, statements) for s in stats]
+        return BlockOptimiser.mapStatement(block, expr, statements)
+
+    # the statements of the branch which runs are put straight into the statements around the if block when none of
+    # them are assignments (which would define variables in the if block's context). otherwise, and for if blocks which
+    # aren't inside other blocks, the if block is kept with the other branch emptied
+    @staticmethod
+    def removeDeadBranches(block):
+        def prune(block):
+            block = BlockOptimiser.mapStatement(block, lambda e: e, statements)
+            if isinstance(block, IfElse) and isinstance(block.cond, Number):
+                live = block.true if block.cond.n else block.false
+                live = [s for s in live if s is not None]
+                return IfElse(block.cond, live if block.cond.n else [], [] if block.cond.n else live)
+            if isinstance(block, While) and isinstance(block.cond, Number) and not block.cond.n:
+                return While(block.cond, [])
+            return block
+
+        def statements(stats):
+            pruned = []
+            for s in stats:
+                s = prune(s)
+                if isinstance(s, IfElse) and isinstance(s.cond, Number) and not any(
+                        isinstance(x, Assignment) for x in s.true + s.false):
+                    pruned.extend(x for x in s.true + s.false if x is not None)
+                else:
+                    pruned.append(s)
+            return pruned
+        return prune(block)
+
+    # for each while block, the largest expressions in it which read variables but none that are assigned anywhere in
+    # the loop are replaced by Hoisted blocks (the same one for identical expressions). this is done for outer loops
+    # first, so an expression is hoisted out of as many loops as it can be
+    @staticmethod
+    def hoistInvariants(block):
+        def statement(block):
+            if not isinstance(block, While) or isinstance(block, HoistingWhile):
+                return BlockOptimiser.mapStatement(block, lambda e: e, statements)
+
+            assigned = BlockOptimiser.assigned(block)
+            table = {}
+
+            def expr(e):
+                if not (isinstance(e, Operation) or isinstance(e, Comparison)):
+                    return e
+                reads = BlockOptimiser.reads(e)
+                if reads and not reads & assigned and BlockOptimiser.valid(e):
+                    key = BlockOptimiser.key(e)
+                    if key not in table:
+                        table[key] = Hoisted(e)
+                    return table[key]
+                return type(e)(e.sign, expr(e.left), expr(e.right))
+
+            def everywhere(stats):
+                return [BlockOptimiser.mapStatement(s, expr, everywhere) for s in stats]
+
+            loop = While(expr(block.cond), everywhere([s for s in block.stats if s is not None]))
+            stats = statements([s for s in loop.stats if s is not None])
+            if table:
+                return HoistingWhile(loop.cond, stats, list(table.values()))
+            return While(loop.cond, stats)
+
+        def statements(stats):
+            return [statement(s) for s in stats]
+        return statement(block)
+
+    # within each statement, the first (in the order they are evaluated) of a set of identical operations or
+    # comparisons is made a Shared block and the rest refer to it. the expressions of if/while blocks inside the
+    # statement are dealt with separately since they are their own statements
+    @staticmethod
+    def eliminateCommonSubexpressions(block):
+        def statement(block):
+            counts = {}
+
+            def count(e):
+                if isinstance(e, Operation) or isinstance(e, Comparison):
+                    key = BlockOptimiser.key(e)
+                    counts[key] = counts.get(key, 0) + 1
+                    count(e.left)
+                    count(e.right)
+                return e
+
+            BlockOptimiser.mapStatement(block, count, lambda stats: [])
+            shared = {}
+
+            def expr(e):
+                if not (isinstance(e, Operation) or isinstance(e, Comparison)):
+                    return e
+                key = BlockOptimiser.key(e)
+                if key in shared:
+                    return SharedRef(shared[key])
+                if counts[key] > 1:
+                    shared[key] = Shared(None)
+                    shared[key].expr = type(e)(e.sign, expr(e.left), expr(e.right))
+                    return shared[key]
+                return type(e)(e.sign, expr(e.left), expr(e.right))
+
+            return BlockOptimiser.mapStatement(block, expr, statements)
+
+        def statements(stats):
+            return [statement(s) for s in stats]
+        return statement(block)
@@ -0,0 +1,129 @@
+import time
+from blocks import *
+
+
+# the statistics recorded for one block: how many times it ran, the time spent running it including ('total') and not
+# including ('own') the blocks inside it, and how many errors it raised
+class BlockStats:
+    def __init__(self):
+        self.count = 0
+        self.total = 0
+        self.own = 0
+        self.errors = 0
+
+
+# records how long each block of a program takes to run on BlockVM. the program is run one instruction at a time with
+# each instruction timed, and the time is put down to the block the instruction was lowered from. this is much slower
+# than running normally, so it is only done when asked for (by passing a profiler to executeBlocks or ProgramRun).
+# a block's count is the number of times its first instruction ran, which for if and while blocks is the number of
+# times their condition was checked
+class BlockProfiler:
+    def __init__(self):
+        self.times = []
+        self.counts = []
+        self.errors = []
+        self.vm = None
+
+    # run at most 'steps' instructions of the VM (or all of them if it is None), returning whether it has finished
+    def run(self, vm, steps=None):
+        if vm is not self.vm:
+            self.vm = vm
+            self.times = [0.0] * len(vm.code)
+            self.counts = [0] * len(vm.code)
+            self.errors = [0] * len(vm.code)
+        times, counts, errors = self.times, self.counts, self.errors
+        clock = time.perf_counter
+        while not vm.finished and steps != 0:
+            pc = vm.pc
+            raised = vm.errors
+            start = clock()
+            vm.run(1)
+            times[pc] += clock() - start
+            counts[pc] += 1
+            if vm.errors != raised:
+                errors[pc] += 1
+            if steps is not None:
+                steps -= 1
+        return vm.finished
+
+    # the statistics of every block which any instructions were lowered from, keyed by the block
+    def stats(self):
+        stats = {}
+        if self.vm is None:
+            return stats
+        for pc, owner in enumerate(self.vm.owners):
+            if owner is None:
+                continue
+            if owner not in stats:
+                stats[owner] = BlockStats()
+                stats[owner].count = self.counts[pc]
+            stats[owner].own += self.times[pc]
+            stats[owner].errors += self.errors[pc]
+
+        # the total time of each block is its own time and the total times of the blocks inside it, which are worked out
+        # first by going through the blocks in reverse preorder
+        order = []
+        tasks = [block.block for block in self.vm.run_order]
+        while tasks:
+            block = tasks.pop()
+            if block is None:
+                continue
+            order.append(block)
+            tasks.extend(BlockFunctions.children(block))
+        for block in reversed(order):
+            if block in stats:
+                stats[block].total = stats[block].own + sum(
+                    stats[child].total for child in BlockFunctions.children(block) if child in stats)
+        return stats
+
+    # how hot each block is for drawing, from 0 to 1: its own time as a fraction of that of the block with the most
+    def heat(self):
+        stats = self.stats()
+        most = max((s.own for s in stats.values()), default=0)
+        if most == 0:
+            return {}
+        return {block: s.own / most for block, s in stats.items()}
+
+    @staticmethod
+    def describe(block):
+        if isinstance(block, Number):
+            return f"number {block.n}"
+        if isinstance(block, Variable):
+            return f"variable {block.name}"
+        if isinstance(block, Assignment):
+            return f"assignment to {block.varName}"
+        if isinstance(block, Operation) or isinstance(block, Comparison):
+            return f"{type(block).__name__.lower()} {block.sign}"
+        if isinstance(block, IfElse):
+            return "if statement"
+        if isinstance(block, While):
+            return "while statement"
+        if isinstance(block, Turtle2DMovement):
+            return "turtle movement"
+        if isinstance(block, Turtle2DMoveForward):
+            return "turtle move forward"
+        if isinstance(block, Turtle2DRotate):
+            return "turtle rotation"
+        return type(block).__name__
+
+    # a table of the statistics of every block, the blocks taking the most time on their own first
+    def summary(self):
+        stats = self.stats()
+        nums = {}
+        for num, block in enumerate(self.vm.run_order if self.vm is not None else [], 1):
+            tasks = [block.block]
+            while tasks:
+                b = tasks.pop()
+                if b is not None:
+                    nums[b] = num
+                    tasks.extend(BlockFunctions.children(b))
+        overall = sum(s.own for s in stats.values()) or 1
+        lines = [f"{'block':>5}  {'':<24}{'count':>10}{'total ms':>12}{'own ms':>12}{'own %':>8}{'errors':>8}"]
+        for block, s in sorted(stats.items(), key=lambda item: -item[1].own):
+            lines.append(f"{nums.get(block, ''):>5}  {BlockProfiler.describe(block)[:23]:<24}{s.count:>10}"
+                         f"{s.total * 1000:>12.3f}{s.own * 1000:>12.3f}{100 * s.own / overall:>8.1f}{s.errors:>8}")
+        return lines
+
+    def dump(self, path):
+        with open(path, "w") as f:
+            f.writelines(line + "\n" for line in self.summary())
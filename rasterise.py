@@ -0,0 +1,115 @@
+import zlib
+import struct
+import numpy as np
+
+# the size of the turtle pane in the code development environment at its starting window size
+WIDTH, HEIGHT = 640, 360
+# the most points along lines worked out at once when rasterising, which bounds the memory used however many there are
+CHUNK = 1 << 22
+
+
+# static class for drawing the turtle's lines without pygame or a display, e.g., to mark turtle programs in bulk or to
+# compare drawings in tests. lines are transformed all at once with NumPy in the same way App.draw_turtle does (the
+# turtle's origin at the centre of a width x height image, scaled by pixels per unit, with y upwards), and either
+# rasterised into an array of pixels, which can be saved as a PNG, or written out as the path data of an SVG, a chunk
+# of lines at a time so even drawings of millions of lines are never held in memory as text
+class TurtleRenderer:
+    # the lines (a SegmentStore, or an (N, 4) array of start x, start y, end x and end y as stored in one) in image
+    # coordinates
+    @staticmethod
+    def transform(lines, width=WIDTH, height=HEIGHT, pixels_per_unit=20):
+        points = np.asarray(getattr(lines, "array", lines), dtype=np.float64).reshape(-1, 4) * pixels_per_unit
+        points[:, 0::2] += width // 2
+        points[:, 1::2] = height // 2 - points[:, 1::2]
+        return points
+
+    # the range of each line's parameter (0 at its start, 1 at its end) inside the image, clipping all the lines at once
+    # (Liang-Barsky). lines entirely outside the image have an empty range
+    @staticmethod
+    def clip(points, width, height):
+        x, y = points[:, 0], points[:, 1]
+        dx, dy = points[:, 2] - x, points[:, 3] - y
+        start, end = np.zeros(len(points)), np.ones(len(points))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            for p, q in ((-dx, x), (dx, width - 1 - x), (-dy, y), (dy, height - 1 - y)):
+                r = q / p
+                start = np.where(p < 0, np.maximum(start, r), start)
+                end = np.where(p > 0, np.minimum(end, r), end)
+                # a line parallel to an edge and beyond it is entirely outside
+                end = np.where((p == 0) & (q < 0), -1, end)
+        return start, end
+
+    # draw the lines in black onto a white greyscale image, returned as a (height, width) array of uint8. as with
+    # pygame.draw.line, the ends of each line are rounded down to whole pixels and one pixel is drawn for each step along
+    # its longer axis, so the image matches the turtle pane nearly pixel for pixel (pixels can differ where a line is
+    # exactly halfway between two, or leaves the image, as pygame clips lines differently). the pixels are worked out
+    # CHUNK at a time
+    @staticmethod
+    def rasterise(lines, width=WIDTH, height=HEIGHT, pixels_per_unit=20):
+        image = np.full((height, width), 255, dtype=np.uint8)
+        points = TurtleRenderer.transform(lines, width, height, pixels_per_unit)
+        points = np.floor(points[np.isfinite(points).all(axis=1)])
+        start, end = TurtleRenderer.clip(points, width, height)
+        dx, dy = points[:, 2] - points[:, 0], points[:, 3] - points[:, 1]
+        steps = np.maximum(np.abs(dx), np.abs(dy))
+        # the steps along each line which are inside the image
+        first_step = np.ceil(start * steps - 1e-9)
+        last_step = np.floor(end * steps + 1e-9)
+        keep = last_step >= first_step
+        points, dx, dy, steps = points[keep], dx[keep], dy[keep], np.maximum(steps[keep], 1)
+        first_step = first_step[keep].astype(np.int64)
+        counts = last_step[keep].astype(np.int64) - first_step + 1
+        ends = np.cumsum(counts)
+        first = 0
+        while first < len(points):
+            # as many lines as have at most CHUNK pixels between them (but always at least one)
+            base = ends[first] - counts[first]
+            last = max(int(np.searchsorted(ends, base + CHUNK, side="right")), first + 1)
+            n = counts[first:last]
+            line = np.repeat(np.arange(first, last), n)
+            step = np.arange(int(n.sum())) - np.repeat(ends[first:last] - n - base, n) + first_step[line]
+            t = step / steps[line]
+            xs = np.floor(points[line, 0] + t * dx[line] + 0.5).astype(np.int64)
+            ys = np.floor(points[line, 1] + t * dy[line] + 0.5).astype(np.int64)
+            inside = (xs >= 0) & (xs < width) & (ys >= 0) & (ys < height)
+            image[ys[inside], xs[inside]] = 0
+            first = last
+        return image
+
+    # save a greyscale image array as an 8 bit PNG
+    @staticmethod
+    def savePNG(image, path):
+        height, width = image.shape
+
+        def chunk(kind, data):
+            return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+        # each row is preceded by its filter type, 0 (none)
+        rows = np.hstack((np.zeros((height, 1), dtype=np.uint8), image.astype(np.uint8)))
+        with open(path, "wb") as f:
+            f.write(b"\x89PNG\r\n\x1a\n")
+            f.write(chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 0, 0, 0, 0)))
+            f.write(chunk(b"IDAT", zlib.compress(rows.tobytes(), 6)))
+            f.write(chunk(b"IEND", b""))
+
+    # write the lines as an SVG to the text file 'f'. a line starting where the one before it ended carries on the same
+    # path, so a turtle moving without jumping gives one "L" per line
+    @staticmethod
+    def writeSVG(lines, f, width=WIDTH, height=HEIGHT, pixels_per_unit=20, chunk=100000):
+        points = TurtleRenderer.transform(lines, width, height, pixels_per_unit)
+        points = points[np.isfinite(points).all(axis=1)]
+        f.write(f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" '
+                f'viewBox="0 0 {width} {height}">\n')
+        f.write(f'<rect width="{width}" height="{height}" fill="white"/>\n')
+        f.write('<path fill="none" stroke="black" stroke-width="1" d="')
+        points = np.round(points, 2)
+        joined = np.zeros(len(points), dtype=bool)
+        joined[1:] = (points[1:, :2] == points[:-1, 2:]).all(axis=1)
+        for first in range(0, len(points), chunk):
+            f.write("".join(f"L{d_x} {d_y}" if j else f"M{s_x} {s_y}L{d_x} {d_y}" for (s_x, s_y, d_x, d_y), j in
+                            zip(points[first:first + chunk].tolist(), joined[first:first + chunk].tolist())))
+        f.write('"/>\n</svg>\n')
+
+    @staticmethod
+    def saveSVG(lines, path, width=WIDTH, height=HEIGHT, pixels_per_unit=20):
+        with open(path, "w") as f:
+            TurtleRenderer.writeSVG(lines, f, width, height, pixels_per_unit)
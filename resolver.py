@@ -0,0 +1,115 @@
+from blocks import *
+from passes import Shared, SharedRef, Hoisted, HoistingWhile
+
+
+# the variables assigned directly in one context (the global context, or that of an if/while block), with the position
+# of each in the context's range of slots
+class Scope:
+    def __init__(self):
+        self.names = {}
+        self.start = 0
+
+
+# the result of resolving the variables of a program to slots. 'reads' gives, for each variable block, the slots its
+# value may be found in, most recent context first. 'writes' does the same for each assignment block, starting with the
+# slot in the assignment's own context, which is used if none of them are set. 'scopes' gives the range of slots of each
+# if/while block, which are cleared when it is left, and 'names' gives the name of the variable in each slot, for error
+# messages. 'temps' gives the slot the value of each Shared and Hoisted block from BlockOptimiser is stored in, and
+# 'hoists' the range of slots of the hoisted expressions of each HoistingWhile block. all are keyed by the id() of the
+# block
+class Resolution:
+    def __init__(self):
+        self.reads = {}
+        self.writes = {}
+        self.scopes = {}
+        self.names = {}
+        self.temps = {}
+        self.hoists = {}
+
+
+# static class for the scope resolution pass run before blocks are compiled.
+# contexts are entered and left in the same places blocks are nested, so the contexts a variable could be defined in
+# when it is accessed are known before running: those of the if/while blocks it is inside which have an assignment to
+# it directly in their statements, and the global context. each variable in each context is given its own slot in the
+# flat slots list of the GlobalsStack, so reading or writing a variable only checks the slots of those contexts
+# (nearly always just one) rather than searching every context by name. entering a context needs no work, and leaving
+# it sets its slots back to UNSET.
+# a variable is found in the most recent context it is set in, and assigning to a variable not set in any of them
+# defines it in the assignment's own context, as with GlobalsStack.__getitem__ and __setitem__
+class ScopeResolver:
+    @staticmethod
+    def resolve(blocks, globals):
+        resolution = Resolution()
+        scopes = []
+        reads = []
+        writes = []
+        temps = []
+        hoists = []
+        # a stack of (block, contexts, whether it is a statement) is used instead of recursion so that deeply nested
+        # blocks can be resolved. 'contexts' holds the scopes of the if/while blocks the block is in, innermost first
+        tasks = [(block, (), True) for block in reversed(blocks)]
+        while tasks:
+            block, contexts, statement = tasks.pop()
+            if isinstance(block, Variable):
+                reads.append((block, contexts))
+            elif isinstance(block, Operation) or isinstance(block, Comparison):
+                tasks.append((block.right, contexts, False))
+                tasks.append((block.left, contexts, False))
+            elif isinstance(block, Shared) or isinstance(block, Hoisted):
+                if isinstance(block, Shared):
+                    temps.append(block)
+                tasks.append((block.expr, contexts, False))
+            elif isinstance(block, SharedRef) or not statement:
+                # any other block in place of an expression is never run
+                continue
+            elif isinstance(block, Assignment):
+                if contexts:
+                    contexts[0].names.setdefault(block.varName, len(contexts[0].names))
+                writes.append((block, contexts))
+                tasks.append((block.expr, contexts, False))
+            elif isinstance(block, IfElse) or isinstance(block, While):
+                scope = Scope()
+                scopes.append((block, scope))
+                if isinstance(block, HoistingWhile):
+                    hoists.append(block)
+                inner = (scope,) + contexts
+                statements = block.true + block.false if isinstance(block, IfElse) else block.stats
+                for s in reversed(statements):
+                    tasks.append((s, inner, True))
+                # the condition is evaluated after the if/while block's context has been entered
+                tasks.append((block.cond, inner, False))
+            elif isinstance(block, Turtle2DMovement):
+                for arg in (block.dest_y, block.dest_x, block.start_y, block.start_x):
+                    tasks.append((arg, contexts, False))
+            elif isinstance(block, Turtle2DMoveForward):
+                tasks.append((block.dist, contexts, False))
+            elif isinstance(block, Turtle2DRotate):
+                tasks.append((block.angle, contexts, False))
+
+        # give the variables of each if/while block's context a range of slots after the global ones, followed by the
+        # slots of the stored expressions
+        start = globals.reserve(sum(len(scope.names) for block, scope in scopes) + len(temps) + sum(
+            len(block.hoisted) for block in hoists))
+        for block, scope in scopes:
+            scope.start = start
+            for name, i in scope.names.items():
+                resolution.names[start + i] = name
+            start += len(scope.names)
+            resolution.scopes[id(block)] = (scope.start, start)
+        for block in temps:
+            resolution.temps[id(block)] = start
+            start += 1
+        for block in hoists:
+            resolution.hoists[id(block)] = (start, start + len(block.hoisted))
+            for hoisted in block.hoisted:
+                resolution.temps[id(hoisted)] = start
+                start += 1
+
+        for table, accesses in ((resolution.reads, reads), (resolution.writes, writes)):
+            for block, contexts in accesses:
+                name = block.name if isinstance(block, Variable) else block.varName
+                slot = globals.globalSlot(name)
+                resolution.names[slot] = name
+                table[id(block)] = tuple(scope.start + scope.names[name] for scope in contexts if
+                                         name in scope.names) + (slot,)
+        return resolution
@@ -0,0 +1,100 @@
+import time
+from helpers import *
+from vm import BlockVM
+from passes import BlockOptimiser
+from outputs import OutputLog
+
+
+# a run of a program which can be advanced a bit at a time, so the program runs across many frames of the code
+# development environment rather than blocking it until it finishes (or forever, for an infinite loop).
+# the blocks are run on BlockVM, which can stop after any instruction and carry on later. the lines output are written
+# to 'outputs', an OutputLog (the one given as 'log', or a new one), as the program runs (the run time first, then the
+# lines of each block), so they can be drawn while the program is still running without all being kept. the turtle
+# and trace are updated directly as the blocks run.
+# the run can be paused, resumed and stopped, and the globals are reset once it has finished or been stopped.
+# if a BlockProfiler is given, the time each block takes is recorded in it (and the passes aren't run, as with
+# executeBlocks).
+# if Checkpoints are given, the run carries on from the last run's checkpoint before the first block which has changed
+# since, and records a checkpoint before each block it runs for the next run to carry on from
+class ProgramRun:
+    # the number of instructions run between checks of the time limit
+    chunk = 1000
+
+    def __init__(self, run_order, line_length, turtle, trace, globals, now, passes=(), profiler=None, log=None,
+                 checkpoints=None):
+        self.line_length = line_length
+        self.globals = globals
+        self.outputs = log if log is not None else OutputLog(line_length)
+        self.outputs.write(now)
+        self.paused = False
+        self.stopped = False
+        self.profiler = profiler
+        self.checkpoints = checkpoints
+        # the index in the run order of the first block run
+        self.start = 0
+        if checkpoints is not None:
+            self.start, self.outputs = checkpoints.resume(run_order, turtle, trace, globals, self.outputs)
+            run_order = run_order[self.start:]
+        if passes and profiler is None:
+            run_order = BlockOptimiser.optimise(run_order, passes)
+        self.vm = BlockVM(run_order, turtle, trace, globals, self.start)
+        if checkpoints is not None:
+            self.vm.boundary = self.checkpoint
+        if self.vm.finished:
+            self.finish()
+
+    @property
+    def finished(self):
+        return self.vm.finished or self.stopped
+
+    @property
+    def running(self):
+        return not self.finished and not self.paused
+
+    def pause(self):
+        self.paused = True
+
+    def resume(self):
+        self.paused = False
+
+    def stop(self):
+        if not self.finished:
+            self.stopped = True
+            self.globals.reset()
+
+    # run the program for at most 'steps' instructions and/or 'ms' milliseconds (or until it finishes if neither is
+    # given), returning whether it has finished
+    def advance(self, steps=None, ms=None):
+        if not self.running:
+            return self.finished
+        deadline = None if ms is None else time.perf_counter() + ms / 1000
+        while not self.vm.finished and steps != 0:
+            n = self.chunk if steps is None else min(self.chunk, steps)
+            if self.profiler is not None:
+                self.profiler.run(self.vm, n)
+            else:
+                self.vm.run(n)
+            if steps is not None:
+                steps -= n
+            if deadline is not None and time.perf_counter() >= deadline:
+                break
+        self.collect()
+        if self.vm.finished:
+            self.finish()
+        return self.finished
+
+    # write the lines output since the last call to 'outputs'
+    def collect(self):
+        for line in self.vm.drain():
+            self.outputs.write(line)
+
+    # record the checkpoint before block 'num' (counting from 1 over the whole run order). the lines output before it
+    # include those which haven't been collected yet
+    def checkpoint(self, num):
+        position = self.outputs.count + sum(len(output) for output in self.vm.outputs[self.vm.drained:])
+        self.checkpoints.record(num - 1, self.globals, position)
+
+    def finish(self):
+        if self.checkpoints is not None:
+            self.checkpoint(self.start + len(self.vm.run_order) + 1)
+        self.globals.reset()
@@ -0,0 +1,154 @@
+import struct
+import numpy as np
+
+# the bytes of a segment as stored in a row of the array, used as its key in the index of segments drawn so far
+KEY = struct.Struct("=4d")
+
+
+# stores the lines the turtle has drawn as the rows of a float64 array of shape (N, 4), each row being the start x, start
+# y, end x and end y of a line. the array doubles in size when it fills up, so appending a line takes constant time on
+# average and each line takes 32 bytes.
+# Turtle2DMovement only draws a line if it hasn't been drawn before, which is checked against a dictionary of the lines
+# drawn so far (keyed by their bytes, with the number of times each was drawn). the dictionary is only built up to the
+# newest line when it is next needed, so programs which only move forward never build it.
+# if 'coalesce' is set, a line drawn by Turtle2DMoveForward carrying straight on from the one before it in the same
+# direction (i.e., with no rotation in between) extends that line rather than adding a new one, which looks the same
+# but makes far fewer lines for programs moving forward in small steps.
+# iterating over the store gives each line as [(start x, start y), (end x, end y)], as the lines list it replaces did
+class SegmentStore:
+    def __init__(self, coalesce=False):
+        self.data = np.empty((64, 4))
+        self.length = 0
+        self.coalesce = coalesce
+        self.index = {}
+        # the number of lines (from the start) which have been added to the index
+        self.indexed = 0
+        # the angle of the turtle when the last line was drawn, if it was drawn by moving forward (so can be extended)
+        self.heading = None
+
+    def __len__(self):
+        return self.length
+
+    def __iter__(self):
+        for s_x, s_y, d_x, d_y in self.array.tolist():
+            yield [(s_x, s_y), (d_x, d_y)]
+
+    def __getitem__(self, i):
+        s_x, s_y, d_x, d_y = self.array[i].tolist()
+        return [(s_x, s_y), (d_x, d_y)]
+
+    def __contains__(self, line):
+        (s_x, s_y), (d_x, d_y) = line
+        self.updateIndex()
+        return KEY.pack(*SegmentStore.row(s_x, s_y, d_x, d_y)) in self.index
+
+    # the index isn't sent when the store is copied to another process, and is built again there if it is needed
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["data"] = self.array.copy()
+        state["index"] = {}
+        state["indexed"] = 0
+        return state
+
+    # the lines drawn so far as an (N, 4) array, which is a view of the store so shouldn't be kept once more are drawn
+    @property
+    def array(self):
+        return self.data[:self.length]
+
+    # coordinates as stored, which raises a TypeError for anything which isn't a real number. adding 0.0 turns -0.0
+    # into 0.0, so they are the same line in the index as they are when compared
+    @staticmethod
+    def row(s_x, s_y, d_x, d_y):
+        return float(s_x) + 0.0, float(s_y) + 0.0, float(d_x) + 0.0, float(d_y) + 0.0
+
+    def push(self, row):
+        if self.length == len(self.data):
+            # a store copied from another process only has room for the lines it had, which may be none
+            data = np.empty((max(2 * len(self.data), 64), 4))
+            data[:self.length] = self.data
+            self.data = data
+        self.data[self.length] = row
+        self.length += 1
+        self.heading = None
+
+    def updateIndex(self):
+        if self.indexed == self.length:
+            return
+        index = self.index
+        raw = self.data[self.indexed:self.length].tobytes()
+        for i in range(0, len(raw), KEY.size):
+            key = raw[i:i + KEY.size]
+            index[key] = index.get(key, 0) + 1
+        self.indexed = self.length
+
+    # remove lines from the index from line 'start' onwards, so they can be changed
+    def unindex(self, start):
+        if start >= self.indexed:
+            return
+        index = self.index
+        raw = self.data[start:self.indexed].tobytes()
+        for i in range(0, len(raw), KEY.size):
+            key = raw[i:i + KEY.size]
+            if index[key] == 1:
+                del index[key]
+            else:
+                index[key] -= 1
+        self.indexed = start
+
+    # draw a line if it hasn't been drawn before (for Turtle2DMovement), returning whether it was drawn
+    def add(self, s_x, s_y, d_x, d_y):
+        row = SegmentStore.row(s_x, s_y, d_x, d_y)
+        key = KEY.pack(*row)
+        self.updateIndex()
+        if key in self.index:
+            return False
+        self.push(row)
+        self.index[key] = 1
+        self.indexed = self.length
+        return True
+
+    # draw a line moving forward with the turtle at 'angle' (for Turtle2DMoveForward), extending the last line instead
+    # if coalescing and it carries straight on from it
+    def forward(self, s_x, s_y, d_x, d_y, angle):
+        row = SegmentStore.row(s_x, s_y, d_x, d_y)
+        if self.coalesce and self.heading == angle and self.length:
+            l_x, l_y, e_x, e_y = self.data[self.length - 1].tolist()
+            # lines moving forward at the same angle are parallel, so carry on from each other if the last one ends
+            # where this one starts and they point the same way rather than opposite ways
+            if e_x == row[0] and e_y == row[1] and (e_x - l_x) * (row[2] - row[0]) + (e_y - l_y) * (row[3] - row[1]) >= 0:
+                self.unindex(self.length - 1)
+                self.data[self.length - 1, 2:] = row[2:]
+                return
+        self.push(row)
+        self.heading = angle
+
+    # add lines given as an (N, 4) array or as [(start x, start y), (end x, end y)] pairs
+    def extend(self, lines):
+        rows = np.asarray(lines, dtype=np.float64).reshape(-1, 4) + 0.0
+        if self.length + len(rows) > len(self.data):
+            data = np.empty((max(2 * len(self.data), self.length + len(rows)), 4))
+            data[:self.length] = self.array
+            self.data = data
+        self.data[self.length:self.length + len(rows)] = rows
+        self.length += len(rows)
+        self.heading = None
+
+    # remove the lines from line 'n' onwards
+    def truncate(self, n):
+        if n < self.length:
+            self.unindex(n)
+            self.length = n
+            self.heading = None
+
+    # the state of the store, which it can be put back to with restore() as long as lines have only been added (or the
+    # last line extended) since. the last line is kept as it may since have been extended
+    def mark(self):
+        return self.length, self.data[self.length - 1].tolist() if self.length else None, self.heading
+
+    def restore(self, mark):
+        length, last, heading = mark
+        self.truncate(length)
+        if length and self.data[length - 1].tolist() != last:
+            self.unindex(length - 1)
+            self.data[length - 1] = last
+        self.heading = heading
@@ -0,0 +1,95 @@
+import json
+from blocks import *
+
+# the version of the format programs are saved in, stored in each file so older files can still be read if it changes
+VERSION = 1
+
+
+# static class for turning the blocks in the code development environment into JSON and back, so programs can be saved
+# and loaded, and run without the environment (see headless.py).
+# each block is stored as an object with its type and its arguments, with empty spaces stored as null. the statements
+# of if/while blocks are stored without the empty space at the end, which is added back when they are loaded. numbers
+# keep their type, since e.g. 1 and 1.0 are output differently
+class BlockSerialiser:
+    @staticmethod
+    def toData(block):
+        if block is None:
+            return None
+        if isinstance(block, Number):
+            return {"type": "number", "n": block.n}
+        if isinstance(block, Variable):
+            return {"type": "variable", "name": block.name}
+        if isinstance(block, Assignment):
+            return {"type": "assignment", "name": block.varName, "expr": BlockSerialiser.toData(block.expr)}
+        if isinstance(block, Operation) or isinstance(block, Comparison):
+            return {"type": "operation" if isinstance(block, Operation) else "comparison", "sign": block.sign,
+                    "left": BlockSerialiser.toData(block.left), "right": BlockSerialiser.toData(block.right)}
+        if isinstance(block, IfElse):
+            return {"type": "if", "cond": BlockSerialiser.toData(block.cond),
+                    "true": [BlockSerialiser.toData(s) for s in block.true[:-1]],
+                    "false": [BlockSerialiser.toData(s) for s in block.false[:-1]]}
+        if isinstance(block, While):
+            return {"type": "while", "cond": BlockSerialiser.toData(block.cond),
+                    "stats": [BlockSerialiser.toData(s) for s in block.stats[:-1]]}
+        if isinstance(block, Turtle2DMovement):
+            return {"type": "movement", "start_x": BlockSerialiser.toData(block.start_x),
+                    "start_y": BlockSerialiser.toData(block.start_y), "dest_x": BlockSerialiser.toData(block.dest_x),
+                    "dest_y": BlockSerialiser.toData(block.dest_y)}
+        if isinstance(block, Turtle2DMoveForward):
+            return {"type": "moveForward", "dist": BlockSerialiser.toData(block.dist)}
+        if isinstance(block, Turtle2DRotate):
+            return {"type": "rotate", "angle": BlockSerialiser.toData(block.angle)}
+        raise ValueError(f"cannot save block of type {type(block).__name__}")
+
+    @staticmethod
+    def fromData(data):
+        if data is None:
+            return None
+        fromData = BlockSerialiser.fromData
+        kind = data["type"]
+        if kind == "number":
+            return Number(data["n"])
+        if kind == "variable":
+            return Variable(data["name"])
+        if kind == "assignment":
+            return Assignment(data["name"], fromData(data["expr"]))
+        if kind == "operation":
+            return Operation(data["sign"], fromData(data["left"]), fromData(data["right"]))
+        if kind == "comparison":
+            return Comparison(data["sign"], fromData(data["left"]), fromData(data["right"]))
+        if kind == "if":
+            return IfElse(fromData(data["cond"]), [fromData(s) for s in data["true"]],
+                          [fromData(s) for s in data["false"]])
+        if kind == "while":
+            return While(fromData(data["cond"]), [fromData(s) for s in data["stats"]])
+        if kind == "movement":
+            return Turtle2DMovement(fromData(data["start_x"]), fromData(data["start_y"]), fromData(data["dest_x"]),
+                                    fromData(data["dest_y"]))
+        if kind == "moveForward":
+            return Turtle2DMoveForward(fromData(data["dist"]))
+        if kind == "rotate":
+            return Turtle2DRotate(fromData(data["angle"]))
+        raise ValueError(f"unknown block type {kind}")
+
+    # a whole program is the list of top level blocks with their positions, which decide the order they run in
+    @staticmethod
+    def dumps(code):
+        return json.dumps({"version": VERSION, "blocks": [
+            {"x": block.x, "y": block.y, "block": BlockSerialiser.toData(block.block)} for block in code]})
+
+    @staticmethod
+    def loads(text):
+        data = json.loads(text)
+        if data.get("version") != VERSION:
+            raise ValueError(f"unsupported program version {data.get('version')}")
+        return [Block(BlockSerialiser.fromData(block["block"]), block["x"], block["y"]) for block in data["blocks"]]
+
+    @staticmethod
+    def save(code, path):
+        with open(path, "w") as f:
+            f.write(BlockSerialiser.dumps(code))
+
+    @staticmethod
+    def load(path):
+        with open(path) as f:
+            return BlockSerialiser.loads(f.read())
@@ -1,45 +1,97 @@
-# stores information about the trace table. this includes the actual table, which is stored as a dictionary called
-# traceDict. The keys are the variable names (the 'columns' visually) and the values are the series of each value that
-# variable took at each step in the program (each row for that column visually).
-# additionally, the length is stored so to identify by how much blank cells to pad a value of a variable when it is
-# added for the first time to the trace table.
+import bisect
+from array import array
+from helpers import *
+
+# stores information about the trace table. the keys are the variable names (the 'columns' visually) and each column
+# holds the series of values that variable took at each step in the program (each row for that column visually).
+# the table is sparse - most cells are empty, as only one variable changes at each step - so rather than storing every
+# cell, it is stored as a log of changes split up by variable (given an id in the order they were first assigned to):
+# for each, a typed array of the rows it changed in and a list of the values it changed to. the cells of any rows of a
+# column are then found with a binary search, and columns are only built in full (by get_column()) when asked for.
+# the length is the number of rows. a variable assigned to when its cell in the last row is already filled starts a
+# new row, otherwise the value goes in the last row.
 # there is a method to find the visual width of the trace table, which is just the sum of the sizes taken up by the
-# column headers (i.e., each variable name), plus the padding on each side of the variable name
+# column headers (i.e., each variable name), plus the padding on each side of the variable name. these are kept for
+# each font, so are only measured when a variable is first seen
 # and there is another method to find the visual height, through adding the standard height of a character to the
 # sum of the padding on the top and bottom, and then multiplying that by the length of the trace table.
 # there are also getter methods to get, for the trace so far, the variables, the number of variables and the contents
 # of a column (accessed through the key, which is the header of that column, i.e., the variable for that column).
-# these methods allow for traceDict to be private to the class so it can't be accessed/modified outside class instances.
+# these methods allow for the changes to be private to the class so it can't be accessed/modified outside class instances.
 class TraceTable:
     def __init__(self):
-        self.__traceDict = {}
+        self.__ids = {}
+        self.__names = []
+        # for each variable id, the rows it changed in and the values it changed to
+        self.__changeRows = []
+        self.__changeValues = []
+        # for each font, the width of each column
+        self.__widths = {}
         self.length = 1
 
     def update(self, varName, value):
-        if varName not in self.__traceDict:
-            self.__traceDict[varName] = [None for _ in range(self.length)]
-            self.__traceDict[varName][-1] = value
-        else:
-            if self.__traceDict[varName][-1] is not None:
-                for key in self.__traceDict.keys():
-                    self.__traceDict[key].append(None)
-                self.__traceDict[varName][-1] = value
-                self.length += 1
-            else:
-                self.__traceDict[varName][-1] = value
+        var = self.__ids.get(varName)
+        if var is None:
+            var = self.__ids[varName] = len(self.__ids)
+            self.__names.append(varName)
+            self.__changeRows.append(array("q"))
+            self.__changeValues.append([])
+        elif self.__changeRows[var][-1] == self.length - 1:
+            values = self.__changeValues[var]
+            if values[-1] is None:
+                values[-1] = value
+                return
+            self.length += 1
+        self.__changeRows[var].append(self.length - 1)
+        self.__changeValues[var].append(value)
+
+    # the state of the table, which it can be put back to with restore() as long as only updates have been made since:
+    # the length, and for each variable the number of changes and the last value (which may since have been filled in)
+    def mark(self):
+        return self.length, [(len(rows), values[-1]) for rows, values in zip(self.__changeRows, self.__changeValues)]
+
+    def restore(self, mark):
+        length, columns = mark
+        for name in self.__names[len(columns):]:
+            del self.__ids[name]
+        del self.__names[len(columns):]
+        del self.__changeRows[len(columns):]
+        del self.__changeValues[len(columns):]
+        for widths in self.__widths.values():
+            del widths[len(columns):]
+        for (count, last), rows, values in zip(columns, self.__changeRows, self.__changeValues):
+            del rows[count:]
+            del values[count:]
+            values[-1] = last
+        self.length = length
 
     def get_vars(self):
-        return self.__traceDict.keys()
+        return self.__ids.keys()
 
     def get_num_vars(self):
-        return len(self.__traceDict)
+        return len(self.__ids)
 
     def get_column(self, key):
-        return self.__traceDict[key]
+        return self.get_cells(key, 0, self.length)
+
+    # the cells of a column from row 'start' up to (but not including) row 'stop', None where they are empty
+    def get_cells(self, key, start, stop):
+        var = self.__ids[key]
+        rows, values = self.__changeRows[var], self.__changeValues[var]
+        cells = [None] * max(stop - start, 0)
+        for i in range(bisect.bisect_left(rows, start), bisect.bisect_left(rows, stop)):
+            cells[rows[i] - start] = values[i]
+        return cells
+
+    # the width of each column, including the padding on each side of the header
+    def column_widths(self, font):
+        widths = self.__widths.setdefault(font, [])
+        for key in self.__names[len(widths):]:
+            widths.append(textCache.size(font, key)[0] + 10)
+        return widths
 
     def width(self, font):
-        return sum(font.size(x)[0] for x in self.__traceDict.keys()) + 10 * len(self.__traceDict.keys())
+        return sum(self.column_widths(font))
 
     def height(self, char_height):
         return (char_height + 10) * self.length
-
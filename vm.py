@@ -0,0 +1,304 @@
+import math
+from blocks import *
+from helpers import *
+from compiler import BlockCompiler
+from globalsStack import UNSET
+from resolver import ScopeResolver
+from passes import Shared, SharedRef, Hoisted, HoistingWhile
+
+# opcodes for the instructions blocks are lowered to. each instruction is a tuple of an opcode and an argument
+CONST, LOAD, LOAD_CHAIN, BINARY, BINARY_CONST, INVALID, JUMP, JUMP_IF_FALSE, UNSET_SLOTS, BLOCK, EXPRESSION, ASSIGN, \
+    MOVE, MOVE_FORWARD, ROTATE, STORE_TEMP, LOAD_TEMP, LOAD_HOISTED = range(18)
+
+
+# a position in the instruction list which is only known once the instructions after a jump have been lowered
+class Label:
+    def __init__(self):
+        self.pc = None
+
+
+# what to do when an instruction raises an exception: output an error message for block 'num' (as BlockCompiler.
+# errorMessage would, with 'argument' being None for expression statements, where the message comes from the
+# exception), leave the context of an if/while block if 'scope' is its range of slots, and carry on from the
+# instruction at 'resume'
+class Handler:
+    def __init__(self, num, argument, resume, scope):
+        self.num = num
+        self.argument = argument
+        self.resume = resume
+        self.scope = scope
+
+
+# execution engine which lowers the blocks in the run order to one flat list of instructions with conditional jumps,
+# and runs them in a single loop with an explicit operand stack. unlike BlockFunctions and BlockCompiler, neither
+# lowering nor running uses Python recursion or generators, so deeply nested if/while blocks and operations don't run
+# into the recursion limit.
+# the outputs of each block are collected as a list of lists of lines in 'outputs', one list per block, without
+# wrapping. as with BlockCompiler, variables are accessed through the slots given to them by ScopeResolver, so
+# entering the context of an if/while block needs no instruction and leaving it unsets its slots. run() can be given a
+# maximum number of instructions to run, after which it returns and can be called again to carry on from where it
+# stopped, and drain() takes the lines output so far so they needn't all be kept while a long program runs.
+# the blocks are numbered from 'start' + 1, so the rest of a run order can be run on its own. if 'boundary' is set, it
+# is called with the number of each block just before it starts (see ProgramRun)
+class BlockVM:
+    def __init__(self, run_order, turtle, trace, globals, start=0):
+        resolution = ScopeResolver.resolve([block.block for block in run_order], globals)
+        self.code, self.handlers, self.owners = BlockVM.lower(run_order, resolution, start)
+        self.names = resolution.names
+        self.run_order = run_order
+        self.turtle = turtle
+        self.trace = trace
+        self.globals = globals
+        self.outputs = []
+        # the index of the first block in 'outputs' whose lines haven't all been drained
+        self.drained = 0
+        self.stack = []
+        self.pc = 0
+        self.finished = not self.code
+        # the number of exceptions raised by instructions so far
+        self.errors = 0
+        self.boundary = None
+
+    # lower the blocks in the run order to a list of instructions, a list giving the handler for each instruction that
+    # may raise an exception, and a list giving the block each instruction was lowered from (used by BlockProfiler). a
+    # stack of tasks is used instead of recursion: each task either lowers an expression or statement (pushing the tasks
+    # for its children), appends an instruction or marks the position of a label. each task also holds the block it was
+    # pushed for. tasks are pushed in reverse since the last task pushed is done first
+    @staticmethod
+    def lower(run_order, resolution, start=0):
+        code = []
+        handlers = []
+        owners = []
+        tasks = []
+        for num in range(start + len(run_order), start, -1):
+            tasks.append(("stmt", run_order[num - 1 - start].block, num, None, None))
+            tasks.append(("code", BLOCK, num, None, None))
+
+        while tasks:
+            kind, block, arg, handler, owner = tasks.pop()
+            if kind == "code":
+                code.append((block, arg))
+                handlers.append(handler)
+                owners.append(owner)
+            elif kind == "label":
+                block.pc = len(code)
+            elif kind == "expr":
+                if isinstance(block, Number):
+                    code.append((CONST, block.n))
+                    handlers.append(handler)
+                    owners.append(block)
+                elif isinstance(block, Variable):
+                    chain = resolution.reads[id(block)]
+                    code.append((LOAD, chain[0]) if len(chain) == 1 else (LOAD_CHAIN, chain))
+                    handlers.append(handler)
+                    owners.append(block)
+                elif isinstance(block, Operation) or isinstance(block, Comparison):
+                    context = "arithmetic operation" if isinstance(block, Operation) else "comparison"
+                    function = signFunctions.get(block.sign, unknownSign)
+                    # a number as the right argument is bound into the instruction for the operation
+                    if isinstance(block.right, Number) and block.sign in signFunctions:
+                        tasks.append(("code", BINARY_CONST, (function, block.right.n), handler, block))
+                    else:
+                        tasks.append(("code", BINARY, function, handler, block))
+                        tasks.append(("expr", block.right, context, handler, block))
+                    tasks.append(("expr", block.left, context, handler, block))
+                elif isinstance(block, SharedRef):
+                    code.append((LOAD_TEMP, resolution.temps[id(block.shared)]))
+                    handlers.append(handler)
+                    owners.append(block)
+                elif isinstance(block, Shared):
+                    tasks.append(("code", STORE_TEMP, resolution.temps[id(block)], handler, block))
+                    tasks.append(("expr", block.expr, arg, handler, block))
+                elif isinstance(block, Hoisted):
+                    # the expression is skipped if its value has already been stored
+                    stored = Label()
+                    slot = resolution.temps[id(block)]
+                    tasks.append(("label", stored, None, None, block))
+                    tasks.append(("code", STORE_TEMP, slot, handler, block))
+                    tasks.append(("expr", block.expr, arg, handler, block))
+                    tasks.append(("code", LOAD_HOISTED, (slot, stored), handler, block))
+                else:
+                    # 'arg' is the message the SyntaxError is raised with, as in BlockFunctions.evaluateExpr
+                    code.append((INVALID, arg))
+                    handlers.append(handler)
+                    # the error belongs to the block with the empty space
+                    owners.append(owner)
+            else:
+                BlockVM.lowerStatement(block, arg, tasks, resolution)
+
+        for i, (op, arg) in enumerate(code):
+            if op == JUMP or op == JUMP_IF_FALSE:
+                code[i] = (op, arg.pc)
+            elif op == LOAD_HOISTED:
+                code[i] = (op, (arg[0], arg[1].pc))
+        for handler in handlers:
+            if handler is not None and isinstance(handler.resume, Label):
+                handler.resume = handler.resume.pc
+        return code, handlers, owners
+
+    # push the tasks lowering a statement of block 'num'
+    @staticmethod
+    def lowerStatement(block, num, tasks, resolution):
+        ran = f"Ran block {num}"
+        end = Label()
+        if isinstance(block, IfElse) or isinstance(block, While):
+            argument = "condition provided to if statement" if isinstance(block, IfElse) else \
+                "condition provided to while statement"
+            # only evaluating the condition is covered by the handler of an if/while block, since each statement
+            # inside it has its own handler
+            start, stop = resolution.scopes[id(block)]
+            scope = (start, stop, (UNSET,) * (stop - start))
+            handler = Handler(num, argument, end, scope)
+            popScope = Label()
+            pending = []
+            if isinstance(block, IfElse):
+                otherwise = Label()
+                pending += [("expr", block.cond, "", handler), ("code", JUMP_IF_FALSE, otherwise, handler)]
+                pending += [("stmt", s, num, None) for s in block.true if s is not None]
+                pending += [("code", JUMP, popScope, None), ("label", otherwise, None, None)]
+                pending += [("stmt", s, num, None) for s in block.false if s is not None]
+            else:
+                top = Label()
+                if isinstance(block, HoistingWhile):
+                    # the values of hoisted expressions are cleared each time the loop is started
+                    start, stop = resolution.hoists[id(block)]
+                    pending += [("code", UNSET_SLOTS, (start, stop, (UNSET,) * (stop - start)), None)]
+                pending += [("label", top, None, None), ("expr", block.cond, "", handler),
+                            ("code", JUMP_IF_FALSE, popScope, handler)]
+                pending += [("stmt", s, num, None) for s in block.stats if s is not None]
+                pending += [("code", JUMP, top, None)]
+            pending += [("label", popScope, None, None), ("code", UNSET_SLOTS, scope, None), ("label", end, None, None)]
+        elif isinstance(block, Comparison) or isinstance(block, Operation) or isinstance(
+                block, Number) or isinstance(block, Variable) or isinstance(block, Hoisted):
+            handler = Handler(num, None, end, None)
+            pending = [("expr", block, "", handler), ("code", EXPRESSION, ran + ": ", handler)]
+        elif isinstance(block, Turtle2DMovement):
+            handler = Handler(num, "argument provided to turtle movement", end, None)
+            pending = [("expr", block.start_x, "", handler), ("expr", block.start_y, "", handler),
+                       ("expr", block.dest_x, "", handler), ("expr", block.dest_y, "", handler),
+                       ("code", MOVE, ran, handler)]
+        elif isinstance(block, Turtle2DMoveForward):
+            handler = Handler(num, "argument provided to turtle move forward", end, None)
+            pending = [("expr", block.dist, "", handler), ("code", MOVE_FORWARD, ran, handler)]
+        elif isinstance(block, Turtle2DRotate):
+            handler = Handler(num, "argument provided to turtle rotation", end, None)
+            pending = [("expr", block.angle, "", handler), ("code", ROTATE, ran, handler)]
+        elif isinstance(block, Assignment):
+            handler = Handler(num, "argument provided to assignment", end, None)
+            pending = [("expr", block.expr, "", handler),
+                       ("code", ASSIGN, (resolution.writes[id(block)], block.varName, ran), handler)]
+        else:
+            # any other block produces no output, as in BlockFunctions.execute
+            return
+        pending.append(("label", end, None, None))
+        tasks.extend(reversed([task + (block,) for task in pending]))
+
+    # run at most 'steps' instructions (or all of them if it is None), returning whether the program has finished
+    def run(self, steps=None):
+        code, handlers, stack = self.code, self.handlers, self.stack
+        turtle, trace, slots, names, boundary = self.turtle, self.trace, self.globals.slots, self.names, self.boundary
+        output = self.outputs[-1] if self.outputs else None
+        pc = self.pc
+        end = len(code)
+        # with no limit the budget starts below zero so it never reaches zero
+        budget = -1 if steps is None else steps
+        while pc < end and budget != 0:
+            budget -= 1
+            op, arg = code[pc]
+            pc += 1
+            try:
+                if op == LOAD:
+                    value = slots[arg]
+                    if value is UNSET:
+                        raise KeyError(names[arg])
+                    stack.append(value)
+                elif op == CONST:
+                    stack.append(arg)
+                elif op == BINARY_CONST:
+                    stack[-1] = arg[0](stack[-1], arg[1])
+                elif op == BINARY:
+                    right = stack.pop()
+                    stack[-1] = arg(stack[-1], right)
+                elif op == JUMP_IF_FALSE:
+                    if not stack.pop():
+                        pc = arg
+                elif op == JUMP:
+                    pc = arg
+                elif op == ASSIGN:
+                    chain, name, ran = arg
+                    value = stack.pop()
+                    trace.update(name, value)
+                    # the variable is written to the most recent context it is set in, or the assignment's own
+                    for slot in chain:
+                        if slots[slot] is not UNSET:
+                            slots[slot] = value
+                            break
+                    else:
+                        slots[chain[0]] = value
+                    output.append(ran)
+                elif op == EXPRESSION:
+                    output.append(arg + str(stack.pop()))
+                elif op == UNSET_SLOTS:
+                    slots[arg[0]:arg[1]] = arg[2]
+                elif op == MOVE_FORWARD:
+                    s_x, s_y = turtle.x, turtle.y
+                    turtle.move(stack.pop())
+                    turtle.lines.forward(s_x, s_y, turtle.x, turtle.y, turtle.angle)
+                    output.append(arg)
+                elif op == ROTATE:
+                    turtle.angle += math.radians(stack.pop())
+                    output.append(arg)
+                elif op == MOVE:
+                    d_y, d_x, s_y, s_x = stack.pop(), stack.pop(), stack.pop(), stack.pop()
+                    BlockCompiler.moveTurtle(turtle, s_x, s_y, d_x, d_y)
+                    output.append(arg)
+                elif op == BLOCK:
+                    if boundary is not None:
+                        boundary(arg)
+                    output = []
+                    self.outputs.append(output)
+                elif op == STORE_TEMP:
+                    slots[arg] = stack[-1]
+                elif op == LOAD_TEMP:
+                    stack.append(slots[arg])
+                elif op == LOAD_HOISTED:
+                    value = slots[arg[0]]
+                    if value is not UNSET:
+                        stack.append(value)
+                        pc = arg[1]
+                elif op == LOAD_CHAIN:
+                    for slot in arg:
+                        value = slots[slot]
+                        if value is not UNSET:
+                            stack.append(value)
+                            break
+                    else:
+                        raise KeyError(names[arg[0]])
+                elif op == INVALID:
+                    raise SyntaxError(arg)
+            except Exception as e:
+                handler = handlers[pc - 1]
+                if handler is None:
+                    raise
+                self.errors += 1
+                argument = handler.argument if handler.argument is not None else f"argument provided to {e}"
+                output.append(BlockCompiler.errorMessage(e, handler.num, argument))
+                # statements always start with an empty operand stack
+                stack.clear()
+                if handler.scope is not None:
+                    slots[handler.scope[0]:handler.scope[1]] = handler.scope[2]
+                pc = handler.resume
+        self.pc = pc
+        self.finished = pc >= end
+        return self.finished
+
+    # the lines output since the last call, which are removed from 'outputs' (the list of each block's lines is
+    # emptied rather than removed, as the block running appends to it). only the block which was running then can have
+    # output more lines, and the blocks after it are new
+    def drain(self):
+        lines = []
+        for output in self.outputs[self.drained:]:
+            lines.extend(output)
+            output.clear()
+        self.drained = max(len(self.outputs) - 1, 0)
+        return lines
@@ -0,0 +1,181 @@
+import os
+import time
+import multiprocessing
+from helpers import *
+from vm import BlockVM
+from passes import BlockOptimiser
+from globalsStack import GlobalsStack
+from outputs import OutputLog
+
+
+# passed to BlockVM in the worker process in place of the trace table, so the updates made to it can be sent back to
+# be made to the trace table in the UI process in the same order. BlockVM never reads the trace table, so the updates
+# are only recorded rather than also kept in a copy of it, which would take up the worker's memory as well
+class TraceRecorder:
+    def __init__(self):
+        self.updates = []
+
+    def update(self, varName, value):
+        self.updates.append((varName, value))
+
+
+# run in the worker process: run the blocks on BlockVM, sending what has changed back through 'connection' at most
+# every 'interval' seconds as a batch of ("batch", new output lines, trace updates, (first turtle line
+# changed, the turtle lines from it on), turtle position and angle, whether the program has finished). if the turtle
+# coalesces its lines, the last line sent may since have been extended, so it is sent again. "pause" and "resume"
+# messages can be received between every 'chunk' instructions. the turtle is a copy of the one in the UI process when the
+# run started
+def work(connection, run_order, turtle, passes, chunk, interval):
+    if passes:
+        run_order = BlockOptimiser.optimise(run_order, passes)
+    recorder = TraceRecorder()
+    vm = BlockVM(run_order, turtle, recorder, GlobalsStack())
+    sent = len(turtle.lines)
+    paused = False
+    last = time.perf_counter()
+    while True:
+        # while paused, this waits for the next message rather than running
+        while paused or connection.poll():
+            paused = connection.recv() == "pause"
+        vm.run(chunk)
+        if vm.finished or time.perf_counter() - last >= interval:
+            outputs = vm.drain()
+            start = max(sent - 1, 0) if turtle.lines.coalesce else sent
+            connection.send(("batch", outputs, recorder.updates, (start, turtle.lines.array[start:].copy()),
+                             (turtle.x, turtle.y, turtle.angle), vm.finished))
+            recorder.updates = []
+            sent = len(turtle.lines)
+            last = time.perf_counter()
+        if vm.finished:
+            break
+    connection.close()
+
+
+# a run of a program in a separate process, with the same interface as ProgramRun, so that running the program never
+# takes time away from drawing the code development environment and can use another core. the outputs, trace updates
+# and turtle lines come back in batches, which are applied whenever advance() is called.
+# stopping the run kills the process, so even a program stuck in a loop can be stopped straight away. if 'time_limit'
+# (in seconds, not counting time paused) or 'memory_limit' (in bytes) is given, the process is killed once it runs for
+# longer or uses more memory than that. the memory used is only known on systems with /proc (e.g., Linux), elsewhere
+# the memory limit isn't enforced.
+# the globals aren't used by the worker process, which has its own, but are taken so either kind of run can be started
+# the same way
+class WorkerRun:
+    chunk = 1000
+    # the number of seconds between batches being sent back
+    interval = 0.02
+
+    def __init__(self, run_order, line_length, turtle, trace, globals, now, passes=(), time_limit=None,
+                 memory_limit=None, log=None):
+        self.line_length = line_length
+        self.turtle = turtle
+        self.trace = trace
+        self.outputs = log if log is not None else OutputLog(line_length)
+        self.outputs.write(now)
+        self.paused = False
+        self.stopped = False
+        self.done = False
+        self.time_limit = time_limit
+        self.memory_limit = memory_limit
+        self.elapsed = 0
+        self.last = time.perf_counter()
+
+        self.connection, child = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(
+            target=work, args=(child, run_order, turtle, passes, self.chunk, self.interval), daemon=True)
+        try:
+            self.process.start()
+        except BaseException:
+            # e.g., the arguments can't be pickled to be sent to the worker
+            self.connection.close()
+            raise
+        finally:
+            # only the worker process should have this end open, so reading from the other end fails once it has exited
+            child.close()
+
+    @property
+    def finished(self):
+        return self.done or self.stopped
+
+    @property
+    def running(self):
+        return not self.finished and not self.paused
+
+    def pause(self):
+        if not self.finished:
+            self.paused = True
+            self.send("pause")
+
+    def resume(self):
+        if not self.finished:
+            self.paused = False
+            self.last = time.perf_counter()
+            self.send("resume")
+
+    # the worker process may have finished (and closed its end) before the batch saying so has been applied
+    def send(self, message):
+        try:
+            self.connection.send(message)
+        except OSError:
+            pass
+
+    def stop(self):
+        if not self.finished:
+            self.stopped = True
+            self.process.kill()
+            self.process.join()
+            self.connection.close()
+
+    # stop the run because of a problem, which is reported after the outputs so far
+    def abort(self, message):
+        self.outputs.write(message)
+        self.stop()
+
+    # apply the batches which have been sent back, for at most 'ms' milliseconds (or wait until the program finishes
+    # if it isn't given), then check the limits, returning whether the run has finished. the worker runs
+    # whenever it isn't paused, so 'steps' is ignored
+    def advance(self, steps=None, ms=None):
+        if not self.running:
+            return self.finished
+        now = time.perf_counter()
+        self.elapsed += now - self.last
+        self.last = now
+        deadline = None if ms is None else now + ms / 1000
+        try:
+            # batches which haven't arrived yet aren't waited for unless the run is being advanced until it finishes
+            while not self.done and (deadline is None or time.perf_counter() < deadline):
+                if not self.connection.poll(None if deadline is None else 0):
+                    break
+                self.apply(self.connection.recv())
+        except EOFError:
+            self.abort("Run stopped: the program's process exited unexpectedly")
+            return True
+
+        if self.done:
+            self.process.join()
+            self.connection.close()
+        elif self.time_limit is not None and self.elapsed > self.time_limit:
+            self.abort(f"Run stopped: time limit of {self.time_limit} seconds exceeded")
+        elif self.memory_limit is not None and self.memoryUsed() > self.memory_limit:
+            self.abort(f"Run stopped: memory limit of {self.memory_limit // 2 ** 20} MB exceeded")
+        return self.finished
+
+    def apply(self, batch):
+        _, outputs, updates, lines, (x, y, angle), finished = batch
+        for line in outputs:
+            self.outputs.write(line)
+        for varName, value in updates:
+            self.trace.update(varName, value)
+        start, lines = lines
+        self.turtle.lines.truncate(start)
+        self.turtle.lines.extend(lines)
+        self.turtle.x, self.turtle.y, self.turtle.angle = x, y, angle
+        self.done = finished
+
+    # the memory (resident set size) used by the worker process in bytes, or 0 if it can't be found
+    def memoryUsed(self):
+        try:
+            with open(f"/proc/{self.process.pid}/statm") as f:
+                return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+        except (OSError, ValueError, IndexError):
+            return 0
@@ -0,0 +1,290 @@
+import os
+import mmap
+import struct
+import weakref
+from blocks import *
+
+# a workspace file is laid out as:
+# - a header: the magic bytes, the format version and the number of entries in each of the tables below
+# - the string table: the offset of each string (then the end of the last one) followed by the UTF-8 bytes of all of
+#   them. variable names and signs are interned, so each appears only once however many blocks use it
+# - the literal table: one record per number, holding its kind and 8 bytes of its value
+# - the node table: one record per block, holding its type tag and four fields whose meaning depends on the type
+# - the child table: the node indices of the statements of every if/while block
+# - the top level table: one record per block in the code development environment, holding its position and the range
+#   of nodes making up its tree
+# every table has fixed-width records, so any record can be found directly from its index. the nodes of each tree are
+# written children first, so a tree is one contiguous range of nodes ending with its root, and can be built in a single
+# pass over that range
+MAGIC = b"CBX\x00"
+VERSION = 1
+HEADER = struct.Struct("<4sHxxIIIIII")
+OFFSET = struct.Struct("<I")
+LITERAL = struct.Struct("<B7x8s")
+NODE = struct.Struct("<Bxxxiiii")
+CHILD = struct.Struct("<i")
+TOP = struct.Struct("<ddii")
+
+# node type tags
+NUMBER, VARIABLE, ASSIGNMENT, OPERATION, COMPARISON, IF_ELSE, WHILE, MOVEMENT, MOVE_FORWARD, ROTATE = range(10)
+# literal kinds. integers too large for 8 bytes are stored as a string of their digits
+INT, FLOAT, BOOL, BIG_INT = range(4)
+INT64 = struct.Struct("<q")
+FLOAT64 = struct.Struct("<d")
+# the value of a field with no node (i.e., an empty space)
+EMPTY = -1
+
+
+# a block in the code development environment whose tree is only built from the workspace file it was loaded from the
+# first time it is needed (e.g., when it is drawn or run). its position is known straight away, so the run order can be
+# worked out without building any trees
+class LazyBlock(Block):
+    def __init__(self, workspace, first, root, x, y):
+        super().__init__(None, x, y)
+        self.__workspace = workspace
+        self.__range = (first, root)
+
+    @property
+    def block(self):
+        if self.__workspace is not None:
+            self.__block = self.__workspace.build(*self.__range)
+            self.__workspace = None
+        return self.__block
+
+    @block.setter
+    def block(self, block):
+        self.__block = block
+        self.__workspace = None
+
+    # the workspace file can't be sent to another process (e.g., a WorkerRun), so the tree is built and sent as a
+    # plain block instead
+    def __reduce__(self):
+        return Block, (self.block, self.x, self.y)
+
+
+# an open workspace file, read through mmap so that only the parts of it which are used are read from disk. the size of
+# the file is checked against the sizes of the tables in its header when it is opened, so a file which has been cut
+# short (or isn't a workspace file) raises a ValueError rather than being read as fewer blocks
+class Workspace:
+    # the workspaces which are open, so they can be closed before the file they are read from is replaced (see save)
+    opened = weakref.WeakSet()
+
+    def __init__(self, path):
+        self.path = os.path.abspath(path)
+        with open(path, "rb") as f:
+            if os.fstat(f.fileno()).st_size < HEADER.size:
+                raise ValueError(f"{path} is not a workspace file")
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, strings, stringBytes, literals, nodes, children, tops = HEADER.unpack_from(self.data, 0)
+        if magic != MAGIC or version != VERSION:
+            self.data.close()
+            raise ValueError(f"{path} is not a version {VERSION} workspace file")
+        size = (HEADER.size + OFFSET.size * (strings + 1) + stringBytes + LITERAL.size * literals + NODE.size * nodes +
+                CHILD.size * children + TOP.size * tops)
+        if len(self.data) != size:
+            message = f"{path} is {len(self.data)} bytes long rather than the {size} bytes its header gives"
+            self.data.close()
+            raise ValueError(message)
+        offset = HEADER.size
+        offsets = struct.unpack_from(f"<{strings + 1}I", self.data, offset)
+        offset += OFFSET.size * (strings + 1)
+        blob = self.data[offset:offset + stringBytes]
+        self.strings = [blob[offsets[i]:offsets[i + 1]].decode() for i in range(strings)]
+        offset += stringBytes
+        self.literalsOffset = offset
+        offset += LITERAL.size * literals
+        self.nodesOffset = offset
+        offset += NODE.size * nodes
+        self.childrenOffset = offset
+        offset += CHILD.size * children
+        self.topsOffset = offset
+        self.tops = tops
+        # the blocks of the workspace, which may not have been built yet
+        self.lazy = weakref.WeakSet()
+        Workspace.opened.add(self)
+
+    # the blocks of the workspace, none of whose trees have been built yet. positions are stored as floats but are
+    # nearly always whole numbers of pixels, which are given back as ints
+    def blocks(self):
+        blocks = [LazyBlock(self, first, root, int(x) if x.is_integer() else x, int(y) if y.is_integer() else y)
+                  for x, y, first, root in
+                  TOP.iter_unpack(self.data[self.topsOffset:self.topsOffset + TOP.size * self.tops])]
+        self.lazy.update(blocks)
+        return blocks
+
+    # build the trees of the blocks which haven't been built yet, then close the file
+    def close(self):
+        for block in list(self.lazy):
+            block.block
+        self.lazy.clear()
+        self.data.close()
+        Workspace.opened.discard(self)
+
+    def literal(self, i):
+        kind, value = LITERAL.unpack_from(self.data, self.literalsOffset + LITERAL.size * i)
+        if kind == FLOAT:
+            return FLOAT64.unpack(value)[0]
+        if kind == BIG_INT:
+            return int(self.strings[INT64.unpack(value)[0]])
+        n = INT64.unpack(value)[0]
+        return bool(n) if kind == BOOL else n
+
+    def statements(self, built, first, start, count):
+        children = struct.unpack_from(f"<{count}i", self.data, self.childrenOffset + CHILD.size * start)
+        return [None if c == EMPTY else built[c - first] for c in children]
+
+    # build the tree made of nodes first to root. each node's children come before it, so they have already been built
+    def build(self, first, root):
+        if root < first:
+            return None
+        built = []
+        strings = self.strings
+
+        def child(i):
+            return None if i == EMPTY else built[i - first]
+
+        records = self.data[self.nodesOffset + NODE.size * first:self.nodesOffset + NODE.size * (root + 1)]
+        for tag, a, b, c, d in NODE.iter_unpack(records):
+            if tag == NUMBER:
+                block = Number(self.literal(a))
+            elif tag == VARIABLE:
+                block = Variable(strings[a])
+            elif tag == ASSIGNMENT:
+                block = Assignment(strings[a], child(b))
+            elif tag == OPERATION:
+                block = Operation(strings[a], child(b), child(c))
+            elif tag == COMPARISON:
+                block = Comparison(strings[a], child(b), child(c))
+            elif tag == IF_ELSE:
+                block = IfElse(child(a), self.statements(built, first, b, c),
+                               self.statements(built, first, b + c, d))
+            elif tag == WHILE:
+                block = While(child(a), self.statements(built, first, b, c))
+            elif tag == MOVEMENT:
+                block = Turtle2DMovement(child(a), child(b), child(c), child(d))
+            elif tag == MOVE_FORWARD:
+                block = Turtle2DMoveForward(child(a))
+            elif tag == ROTATE:
+                block = Turtle2DRotate(child(a))
+            else:
+                raise ValueError(f"unknown node type {tag}")
+            built.append(block)
+        return built[-1]
+
+    # open a workspace file, returning its blocks
+    @staticmethod
+    def load(path):
+        return Workspace(path).blocks()
+
+    # write the blocks to a workspace file. the file is written to a temporary file first and then moved into place, so
+    # the file is never left half written. a file which is mapped into memory can't be replaced on some systems (e.g.,
+    # Windows), so any workspace open from it is closed first, building the trees of its blocks which haven't been
+    # built yet. if the file can't be written the temporary file is removed
+    @staticmethod
+    def save(code, path):
+        writer = WorkspaceWriter()
+        for block in code:
+            writer.addTop(block)
+        temp = path + ".tmp"
+        try:
+            with open(temp, "wb") as f:
+                writer.write(f)
+            for workspace in list(Workspace.opened):
+                if workspace.path == os.path.abspath(path):
+                    workspace.close()
+            os.replace(temp, path)
+        except BaseException:
+            if os.path.exists(temp):
+                os.remove(temp)
+            raise
+
+
+# builds up the tables of a workspace file as blocks are added to it
+class WorkspaceWriter:
+    def __init__(self):
+        self.strings = {}
+        self.literals = []
+        self.nodes = []
+        self.children = []
+        self.tops = []
+
+    def string(self, s):
+        return self.strings.setdefault(s, len(self.strings))
+
+    def literal(self, n):
+        if isinstance(n, bool):
+            record = (BOOL, INT64.pack(n))
+        elif isinstance(n, float):
+            record = (FLOAT, FLOAT64.pack(n))
+        elif -2 ** 63 <= n < 2 ** 63:
+            record = (INT, INT64.pack(n))
+        else:
+            record = (BIG_INT, INT64.pack(self.string(str(n))))
+        self.literals.append(record)
+        return len(self.literals) - 1
+
+    def statements(self, stats, indices):
+        start = len(self.children)
+        # the empty space at the end of the statements is added back when they are loaded
+        self.children.extend(indices[id(s)] if s is not None else EMPTY for s in stats[:-1])
+        return start, len(stats) - 1
+
+    # add the nodes of a tree, children first, without recursion so deeply nested trees can be saved
+    def addTop(self, top):
+        first = len(self.nodes)
+        indices = {}
+        tasks = [(top.block, False)]
+        while tasks:
+            block, ready = tasks.pop()
+            if block is None or id(block) in indices:
+                continue
+            children = BlockFunctions.children(block)
+            if not ready:
+                tasks.append((block, True))
+                tasks.extend((c, False) for c in reversed(children))
+                continue
+
+            def index(c):
+                return EMPTY if c is None else indices[id(c)]
+            if isinstance(block, Number):
+                record = (NUMBER, self.literal(block.n), 0, 0, 0)
+            elif isinstance(block, Variable):
+                record = (VARIABLE, self.string(block.name), 0, 0, 0)
+            elif isinstance(block, Assignment):
+                record = (ASSIGNMENT, self.string(block.varName), index(block.expr), 0, 0)
+            elif isinstance(block, Operation) or isinstance(block, Comparison):
+                record = (OPERATION if isinstance(block, Operation) else COMPARISON, self.string(block.sign),
+                          index(block.left), index(block.right), 0)
+            elif isinstance(block, IfElse):
+                start, true = self.statements(block.true, indices)
+                false = self.statements(block.false, indices)[1]
+                record = (IF_ELSE, index(block.cond), start, true, false)
+            elif isinstance(block, While):
+                start, count = self.statements(block.stats, indices)
+                record = (WHILE, index(block.cond), start, count, 0)
+            elif isinstance(block, Turtle2DMovement):
+                record = (MOVEMENT, index(block.start_x), index(block.start_y), index(block.dest_x),
+                          index(block.dest_y))
+            elif isinstance(block, Turtle2DMoveForward):
+                record = (MOVE_FORWARD, index(block.dist), 0, 0, 0)
+            elif isinstance(block, Turtle2DRotate):
+                record = (ROTATE, index(block.angle), 0, 0, 0)
+            else:
+                raise ValueError(f"cannot save block of type {type(block).__name__}")
+            indices[id(block)] = len(self.nodes)
+            self.nodes.append(record)
+        self.tops.append((top.x, top.y, first, len(self.nodes) - 1))
+
+    def write(self, f):
+        strings = [s.encode() for s in self.strings]
+        offsets = [0]
+        for s in strings:
+            offsets.append(offsets[-1] + len(s))
+        f.write(HEADER.pack(MAGIC, VERSION, len(strings), offsets[-1], len(self.literals), len(self.nodes),
+                            len(self.children), len(self.tops)))
+        f.write(struct.pack(f"<{len(offsets)}I", *offsets))
+        f.write(b"".join(strings))
+        f.writelines(LITERAL.pack(kind, value) for kind, value in self.literals)
+        f.writelines(NODE.pack(*record) for record in self.nodes)
+        f.write(struct.pack(f"<{len(self.children)}i", *self.children))
+        f.writelines(TOP.pack(*top) for top in self.tops)